@@ -3,6 +3,9 @@ import { StackProps } from "aws-cdk-lib";
 export interface ICoreStackProps extends StackProps {
   project: string;
   stage: string;
+  homeRegion?: string;
+  replicaRegions?: string[];
+  tableIndexes?: number;
   tags?: {
     [key: string]: string;
   }
@@ -17,4 +20,10 @@ export interface ILambda {
   handler: string;
   memorySize: number;
   actions: string[];
+  provisionedConcurrency?: number;
+  warmup?: boolean;
+  traceSampleRate?: number;
+  internal?: boolean;
+  invokes?: string[];
+  idempotent?: boolean;
 } 
\ No newline at end of file
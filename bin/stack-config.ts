@@ -4,6 +4,9 @@ import { ICoreStackProps, IApiStackProps } from "./stack-config-types";
 const coreStackProps: ICoreStackProps = {
   project: process.env.PROJECT || "url-shortner",
   stage: process.env.STAGE || "dev",
+  homeRegion: process.env.HOME_REGION,
+  replicaRegions: (process.env.REPLICA_REGIONS || "").split(",").filter((region) => region),
+  tableIndexes: process.env.TABLE_INDEXES ? Number(process.env.TABLE_INDEXES) : undefined,
 };
 
 const apiStackProps: IApiStackProps = {
@@ -14,8 +17,13 @@ const apiStackProps: IApiStackProps = {
       name: 'GET',
       handler: 'get_function.lambda_handler',
       memorySize: 128,
+      provisionedConcurrency: 1,
+      traceSampleRate: 0.05,
+      invokes: ['METADATA'],
       actions: [
         'dynamodb:GetItem',
+        'dynamodb:BatchGetItem',
+        'dynamodb:Query',
         'dynamodb:Scan',
         'dynamodb:UpdateItem'
       ]
@@ -24,28 +32,50 @@ const apiStackProps: IApiStackProps = {
       name: 'POST',
       handler: 'post_function.lambda_handler',
       memorySize: 128,
+      warmup: true,
+      idempotent: true,
+      invokes: ['METADATA'],
       actions: [
         'dynamodb:GetItem',
-        'dynamodb:Scan',
+        'dynamodb:Query',
         'dynamodb:PutItem',
+        'dynamodb:UpdateItem',
       ]
     },
     {
       name: 'PUT',
       handler: 'put_function.lambda_handler',
       memorySize: 128,
+      warmup: true,
+      idempotent: true,
+      invokes: ['METADATA'],
       actions: [
         'dynamodb:GetItem',
         'dynamodb:PutItem',
+        'dynamodb:UpdateItem',
+        'dynamodb:BatchWriteItem',
       ]
     },
     {
       name: 'DELETE',
       handler: 'delete_function.lambda_handler',
       memorySize: 128,
+      warmup: true,
       actions: [
         'dynamodb:GetItem',
         'dynamodb:DeleteItem',
+        'dynamodb:BatchWriteItem',
+        'dynamodb:UpdateItem',
+      ]
+    },
+    {
+      name: 'METADATA',
+      handler: 'metadata_function.lambda_handler',
+      memorySize: 128,
+      internal: true,
+      actions: [
+        'dynamodb:GetItem',
+        'dynamodb:UpdateItem',
       ]
     },
   ]
@@ -117,8 +117,13 @@ export class ApiStack extends cdk.Stack {
     });
 
 
+    const _homeRegion = props.homeRegion || this.region;
+    const _tableRegions = [...new Set([this.region, _homeRegion])];
+
     const _powertoolsLayer = Lambda.LayerVersion.fromLayerVersionArn(this, `PowertoolsLambdaLayer`, `arn:aws:lambda:${this.region}:017000801446:layer:AWSLambdaPowertoolsPythonV2:46`);
 
+    const _functionName = (name: string) => `${props.stage}-${props.project}-${name}-lambda`;
+
     props.lambdas.forEach((lambda) => {
       /**
        * Lambda Role
@@ -140,11 +145,23 @@ export class ApiStack extends cdk.Stack {
               new iam.PolicyStatement({
                 effect: iam.Effect.ALLOW,
                 actions: lambda.actions,
+                resources: _tableRegions.flatMap((region) => [
+                  `arn:aws:dynamodb:${region}:${this.account}:table/${props.stage}-${props.project}-table`,
+                  `arn:aws:dynamodb:${region}:${this.account}:table/${props.stage}-${props.project}-table/index/*`,
+                ]),
+              }),
+              ...(lambda.idempotent ? [new iam.PolicyStatement({
+                effect: iam.Effect.ALLOW,
+                actions: ['dynamodb:GetItem', 'dynamodb:PutItem', 'dynamodb:UpdateItem', 'dynamodb:DeleteItem'],
                 resources: [
-                  `arn:aws:dynamodb:${this.region}:${this.account}:table/${props.stage}-${props.project}-table`,
-                  `arn:aws:dynamodb:${this.region}:${this.account}:table/${props.stage}-${props.project}-table/index/*`,
+                  `arn:aws:dynamodb:${_homeRegion}:${this.account}:table/${props.stage}-${props.project}-idempotency-table`,
                 ],
-              }),
+              })] : []),
+              ...(lambda.invokes || []).map((name) => new iam.PolicyStatement({
+                effect: iam.Effect.ALLOW,
+                actions: ['lambda:InvokeFunction'],
+                resources: [`arn:aws:lambda:${this.region}:${this.account}:function:${_functionName(name)}`],
+              })),
             ],
           }),
         }
@@ -162,7 +179,7 @@ export class ApiStack extends cdk.Stack {
        * @see https://docs.aws.amazon.com/cdk/api/latest/docs/aws-lambda-readme.html
        */
       const _lambda = new Lambda.Function(this, `${lambda.name}-Lambda`, {
-        functionName: `${props.stage}-${props.project}-${lambda.name}-lambda`,
+        functionName: _functionName(lambda.name),
         description: `Handles ${lambda.name} requests for the ${props.project} micro-service`,
         runtime: Lambda.Runtime.PYTHON_3_11,
         handler: lambda.handler,
@@ -174,8 +191,51 @@ export class ApiStack extends cdk.Stack {
           _powertoolsLayer
         ],
         role: _role,
+        environment: {
+          HOME_REGION: _homeRegion,
+          REPLICA_REGIONS: (props.replicaRegions || []).join(','),
+          POWERTOOLS_METRICS_NAMESPACE: props.project,
+          TRACE_SAMPLE_RATE: String(lambda.traceSampleRate ?? 1),
+          // The CloudFront distribution and the edge of the API each append the IP they were called from.
+          TRUSTED_PROXY_HOPS: '2',
+          ...(lambda.idempotent ? { IDEMPOTENCY_TABLE_NAME: `${props.stage}-${props.project}-idempotency-table` } : {}),
+          ...Object.fromEntries((lambda.invokes || []).map((name) => [`${name}_FUNCTION_NAME`, _functionName(name)])),
+        },
       });
 
+      /**
+       * Lambda Alias with Provisioned Concurrency
+       * 
+       * @memberof ApiStack
+       * @see https://docs.aws.amazon.com/lambda/latest/dg/provisioned-concurrency.html
+       */
+      const _target: Lambda.IFunction = lambda.provisionedConcurrency
+        ? new Lambda.Alias(this, `${lambda.name}-LambdaAlias`, {
+          aliasName: 'live',
+          version: _lambda.currentVersion,
+          provisionedConcurrentExecutions: lambda.provisionedConcurrency,
+        })
+        : _lambda;
+
+      /**
+       * Warm-up Schedule
+       * 
+       * @memberof ApiStack
+       * @see https://docs.aws.amazon.com/cdk/api/latest/docs/aws-events-readme.html
+       */
+      if (lambda.warmup) {
+        new cdk.aws_events.Rule(this, `${lambda.name}-WarmupRule`, {
+          ruleName: `${props.stage}-${props.project}-${lambda.name}-warmup`,
+          description: `Keeps a ${lambda.name} container warm`,
+          schedule: cdk.aws_events.Schedule.rate(cdk.Duration.minutes(5)),
+          targets: [
+            new cdk.aws_events_targets.LambdaFunction(_target, {
+              event: cdk.aws_events.RuleTargetInput.fromObject({ warmup: true }),
+            }),
+          ],
+        });
+      }
+
       _lambda.metricInvocations({
         period: cdk.Duration.minutes(1),
         statistic: 'sum',
@@ -215,11 +275,27 @@ export class ApiStack extends cdk.Stack {
         exportName: `${props.stage}-${props.project}-${lambda.name}-lambda-arn`
       });
 
-      _api.root.addMethod(`${lambda.name}`, new apigateway.LambdaIntegration(_lambda), {
+      if (lambda.internal) {
+        return;
+      }
+      _api.root.addMethod(`${lambda.name}`, new apigateway.LambdaIntegration(_target), {
         apiKeyRequired: true,
       });
       if (lambda.name === 'GET') {
-        _api.root.addResource('{id}').addMethod('GET', new apigateway.LambdaIntegration(_lambda), {
+        const _slugResource = _api.root.addResource('{id}');
+        _slugResource.addMethod('GET', new apigateway.LambdaIntegration(_target), {
+          apiKeyRequired: true,
+        });
+        _slugResource.addResource('stats').addMethod('GET', new apigateway.LambdaIntegration(_target), {
+          apiKeyRequired: true,
+        });
+        _api.root.addResource('metadata').addMethod('GET', new apigateway.LambdaIntegration(_target), {
+          apiKeyRequired: true,
+        });
+        _api.root.addResource('resolve').addMethod('GET', new apigateway.LambdaIntegration(_target), {
+          apiKeyRequired: true,
+        });
+        _api.root.addResource('hot').addMethod('GET', new apigateway.LambdaIntegration(_target), {
           apiKeyRequired: true,
         });
       }
@@ -1,7 +1,7 @@
 import * as cdk from 'aws-cdk-lib';
 import { Construct } from 'constructs';
 import { ICoreStackProps } from '../bin/stack-config-types';
-import { Table, AttributeType, BillingMode } from 'aws-cdk-lib/aws-dynamodb';
+import { Table, AttributeType, BillingMode, GlobalSecondaryIndexProps, ProjectionType } from 'aws-cdk-lib/aws-dynamodb';
 
 export class DatabaseStack extends cdk.Stack {
   constructor(scope: Construct, id: string, props: ICoreStackProps) {
@@ -25,6 +25,80 @@ export class DatabaseStack extends cdk.Stack {
       billingMode: BillingMode.PAY_PER_REQUEST,
       removalPolicy: cdk.RemovalPolicy.DESTROY,
       pointInTimeRecovery: true,
+      replicationRegions: props.replicaRegions?.length ? props.replicaRegions : undefined,
+    })
+
+    /**
+     * DynamoDB Global Secondary Indexes
+     *
+     * urlHash-index finds the link of a canonical target URL, so creates are deduplicated without a scan.
+     * owner-index and tag-index list the links of an owner or a tag, newest first, without a scan.
+     * Tags are indexed through one auxiliary item per tag, which projects the slug it belongs to.
+     * Both only project keys, so click writes to a link never write to an index.
+     *
+     * DynamoDB creates at most one global secondary index per update of an existing table,
+     * so only the first `tableIndexes` indexes are deployed. An existing table gains them
+     * one deploy at a time, with TABLE_INDEXES=1, then 2, then 3; new tables get all of them.
+     * New indexes go at the end of the list.
+     *
+     * @memberof DatabaseStack
+     */
+    const indexes: GlobalSecondaryIndexProps[] = [
+      {
+        indexName: 'urlHash-index',
+        partitionKey: {
+          name: 'urlHash',
+          type: AttributeType.STRING
+        },
+        projectionType: ProjectionType.KEYS_ONLY,
+      },
+      {
+        indexName: 'owner-index',
+        partitionKey: {
+          name: 'owner',
+          type: AttributeType.STRING
+        },
+        sortKey: {
+          name: 'createdAt',
+          type: AttributeType.STRING
+        },
+        projectionType: ProjectionType.KEYS_ONLY,
+      },
+      {
+        indexName: 'tag-index',
+        partitionKey: {
+          name: 'tag',
+          type: AttributeType.STRING
+        },
+        sortKey: {
+          name: 'createdAt',
+          type: AttributeType.STRING
+        },
+        projectionType: ProjectionType.INCLUDE,
+        nonKeyAttributes: ['tagOf'],
+      },
+    ]
+    indexes
+      .slice(0, props.tableIndexes ?? indexes.length)
+      .forEach((index) => table.addGlobalSecondaryIndex(index))
+
+    /**
+     * DynamoDB Idempotency Table
+     *
+     * Holds the responses replayed to retried POST and PUT requests, see src/idempotency.py.
+     * Records expire through TTL, and the table shares the key schema of the links table.
+     *
+     * @memberof DatabaseStack
+     */
+    new Table(this, `idempotencyTable`, {
+      tableName: `${props.stage}-${props.project}-idempotency-table`,
+      partitionKey: {
+        name: 'slug',
+        type: AttributeType.STRING
+      },
+      timeToLiveAttribute: 'expiresAt',
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
     })
 
     /**
@@ -0,0 +1,141 @@
+""" Coalescing.
+
+This module contains the write coalescing of click records.
+
+During a burst a GET container serves many redirects of the same slug, one
+invocation after another, and each used to write its click in its own update.
+A ClickCoalescer keeps the clicks of the container pending instead, grouped
+by slug, and writes each slug's clicks with a single update that appends all
+of its records and adds their number to its counter. Write capacity during a
+burst drops by about the number of clicks coalesced per update.
+
+Coalescing is opt-in. Pending clicks are flushed when COALESCE_MAX_CLICKS of
+them are pending, when the oldest has waited COALESCE_WINDOW_SECONDS (checked on
+every click, since a frozen container runs no timers), and when the container
+shuts down. Lambda has no hook before a container is frozen, and it only sends
+SIGTERM before shutting down a container that has an extension registered, see
+flush_on_shutdown. Without one, up to COALESCE_MAX_CLICKS - 1 clicks are lost
+with each container, and the last clicks of a slug may stay pending for as long
+as the container lives. The default of 1 writes every click immediately; raise
+it only along with an extension, or when losing some clicks is acceptable.
+
+A flush writes the pending clicks of every slug, so the clicks of one slug
+failing to write never fail the redirect of another: they are dropped and
+counted in `dropped`.
+
+Functions:
+- flush_on_shutdown(coalescer: ClickCoalescer): Flush a coalescer when the container receives SIGTERM.
+
+Classes:
+- ClickCoalescer: Per container buffer of clicks, written with one update per slug.
+"""
+
+import os
+import signal
+import sys
+import time
+from os import environ
+from typing import Callable
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from repository import Repository
+from sharding import record_clicks
+
+COALESCE_MAX_CLICKS = int(environ.get("COALESCE_MAX_CLICKS") or 1)
+COALESCE_WINDOW_SECONDS = float(environ.get("COALESCE_WINDOW_SECONDS") or 1)
+
+
+class ClickCoalescer:
+    """Per container buffer of clicks, written with one update per slug."""
+
+    def __init__(
+        self,
+        repository: Repository,
+        region: str | None = None,
+        max_clicks: int = COALESCE_MAX_CLICKS,
+        window_seconds: float = COALESCE_WINDOW_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.repository = repository
+        self.region = region
+        self.max_clicks = max_clicks
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self.window_start = 0.0
+        self.pending: dict[str, tuple[int, list[dict]]] = {}
+        self.size = 0
+        self.dropped = 0
+
+    def add(self, slug: str, shards: int, click: dict) -> None:
+        """Add a click, flushing the pending clicks if they are due.
+
+        Args:
+            slug (str): The slug that was clicked.
+            shards (int): The current shard count of the slug.
+            click (dict): The click record.
+
+        Raises:
+            ClientError: If the clicks of this slug cannot be written. They are dropped.
+        """
+        if not self.pending:
+            self.window_start = self.clock()
+        clicks = self.pending.get(slug, (shards, []))[1]
+        clicks.append(click)
+        self.pending[slug] = (shards, clicks)
+        self.size += 1
+        if self.size >= self.max_clicks or self.clock() - self.window_start >= self.window_seconds:
+            errors = self.flush()
+            if slug in errors:
+                raise errors[slug]
+
+    def pending_clicks(self, slug: str) -> int:
+        """Get the number of clicks of a slug that are not written yet.
+
+        Args:
+            slug (str): The slug.
+
+        Returns:
+            int: The number of pending clicks.
+        """
+        return len(self.pending.get(slug, (1, []))[1])
+
+    def flush(self) -> dict[str, ClientError]:
+        """Write the pending clicks, with one update per slug.
+
+        Returns:
+            dict[str, ClientError]: The error of each slug whose update failed.
+                The clicks of those slugs are dropped.
+        """
+        errors = {}
+        while self.pending:
+            slug = next(iter(self.pending))
+            shards, clicks = self.pending.pop(slug)
+            self.size -= len(clicks)
+            try:
+                record_clicks(self.repository, slug, shards, clicks, self.region)
+            except ClientError as error:
+                self.dropped += len(clicks)
+                errors[slug] = error
+        return errors
+
+
+def flush_on_shutdown(coalescer: ClickCoalescer) -> None:
+    """Flush a coalescer when the container receives SIGTERM.
+
+    The previous SIGTERM handler still runs afterwards.
+
+    Args:
+        coalescer (ClickCoalescer): The coalescer to flush.
+    """
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def shutdown(signum, frame) -> None:
+        coalescer.flush()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
@@ -0,0 +1,335 @@
+""" Compaction.
+
+This module contains the offline job that archives old click records.
+
+Click records are appended to the "requests" list of slug items and click
+shards, so busy links keep growing towards the DynamoDB item size limit and
+every read of them gets slower. The job walks the table with a parallel scan,
+one thread per segment, and moves the click records older than
+COMPACTION_RETENTION_DAYS out of the items:
+
+- The records of each scanned page are written to one gzip compressed archive
+  file, in a columnar layout: one list per field (ARCHIVE_COLUMNS) instead of
+  one object per click, which compresses much better and reads like a table.
+  Archives are written under a local directory or an "s3://<bucket>/<prefix>"
+  location, partitioned by the date of the cutoff.
+- The archived records are then trimmed from the front of the list, and their
+  count moves from "clicks" to "archivedClicks", so the totals returned by the
+  sharding module's read_clicks do not change.
+
+Clicks are appended in time order, so the archived records are always a prefix
+of the list, and clicks recorded while the job runs are left alone.
+
+The job is resumable: the last key of each segment is saved to a checkpoint
+file after each page, and a rerun with the same checkpoint continues from there.
+Archives are written before items are trimmed, so a crash may archive some
+clicks twice but never loses any. Item writes are rate limited with a token
+bucket, so the job does not take the capacity the redirects need.
+
+Usage:
+    python src/compaction.py <archive location> [<checkpoint path>]
+        Archive the clicks older than COMPACTION_RETENTION_DAYS.
+
+- COMPACTION_RETENTION_DAYS: The age of the clicks to archive (default 30).
+- COMPACTION_SEGMENTS: The segments of the parallel scan (default 4).
+- COMPACTION_PAGE_SIZE: The items read per scan page (default 100).
+- COMPACTION_RATE: The item writes per second, as "<rate>/<burst>" (default "25/50").
+
+Functions:
+- archivable(requests: list, cutoff: str): Count the click records older than a cutoff.
+- encode_archive(records: list): Encode click records as a compressed columnar archive.
+- decode_archive(data: bytes): Decode the click records of an archive.
+
+Classes:
+- ArchiveStore: A local directory or S3 location receiving archive files.
+- Checkpoint: The progress of each scan segment, saved to a file.
+- Compactor: The compaction job.
+"""
+
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from os import environ
+from typing import Callable
+
+import boto3
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from rate_limiting import TokenBucket, parse_limit
+from repository import KEY_ATTRIBUTE, Repository
+
+COMPACTION_RETENTION_DAYS = float(environ.get("COMPACTION_RETENTION_DAYS") or 30)
+COMPACTION_SEGMENTS = int(environ.get("COMPACTION_SEGMENTS") or 4)
+COMPACTION_PAGE_SIZE = int(environ.get("COMPACTION_PAGE_SIZE") or 100)
+COMPACTION_RATE = parse_limit(environ.get("COMPACTION_RATE"), "25/50")
+ARCHIVE_COLUMNS = ("slug", "timestamp", "ip", "userAgent", "referer")
+# Keeps the REMOVE clause of an update well below the 4 KB expression limit.
+MAX_TRIM = 250
+
+
+def archivable(requests: list[dict], cutoff: str) -> int:
+    """Count the click records older than a cutoff at the front of a list.
+
+    Records without a timestamp predate it and are always archivable.
+
+    Args:
+        requests (list[dict]): The click records, oldest first.
+        cutoff (str): The ISO time before which clicks are archived.
+
+    Returns:
+        int: The number of records to archive.
+    """
+    count = 0
+    for click in requests:
+        timestamp = click.get("timestamp")
+        if timestamp and timestamp >= cutoff:
+            break
+        count += 1
+    return count
+
+
+def encode_archive(records: list[dict]) -> bytes:
+    """Encode click records as a compressed columnar archive.
+
+    Args:
+        records (list[dict]): The click records, each with the slug it belongs to.
+
+    Returns:
+        bytes: The gzip compressed JSON document, with one list per column.
+    """
+    document = {
+        "rows": len(records),
+        "columns": {column: [record.get(column) for record in records] for column in ARCHIVE_COLUMNS},
+    }
+    return gzip.compress(json.dumps(document, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+def decode_archive(data: bytes) -> list[dict]:
+    """Decode the click records of an archive.
+
+    Args:
+        data (bytes): The archive, see `encode_archive`.
+
+    Returns:
+        list[dict]: The click records.
+    """
+    document = json.loads(gzip.decompress(data))
+    columns = document["columns"]
+    return [
+        {column: columns[column][row] for column in ARCHIVE_COLUMNS} for row in range(document["rows"])
+    ]
+
+
+class ArchiveStore:
+    """A local directory or S3 location receiving archive files."""
+
+    def __init__(self, location: str, s3=None) -> None:
+        self.location = location.rstrip("/")
+        self.bucket = None
+        if self.location.startswith("s3://"):
+            self.bucket, _, self.prefix = self.location[len("s3://") :].partition("/")
+            self.s3 = s3 or boto3.client("s3")
+
+    def write(self, name: str, data: bytes) -> str:
+        """Write an archive file.
+
+        Args:
+            name (str): The relative name of the file.
+            data (bytes): The content of the file.
+
+        Returns:
+            str: The path or S3 URL of the file.
+        """
+        if self.bucket:
+            key = f"{self.prefix}/{name}" if self.prefix else name
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=data, ContentEncoding="gzip")
+            return f"s3://{self.bucket}/{key}"
+        path = os.path.join(self.location, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as archive:
+            archive.write(data)
+        os.replace(temporary_path, path)
+        return path
+
+
+class Checkpoint:
+    """The progress of each scan segment, saved to a file.
+
+    Without a path the progress is only kept in memory.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.segments: dict[str, dict] = {}
+        if path and os.path.exists(path):
+            with open(path) as checkpoint:
+                self.segments = json.load(checkpoint)
+
+    def progress(self, segment: int) -> tuple[dict | None, bool]:
+        """Get where a segment stopped.
+
+        Args:
+            segment (int): The segment.
+
+        Returns:
+            tuple[dict | None, bool]: The last key read, and whether the segment is done.
+        """
+        state = self.segments.get(str(segment)) or {}
+        return state.get("lastKey"), bool(state.get("done"))
+
+    def save(self, segment: int, last_key: dict | None) -> None:
+        """Record the progress of a segment and atomically write the checkpoint file.
+
+        Args:
+            segment (int): The segment.
+            last_key (dict | None): The last key read, or None once the segment is done.
+        """
+        with self.lock:
+            self.segments[str(segment)] = {"lastKey": last_key, "done": last_key is None}
+            if not self.path:
+                return
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as checkpoint:
+                json.dump(self.segments, checkpoint)
+            os.replace(temporary_path, self.path)
+
+
+class Compactor:
+    """The compaction job."""
+
+    def __init__(
+        self,
+        repository: Repository,
+        store: ArchiveStore,
+        checkpoint: Checkpoint | None = None,
+        retention_days: float = COMPACTION_RETENTION_DAYS,
+        segments: int = COMPACTION_SEGMENTS,
+        page_size: int = COMPACTION_PAGE_SIZE,
+        rate: tuple[float, float] = COMPACTION_RATE,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.repository = repository
+        self.store = store
+        self.checkpoint = checkpoint or Checkpoint()
+        self.retention_days = retention_days
+        self.segments = segments
+        self.page_size = page_size
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = TokenBucket(rate[0], rate[1], clock())
+        self.lock = threading.Lock()
+
+    def cutoff(self) -> str:
+        """Get the ISO time before which clicks are archived.
+
+        Returns:
+            str: The cutoff, in the format of click timestamps.
+        """
+        cutoff = datetime.fromtimestamp(self.clock(), tz=timezone.utc) - timedelta(days=self.retention_days)
+        return cutoff.replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+    def _throttle(self) -> None:
+        # The bucket is shared by every segment, and waiting holds the others back too.
+        with self.lock:
+            while True:
+                wait = self.bucket.take(1, self.clock())
+                if not wait:
+                    return
+                self.sleep(wait)
+
+    def run(self) -> dict:
+        """Compact every segment of the table, resuming from the checkpoint.
+
+        Returns:
+            dict: The number of "items" trimmed, "clicks" archived and "archives" written.
+
+        Raises:
+            ClientError: If the table cannot be read or written.
+        """
+        cutoff = self.cutoff()
+        totals = {"items": 0, "clicks": 0, "archives": 0}
+        with ThreadPoolExecutor(max_workers=self.segments) as executor:
+            results = executor.map(lambda segment: self.compact_segment(segment, cutoff), range(self.segments))
+            for result in results:
+                for name, count in result.items():
+                    totals[name] += count
+        return totals
+
+    def compact_segment(self, segment: int, cutoff: str) -> dict:
+        """Compact one segment of the table, resuming from the checkpoint.
+
+        Args:
+            segment (int): The segment.
+            cutoff (str): The ISO time before which clicks are archived.
+
+        Returns:
+            dict: The number of "items" trimmed, "clicks" archived and "archives" written.
+        """
+        totals = {"items": 0, "clicks": 0, "archives": 0}
+        start_key, done = self.checkpoint.progress(segment)
+        while not done:
+            page = self.repository.scan(
+                limit=self.page_size,
+                start_key=start_key,
+                projection=[KEY_ATTRIBUTE, "requests", "clicks"],
+                segment=segment if self.segments > 1 else None,
+                total_segments=self.segments if self.segments > 1 else None,
+            )
+            trims = [(item, archivable(item.get("requests", []), cutoff)) for item in page.items]
+            trims = [(item, count) for item, count in trims if count]
+            if trims:
+                records = [
+                    {"slug": item[KEY_ATTRIBUTE], **click}
+                    for item, count in trims
+                    for click in item["requests"][:count]
+                ]
+                name = f"{cutoff[:10]}/clicks-{segment:03}-{uuid.uuid4().hex}.json.gz"
+                self.store.write(name, encode_archive(records))
+                totals["archives"] += 1
+                for item, count in trims:
+                    if self._trim(item, count):
+                        totals["items"] += 1
+                        totals["clicks"] += count
+            start_key, done = page.last_key, not page.last_key
+            self.checkpoint.save(segment, start_key)
+        return totals
+
+    def _trim(self, item: dict, count: int) -> bool:
+        key = {KEY_ATTRIBUTE: item[KEY_ATTRIBUTE]}
+        for offset in range(0, count, MAX_TRIM):
+            chunk = min(MAX_TRIM, count - offset)
+            add = {"archivedClicks": chunk}
+            # Items written before the counter existed only count their records.
+            if "clicks" in item:
+                add["clicks"] = -chunk
+            self._throttle()
+            try:
+                self.repository.update(key, add=add, trim={"requests": chunk}, if_exists=True)
+            except ClientError as error:
+                # The link was deleted since it was read.
+                if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                return False
+        return True
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from regions import regional_repositories
+
+    print(
+        Compactor(
+            regional_repositories(environ.get("TABLE_NAME") or "dev-url-shortner-table")[1],
+            ArchiveStore(sys.argv[1]),
+            Checkpoint(sys.argv[2] if len(sys.argv) > 2 else None),
+        ).run()
+    )
@@ -10,8 +10,9 @@ Functions:
 import json
 from http import HTTPStatus
 from os import environ
+import os
+import sys
 
-import boto3
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.event_handler import (
     APIGatewayRestResolver,
@@ -21,26 +22,41 @@ from aws_lambda_powertools.event_handler import (
 from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from botocore.exceptions import ClientError
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from listing import TAGS_ATTRIBUTE, delete_tags
+from sharding import delete_shards, is_auxiliary, shard_count
+from rate_limiting import RateLimiter
+from regions import REPLICA_REGIONS, regional_repositories
+from slug_filter import SLUG_FILTER_ENABLED, record_deleted
+from profiling import Instrumentation
+from startup import Startup
+from tenancy import TenantResolver, tenant_key, validate_slug
 
 APP_NAME = environ.get("APP_NAME") or "url-shortener DELETE"
 AWS_REGION = environ.get("AWS_REGION") or "us-east-1"
 TABLE_NAME = environ.get("TABLE_NAME") or "dev-url-shortner-table"
-dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
-table = dynamodb.Table(TABLE_NAME)
+repository, home_repository = regional_repositories(TABLE_NAME, AWS_REGION)
 app = APIGatewayRestResolver()
 log: Logger = Logger(service=APP_NAME)
 trace: Tracer = Tracer(service=APP_NAME)
+instrument = Instrumentation(log, trace)
+instrument.attach(repository, home_repository)
+limiter = RateLimiter()
+tenants = TenantResolver(home_repository)
+startup = Startup(APP_NAME, [repository, home_repository])
 
 
 @app.delete("/")
-@trace.capture_method
+@instrument.capture_method
 def delete_item_by_slug() -> Response:
     """Delete a item from DynamoDB table.
 
     This function handles the DELETE request to delete an item from the DynamoDB table.
     It expects a JSON payload with a "slug" field specifying the item to be deleted.
-    If the item is found, it is deleted from the table returning a 204. 
+    If the item is found, it is deleted from the table in the home region along with its click shards and tag items, returning a 204. 
     Otherwise, a 404 response is returned.
+    The link is looked up in the tenant of the Host header, see the tenancy module.
+    If the slug contains the reserved shard or tenant separators, it returns a 400.
     If any error occurs during the deletion process, a 500 response is returned.
 
     Returns:
@@ -56,8 +72,22 @@ def delete_item_by_slug() -> Response:
             content_type=content_types.APPLICATION_JSON,
             body=json.dumps({"message": "slug is required."}),
         )
+    invalid = validate_slug(slug)
+    if invalid:
+        log.error(invalid)
+        return Response(
+            status_code=HTTPStatus.BAD_REQUEST.value,
+            content_type=content_types.APPLICATION_JSON,
+            body=json.dumps({"message": invalid}),
+        )
     try:
-        if not table.get_item(Key={"slug": slug}).get("Item"):
+        tenant = tenants.resolve(app.current_event)
+        key = tenant_key(tenant, slug)
+        limited = limiter.limit(app.current_event, key, tenant=tenant)
+        if limited:
+            return limited
+        item = home_repository.get({"slug": key})
+        if not item or is_auxiliary(item):
             log.error(f"Item with slug /{slug} not found.")
             return Response(
                 status_code=HTTPStatus.NOT_FOUND.value,
@@ -65,7 +95,11 @@ def delete_item_by_slug() -> Response:
                 body=json.dumps({"message": f"Item with a slug of /{slug} not found."}),
             )
 
-        table.delete_item(Key={"slug": slug})
+        home_repository.delete({"slug": key})
+        delete_shards(home_repository, key, shard_count(item), REPLICA_REGIONS)
+        delete_tags(home_repository, key, set(item.get(TAGS_ATTRIBUTE, ())))
+        if SLUG_FILTER_ENABLED:
+            record_deleted(home_repository, key)
 
         return Response(
             status_code=HTTPStatus.NO_CONTENT.value,
@@ -87,7 +121,9 @@ def lambda_handler(
     """Lambda handler.
 
     This is the entry point for the Lambda function.
-    It invokes the `resolve` method of the `app` object to handle the incoming event.
+    It invokes the `resolve` method of the `app` object to handle the incoming event,
+    through `startup`, which answers warm-up pings and records the cold start,
+    and `instrument`, which times the request phases.
 
     Args:
         event (APIGatewayProxyEvent): The event object representing the incoming API Gateway request.
@@ -96,4 +132,4 @@ def lambda_handler(
     Returns:
         dict[str, any]: The response from the Lambda function.
     """
-    return app.resolve(event=event, context=context)
+    return startup.handle(event, context, instrument.wrap(app.resolve))
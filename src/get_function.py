@@ -4,19 +4,25 @@ GET Lambda.
 This module contains the GET Lambda function for a URL shortener service. It retrieves items from a DynamoDB table and handles API Gateway requests.
 
 Functions:
-- get_all_items(): Get all items from the DynamoDB table.
+- get_all_items(): Get a page of items from the DynamoDB table, or of the links of an owner or a tag.
+- slugs_parameter(limit: int): Read the comma separated "slugs" query string parameter.
+- get_metadata(): Get the preview metadata of several links.
+- resolve_slugs(): Resolve several slugs to their target URLs, without recording clicks.
+- get_hot_slugs(): Get the most clicked links of the fleet.
 - get_item_by_slug(slug: str): Get an item from the DynamoDB table by slug.
+- get_item_stats(slug: str): Get the merged click count of an item by slug.
 - lambda_handler(event: APIGatewayProxyEvent, context: LambdaContext): Lambda handler function.
 """
 
 import json
+import math
+import time
 from datetime import datetime, timezone
 from http import HTTPStatus
 from os import environ
 import os
 import sys
 
-import boto3
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.event_handler import (
     APIGatewayRestResolver,
@@ -27,35 +33,123 @@ from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from botocore.exceptions import ClientError
 sys.path.append(os.path.join(os.path.dirname(__file__)))
+from coalescing import ClickCoalescer, flush_on_shutdown
 from core_modules import (get_current_time)
+from heavy_hitters import HeavyHitters, read_hot_slugs
+from link_metadata import METADATA_ATTRIBUTE, enqueue, is_stale
+from listing import list_links, without_tenant
+from regions import (REPLICA_REGIONS, batch_get_items, click_region,
+                     get_item, regional_repositories)
+from rate_limiting import (SCAN_REQUEST_COST, LoadShedder, RateLimiter,
+                           is_throttling_error)
+from repository import BATCH_GET_LIMIT, OWNER_INDEX, TAG_INDEX, Page
+from serialization import decode_cursor, dumps, encode_cursor, encode_page
+from slug_filter import SlugFilter
+from spool import CLICK_SPOOL_PATH, ClickSpool
+from tenancy import TenantResolver, in_tenant, tenant_key, validate_slug
+from sharding import (RECORD_TYPE_ATTRIBUTE, HotKeyDetector, is_auxiliary,
+                      promote, read_clicks, shard_count)
+from profiling import Instrumentation
+from startup import Startup
 
 APP_NAME = environ.get("APP_NAME") or "url-shortener GET"
 AWS_REGION = environ.get("AWS_REGION") or "us-east-1"
 TABLE_NAME = environ.get("TABLE_NAME") or "dev-url-shortner-table"
-dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
-table = dynamodb.Table(TABLE_NAME)
+MAX_PAGE_SIZE = int(environ.get("MAX_PAGE_SIZE") or 1000)
+MAX_METADATA_REFRESHES = int(environ.get("MAX_METADATA_REFRESHES") or 10)
+MAX_RESOLVE_SLUGS = int(environ.get("MAX_RESOLVE_SLUGS") or 500)
+repository, home_repository = regional_repositories(TABLE_NAME, AWS_REGION)
 app = APIGatewayRestResolver()
 log: Logger = Logger(service=APP_NAME)
 trace: Tracer = Tracer(service=APP_NAME)
+instrument = Instrumentation(log, trace)
+instrument.attach(repository, home_repository)
+hot_keys = HotKeyDetector()
+heavy_hitters = HeavyHitters()
+limiter = RateLimiter()
+tenants = TenantResolver(home_repository)
+shedder = LoadShedder()
+slug_filter = SlugFilter(home_repository)
+coalescer = ClickCoalescer(repository, click_region(AWS_REGION))
+flush_on_shutdown(coalescer)
+spool = (
+    ClickSpool(CLICK_SPOOL_PATH, repository, click_region(AWS_REGION), home_repository, log=log)
+    if CLICK_SPOOL_PATH
+    else None
+)
+startup = Startup(APP_NAME, [repository, home_repository])
 
 
 
 @app.get("/")
-@trace.capture_method
+@instrument.capture_method
 def get_all_items() -> Response:
-    """Get all items from the DynamoDB table."""
+    """Get a page of items from the DynamoDB table, or of the links of an owner or a tag.
+
+    The optional "limit" query string parameter sets the page size (capped at MAX_PAGE_SIZE)
+    and "cursor" continues from the "Cursor" returned by the previous page,
+    so memory used by the response scales with the page size rather than the table size.
+
+    Given an "owner" or a "tag", the links are read from the owner-index or the tag-index
+    instead of scanning the table, newest first, optionally created between "since" and "until"
+    (ISO 8601 times), see the listing module. Such pages hold BATCH_GET_LIMIT links by default
+    and cost one rate limit token per BATCH_GET_LIMIT links instead of SCAN_REQUEST_COST.
+    Only the links of the tenant of the Host header are listed, see the tenancy module.
+
+    Returns:
+        Response: The response containing the page of items or an error message.
+    """
+    owner = app.current_event.get_query_string_value("owner")
+    tag = app.current_event.get_query_string_value("tag")
+    since = app.current_event.get_query_string_value("since")
+    until = app.current_event.get_query_string_value("until")
+    if (owner and tag) or ((since or until) and not (owner or tag)):
+        log.error("Invalid listing filters.")
+        return Response(
+            status_code=HTTPStatus.BAD_REQUEST.value,
+            content_type=content_types.APPLICATION_JSON,
+            body=json.dumps(
+                {"message": "Filter by either 'owner' or 'tag', optionally with 'since' and 'until'."}
+            ),
+        )
+    try:
+        limit = app.current_event.get_query_string_value("limit")
+        if limit:
+            limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+        start_key = decode_cursor(app.current_event.get_query_string_value("cursor"))
+    except ValueError:
+        log.error("Invalid pagination parameters.")
+        return Response(
+            status_code=HTTPStatus.BAD_REQUEST.value,
+            content_type=content_types.APPLICATION_JSON,
+            body=json.dumps({"message": "Invalid pagination parameters."}),
+        )
+    if owner or tag:
+        limit = limit or BATCH_GET_LIMIT
+        cost = math.ceil(limit / BATCH_GET_LIMIT)
+    else:
+        cost = SCAN_REQUEST_COST
     try:
-        response = table.scan()
+        tenant = tenants.resolve(app.current_event)
+        limited = limiter.limit(app.current_event, cost=cost, tenant=tenant)
+        if limited:
+            return limited
+        if owner or tag:
+            index = OWNER_INDEX if owner else TAG_INDEX
+            page = list_links(repository, index, owner or tag, limit, start_key, since, until, tenant)
+        else:
+            page = repository.scan(limit, start_key, exclude=RECORD_TYPE_ATTRIBUTE)
+            items = [without_tenant(item, tenant) for item in page.items if in_tenant(tenant, item["slug"])]
+            page = Page(items, len(items), page.scanned, page.last_key)
         return Response(
             status_code=HTTPStatus.OK.value,
             content_type=content_types.APPLICATION_JSON,
             headers={"Access-Control-Allow-Origin": "*"},
-            body=json.dumps(
-                {
-                    "Count": response["Count"],
-                    "Items": response["Items"],
-                    "Scanned": response["ScannedCount"],
-                }
+            body=encode_page(
+                page.items,
+                Count=page.count,
+                Scanned=page.scanned,
+                Cursor=encode_cursor(page.last_key),
             ),
         )
     except ClientError as error:
@@ -67,13 +161,200 @@ def get_all_items() -> Response:
 
 
 
+def slugs_parameter(limit: int) -> tuple[list[str], Response | None]:
+    """Read the comma separated "slugs" query string parameter.
+
+    Args:
+        limit (int): The maximum number of slugs.
+
+    Returns:
+        tuple[list[str], Response | None]: The distinct slugs, in order, and a 400
+            response if there are none, more than `limit` or any invalid one, see `validate_slug`.
+    """
+    slugs = list(dict.fromkeys(
+        slug.strip()
+        for slug in (app.current_event.get_query_string_value("slugs") or "").split(",")
+        if slug.strip()
+    ))
+    if not slugs or len(slugs) > limit:
+        invalid = f"Between 1 and {limit} slugs are required."
+    else:
+        invalid = next(filter(None, map(validate_slug, slugs)), None)
+        if invalid is None:
+            return slugs, None
+    log.error(f"Invalid slugs parameter: {invalid}")
+    return slugs, Response(
+        status_code=HTTPStatus.BAD_REQUEST.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=json.dumps({"message": invalid}),
+    )
+
+
+@app.get("/metadata")
+@instrument.capture_method
+def get_metadata() -> Response:
+    """Get the preview metadata of several links with one batched read.
+
+    The "slugs" query string parameter lists up to BATCH_GET_LIMIT comma separated slugs.
+    Links whose metadata is missing or stale get null and a refresh is enqueued,
+    for at most MAX_METADATA_REFRESHES links per request, see the link_metadata module.
+    Slugs are looked up in the tenant of the Host header, see the tenancy module.
+
+    Returns:
+        Response: The response mapping each existing slug to its metadata, or an error message.
+    """
+    slugs, invalid = slugs_parameter(BATCH_GET_LIMIT)
+    if invalid:
+        return invalid
+    try:
+        tenant = tenants.resolve(app.current_event)
+        limited = limiter.limit(app.current_event, tenant=tenant)
+        if limited:
+            return limited
+        keys = {tenant_key(tenant, slug): slug for slug in slugs}
+        items = batch_get_items(
+            repository,
+            home_repository,
+            [{"slug": key} for key in keys],
+            projection=["slug", "targetUrl", METADATA_ATTRIBUTE, RECORD_TYPE_ATTRIBUTE],
+        )
+        now = time.time()
+        metadata = {}
+        refreshes = 0
+        for item in items:
+            if is_auxiliary(item):
+                continue
+            slug = keys[item["slug"]]
+            if not is_stale(item, now):
+                metadata[slug] = item[METADATA_ATTRIBUTE]
+                continue
+            metadata[slug] = None
+            if refreshes < MAX_METADATA_REFRESHES and enqueue(item["slug"], str(item["targetUrl"])):
+                refreshes += 1
+        return Response(
+            status_code=HTTPStatus.OK.value,
+            content_type=content_types.APPLICATION_JSON,
+            headers={"Access-Control-Allow-Origin": "*"},
+            body=dumps({"metadata": metadata}),
+        )
+    except ClientError as error:
+        log.error(error.response["Error"]["Message"])
+        return Response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            body=json.dumps({"message": error.response["Error"]["Message"]}),
+        )
+
+
+@app.get("/resolve")
+@instrument.capture_method
+def resolve_slugs() -> Response:
+    """Resolve several slugs to their target URLs, without recording clicks.
+
+    The "slugs" query string parameter lists up to MAX_RESOLVE_SLUGS comma separated slugs.
+    They are read with BatchGetItem, BATCH_GET_LIMIT keys at a time, projected to
+    the target URL and metadata. Slugs the slug filter rules out are not read.
+    The request costs one rate limit token per batch.
+    Slugs are looked up in the tenant of the Host header, see the tenancy module.
+
+    Returns:
+        Response: The response mapping each slug to its link, or null, or an error message.
+    """
+    slugs, invalid = slugs_parameter(MAX_RESOLVE_SLUGS)
+    if invalid:
+        return invalid
+    try:
+        tenant = tenants.resolve(app.current_event)
+        limited = limiter.limit(
+            app.current_event, cost=math.ceil(len(slugs) / BATCH_GET_LIMIT), tenant=tenant
+        )
+        if limited:
+            return limited
+        keys = {tenant_key(tenant, slug): slug for slug in slugs}
+        items = batch_get_items(
+            repository,
+            home_repository,
+            [{"slug": key} for key in keys if slug_filter.might_exist(key)],
+            projection=["slug", "targetUrl", METADATA_ATTRIBUTE, RECORD_TYPE_ATTRIBUTE],
+        )
+        links = dict.fromkeys(slugs)
+        for item in items:
+            if not is_auxiliary(item):
+                links[keys[item["slug"]]] = {
+                    "targetUrl": item["targetUrl"],
+                    METADATA_ATTRIBUTE: item.get(METADATA_ATTRIBUTE),
+                }
+        return Response(
+            status_code=HTTPStatus.OK.value,
+            content_type=content_types.APPLICATION_JSON,
+            headers={"Access-Control-Allow-Origin": "*"},
+            body=dumps({"links": links}),
+        )
+    except ClientError as error:
+        log.error(error.response["Error"]["Message"])
+        return Response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            body=json.dumps({"message": error.response["Error"]["Message"]}),
+        )
+
+
+@app.get("/hot")
+@instrument.capture_method
+def get_hot_slugs() -> Response:
+    """Get the most clicked links of the fleet.
+
+    Containers publish their top links once a minute, see the heavy_hitters module.
+    The optional "limit" query string parameter sets the number of links.
+    Only the links of the tenant of the Host header are listed, see the tenancy module.
+
+    Returns:
+        Response: The response listing the slugs and their estimated clicks, or an error message.
+    """
+    try:
+        tenant = tenants.resolve(app.current_event)
+        limited = limiter.limit(app.current_event, tenant=tenant)
+        if limited:
+            return limited
+        limit = int(app.current_event.get_query_string_value("limit") or heavy_hitters.k)
+        links = read_hot_slugs(home_repository, max(limit, 1), keep=lambda key: in_tenant(tenant, key))
+        return Response(
+            status_code=HTTPStatus.OK.value,
+            content_type=content_types.APPLICATION_JSON,
+            headers={"Access-Control-Allow-Origin": "*"},
+            body=dumps({"links": links}),
+        )
+    except ValueError:
+        log.error("Invalid limit parameter.")
+        return Response(
+            status_code=HTTPStatus.BAD_REQUEST.value,
+            content_type=content_types.APPLICATION_JSON,
+            body=json.dumps({"message": "Invalid limit parameter."}),
+        )
+    except ClientError as error:
+        log.error(error.response["Error"]["Message"])
+        return Response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            body=json.dumps({"message": error.response["Error"]["Message"]}),
+        )
+
+
 @app.get("/<slug>")
-@trace.capture_method
+@instrument.capture_method
 def get_item_by_slug(slug: str) -> Response:
     """Get an item from the DynamoDB table by slug. 
     Update the item's requests list with the current request. 
     Then return a 302 redirect to the item's target URL.
 
+    Clicks of hot slugs are written to click shards, see the sharding module.
+    With COALESCE_MAX_CLICKS above 1, clicks are coalesced into one write per slug, see the coalescing module.
+    With CLICK_SPOOL_PATH set, clicks are spooled locally and written, and hot slugs promoted, in the background
+    instead, so click writes never fail or slow down a redirect, see the spool module.
+    Clicks are counted in the container's top links, published once a minute, see the heavy_hitters module.
+    While DynamoDB is throttling, clicks that are not spooled are not recorded so redirects keep working,
+    and the slug whose click write was throttled is promoted to click shards.
+    In a replica region, a slug missing locally is looked up in the home region.
+    Slugs the slug filter rules out are answered with a 404 without reading the table.
+    The slug is looked up in the tenant of the Host header, see the tenancy module.
+
     Args:
         slug (str): The slug of the item to retrieve.
 
@@ -84,9 +365,14 @@ def get_item_by_slug(slug: str) -> Response:
         ClientError: If there is an error retrieving the item from the DynamoDB table.
     """
     try:
-        item = table.get_item(Key={"slug": slug}).get("Item")
+        tenant = tenants.resolve(app.current_event)
+        key = tenant_key(tenant, slug)
+        limited = limiter.limit(app.current_event, key, tenant=tenant)
+        if limited:
+            return limited
+        item = slug_filter.might_exist(key) and get_item(repository, home_repository, {"slug": key})
 
-        if not item:
+        if not item or is_auxiliary(item):
             log.error("URL not found")
             return Response(
                 status_code=HTTPStatus.NOT_FOUND.value,
@@ -100,22 +386,43 @@ def get_item_by_slug(slug: str) -> Response:
             referer = None
         user_agent = app.current_event.request_context.identity.user_agent
         source_ip = app.current_event.request_context.identity.source_ip
+        heavy_hitters.record(key)
 
-        table.update_item(
-            Key={"slug": slug},
-            UpdateExpression="SET #requests = list_append(#requests, :request)",
-            ExpressionAttributeNames={"#requests": "requests"},
-            ExpressionAttributeValues={
-                ":request": [
-                    {
-                        "ip": source_ip,
-                        "userAgent": user_agent,
-                        "referer": referer,
-                        "timestamp": get_current_time(),
-                    }
-                ]
-            },
-        )
+        if shedder.active and not spool:
+            log.warning(f"Shedding load, click on /{key} not recorded.")
+        else:
+            click = {
+                "ip": source_ip,
+                "userAgent": user_agent,
+                "referer": referer,
+                "timestamp": get_current_time(),
+            }
+            if spool:
+                # The spool worker paces its writes, and promotes the slug once it is hot.
+                spool.append(key, shard_count(item), click, hot=hot_keys.record(key))
+            else:
+                try:
+                    shards = shard_count(item)
+                    if hot_keys.record(key):
+                        shards = promote(home_repository, key, shards)
+                        log.info(f"Slug /{key} is hot, writing clicks to {shards} shards.")
+                    coalescer.add(key, shards, click)
+                except ClientError as error:
+                    if not is_throttling_error(error):
+                        raise
+                    shedder.trip()
+                    log.warning(f"DynamoDB is throttling, shedding click writes for {shedder.seconds}s.")
+                    try:
+                        shards = promote(home_repository, key, shard_count(item))
+                        log.info(f"Slug /{key} is throttled, writing clicks to {shards} shards.")
+                    except ClientError as promote_error:
+                        log.warning(f"Slug /{key} not promoted: {promote_error.response['Error']['Message']}")
+            try:
+                hot = heavy_hitters.publish(home_repository)
+                if hot:
+                    log.info("Hot slugs", hot_slugs=dict(hot))
+            except ClientError as error:
+                log.warning(f"Hot slugs not published: {error.response['Error']['Message']}")
 
         return Response(
             status_code=HTTPStatus.FOUND.value,
@@ -133,14 +440,66 @@ def get_item_by_slug(slug: str) -> Response:
         )
 
 
-@trace.capture_lambda_handler
+@app.get("/<slug>/stats")
+@instrument.capture_method
+def get_item_stats(slug: str) -> Response:
+    """Get the click count of an item by slug, merged across its click shards.
+
+    Clicks this container has not written yet are included, whether pending or spooled.
+    The slug is looked up in the tenant of the Host header, see the tenancy module.
+
+    Args:
+        slug (str): The slug of the item.
+
+    Returns:
+        Response: The response containing the click count or an error message.
+    """
+    try:
+        tenant = tenants.resolve(app.current_event)
+        key = tenant_key(tenant, slug)
+        limited = limiter.limit(app.current_event, key, tenant=tenant)
+        if limited:
+            return limited
+        item = get_item(repository, home_repository, {"slug": key})
+
+        if not item or is_auxiliary(item):
+            log.error("URL not found")
+            return Response(
+                status_code=HTTPStatus.NOT_FOUND.value,
+                body=json.dumps({"message": "Target URL not found"}),
+            )
+
+        return Response(
+            status_code=HTTPStatus.OK.value,
+            content_type=content_types.APPLICATION_JSON,
+            headers={"Access-Control-Allow-Origin": "*"},
+            body=json.dumps(
+                {
+                    "slug": slug,
+                    "clicks": read_clicks(repository, item, REPLICA_REGIONS)
+                    + coalescer.pending_clicks(key)
+                    + (spool.pending_clicks(key) if spool else 0),
+                    "shards": shard_count(item),
+                }
+            ),
+        )
+    except ClientError as error:
+        log.error(error.response["Error"]["Message"])
+        return Response(
+            status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+            body=json.dumps({"message": error.response["Error"]["Message"]}),
+        )
+
+
 def lambda_handler(
     event: APIGatewayProxyEvent, context: LambdaContext
 ) -> dict[str, any]:
     """Lambda handler.
 
     This is the entry point for the Lambda function.
-    It invokes the `resolve` method of the `app` object to handle the incoming event.
+    It invokes the `resolve` method of the `app` object to handle the incoming event,
+    through `startup`, which answers warm-up pings and records the cold start,
+    and `instrument`, which times the request phases.
 
     Args:
         event (APIGatewayProxyEvent): The event object representing the incoming API Gateway request.
@@ -149,4 +508,4 @@ def lambda_handler(
     Returns:
         dict[str, any]: The response from the Lambda function.
     """
-    return app.resolve(event, context)
+    return startup.handle(event, context, instrument.wrap(app.resolve))
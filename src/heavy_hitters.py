@@ -0,0 +1,321 @@
+""" Heavy Hitters.
+
+This module contains the streaming detection of the most clicked slugs.
+
+Each container counts the clicks it serves in a Count-Min sketch over a sliding
+window of HEAVY_HITTERS_WINDOW_SECONDS, split into HEAVY_HITTERS_BUCKETS
+buckets: every bucket has its own sketch, and the window sketch is their sum,
+so when the oldest bucket expires it is subtracted from the window. A click
+costs one hash of the slug and two increments per sketch row, and memory is
+fixed whatever the number of slugs. The HEAVY_HITTERS_TOP_K slugs with the
+highest estimates are kept as candidates, giving the container's top links.
+
+Once per HEAVY_HITTERS_PUBLISH_SECONDS each container appends its top links to
+one of HEAVY_HITTERS_SHARDS hot slugs items, picked when the container starts,
+so the top links of the whole fleet are one batch read away. The items of an
+interval are reused two intervals later: the first container to publish to an
+item in a new interval resets it with a conditional write, the others append.
+An item holds at most HEAVY_HITTERS_MAX_REPORTS reports, so it stays under the
+400 KB item limit whatever the size of the fleet; once an item is full, the
+containers publishing to it skip the interval.
+Counts are estimates, Count-Min sketches never undercount.
+
+- HEAVY_HITTERS_WIDTH: The counters per sketch row (default 1024).
+- HEAVY_HITTERS_DEPTH: The rows per sketch, at most 16 (default 4).
+- HEAVY_HITTERS_TOP_K: The slugs tracked per container (default 20).
+- HEAVY_HITTERS_WINDOW_SECONDS: The sliding window (default 60).
+- HEAVY_HITTERS_BUCKETS: The buckets of the window (default 6).
+- HEAVY_HITTERS_PUBLISH_SECONDS: Seconds between publications (default 60).
+- HEAVY_HITTERS_SHARDS: The hot slugs items per interval (default 16).
+- HEAVY_HITTERS_MAX_REPORTS: The reports per hot slugs item (default 150).
+
+Functions:
+- hot_slugs_key(interval: int, shard: int): Build the key of a hot slugs item of a publication interval.
+- read_hot_slugs(repository, limit: int, now: float, keep: Callable, shards: int): Get the top links of the fleet.
+
+Classes:
+- CountMinSketch: A Count-Min sketch of click counts.
+- HeavyHitters: Per container top links over a sliding window.
+"""
+
+import hashlib
+import heapq
+import os
+import random
+import sys
+import time
+from collections import deque
+from operator import itemgetter
+from os import environ
+from typing import Callable
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from repository import KEY_ATTRIBUTE, Repository
+from sharding import RECORD_TYPE_ATTRIBUTE
+
+HEAVY_HITTERS_WIDTH = int(environ.get("HEAVY_HITTERS_WIDTH") or 1024)
+HEAVY_HITTERS_DEPTH = int(environ.get("HEAVY_HITTERS_DEPTH") or 4)
+HEAVY_HITTERS_TOP_K = int(environ.get("HEAVY_HITTERS_TOP_K") or 20)
+HEAVY_HITTERS_WINDOW_SECONDS = float(environ.get("HEAVY_HITTERS_WINDOW_SECONDS") or 60)
+HEAVY_HITTERS_BUCKETS = int(environ.get("HEAVY_HITTERS_BUCKETS") or 6)
+HEAVY_HITTERS_PUBLISH_SECONDS = int(environ.get("HEAVY_HITTERS_PUBLISH_SECONDS") or 60)
+HEAVY_HITTERS_SHARDS = int(environ.get("HEAVY_HITTERS_SHARDS") or 16)
+# A report is at most a 2 KB slug and its count, so a full item stays under 400 KB.
+HEAVY_HITTERS_MAX_REPORTS = int(environ.get("HEAVY_HITTERS_MAX_REPORTS") or 150)
+HOT_SLUGS_RECORD = "hotSlugs"
+
+
+class CountMinSketch:
+    """A Count-Min sketch of click counts.
+
+    Estimates are at least the true count, and exceed it by at most
+    2 / width of the total count with probability 1 - 1 / 2 ** depth.
+    """
+
+    def __init__(self, width: int = HEAVY_HITTERS_WIDTH, depth: int = HEAVY_HITTERS_DEPTH) -> None:
+        if not 0 < depth <= 16:
+            raise ValueError("The depth must be between 1 and 16.")
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def indexes(self, key: str) -> list[int]:
+        """Get the counter of a key in each row.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            list[int]: The index of the key's counter in each row.
+        """
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=4 * self.depth).digest()
+        return [
+            int.from_bytes(digest[4 * row : 4 * row + 4], "little") % self.width
+            for row in range(self.depth)
+        ]
+
+    def add(self, indexes: list[int], count: int = 1) -> int:
+        """Count occurrences of a key.
+
+        Args:
+            indexes (list[int]): The counters of the key, see `indexes`.
+            count (int): The occurrences to add.
+
+        Returns:
+            int: The new estimate of the key's count.
+        """
+        for row, index in zip(self.rows, indexes):
+            row[index] += count
+        return self.estimate(indexes)
+
+    def estimate(self, indexes: list[int]) -> int:
+        """Estimate the count of a key.
+
+        Args:
+            indexes (list[int]): The counters of the key, see `indexes`.
+
+        Returns:
+            int: The estimate, at least the true count.
+        """
+        return min(row[index] for row, index in zip(self.rows, indexes))
+
+    def subtract(self, other: "CountMinSketch") -> None:
+        """Subtract the counts of a sketch of the same shape.
+
+        Args:
+            other (CountMinSketch): The sketch, whose counts must be included in this one.
+        """
+        self.rows = [
+            [count - other_count for count, other_count in zip(row, other_row)]
+            for row, other_row in zip(self.rows, other.rows)
+        ]
+
+    def clear(self) -> None:
+        """Reset every counter."""
+        self.rows = [[0] * self.width for _ in range(self.depth)]
+
+
+class HeavyHitters:
+    """Per container top links over a sliding window."""
+
+    def __init__(
+        self,
+        k: int = HEAVY_HITTERS_TOP_K,
+        window_seconds: float = HEAVY_HITTERS_WINDOW_SECONDS,
+        buckets: int = HEAVY_HITTERS_BUCKETS,
+        publish_seconds: int = HEAVY_HITTERS_PUBLISH_SECONDS,
+        width: int = HEAVY_HITTERS_WIDTH,
+        depth: int = HEAVY_HITTERS_DEPTH,
+        shards: int = HEAVY_HITTERS_SHARDS,
+        max_reports: int = HEAVY_HITTERS_MAX_REPORTS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.k = k
+        self.buckets = buckets
+        self.bucket_seconds = window_seconds / buckets
+        self.publish_seconds = publish_seconds
+        self.shard = random.randrange(shards)
+        self.max_reports = max_reports
+        self.width = width
+        self.depth = depth
+        self.clock = clock
+        self.clear()
+        self.published = int(self.bucket_start // self.publish_seconds)
+
+    def clear(self) -> None:
+        """Forget every click."""
+        self.window = CountMinSketch(self.width, self.depth)
+        self.ring: deque[CountMinSketch] = deque([CountMinSketch(self.width, self.depth)])
+        self.bucket_start = self.clock()
+        self.candidates: dict[str, int] = {}
+        self.floor = 0
+
+    def _rotate(self, now: float) -> None:
+        if now - self.bucket_start >= self.bucket_seconds * self.buckets:
+            self.clear()
+            self.bucket_start = now
+            return
+        while now - self.bucket_start >= self.bucket_seconds:
+            self.bucket_start += self.bucket_seconds
+            if len(self.ring) < self.buckets:
+                self.ring.append(CountMinSketch(self.width, self.depth))
+                continue
+            expired = self.ring.popleft()
+            self.window.subtract(expired)
+            expired.clear()
+            self.ring.append(expired)
+        estimates = {
+            slug: self.window.estimate(self.window.indexes(slug)) for slug in self.candidates
+        }
+        self.candidates = {slug: estimate for slug, estimate in estimates.items() if estimate}
+        self.floor = min(self.candidates.values(), default=0)
+
+    def record(self, slug: str) -> int:
+        """Count a click.
+
+        Args:
+            slug (str): The slug that was clicked.
+
+        Returns:
+            int: The estimated clicks of the slug in the window.
+        """
+        now = self.clock()
+        if now - self.bucket_start >= self.bucket_seconds:
+            self._rotate(now)
+        indexes = self.window.indexes(slug)
+        self.ring[-1].add(indexes)
+        estimate = self.window.add(indexes)
+        if slug in self.candidates or len(self.candidates) < self.k:
+            self.candidates[slug] = estimate
+        elif estimate > self.floor:
+            coldest = min(self.candidates, key=self.candidates.get)
+            if estimate > self.candidates[coldest]:
+                del self.candidates[coldest]
+                self.candidates[slug] = estimate
+            self.floor = min(self.candidates.values())
+        return estimate
+
+    def top(self, limit: int | None = None) -> list[tuple[str, int]]:
+        """Get the most clicked slugs of the window.
+
+        Args:
+            limit (int | None): The number of slugs, up to `k`.
+
+        Returns:
+            list[tuple[str, int]]: The slugs and their estimated clicks, most clicked first.
+        """
+        return heapq.nlargest(limit or self.k, self.candidates.items(), key=itemgetter(1))
+
+    def publish(self, repository: Repository) -> list[tuple[str, int]] | None:
+        """Append the top links of the container to its hot slugs item, once per interval.
+
+        Args:
+            repository (Repository): The repository holding the hot slugs item.
+
+        Returns:
+            list[tuple[str, int]] | None: The published top links, or None if
+                they were already published in the current interval.
+
+        Raises:
+            ClientError: If the hot slugs item cannot be written, or is full.
+        """
+        now = self.clock()
+        interval = int(now // self.publish_seconds)
+        if interval == self.published:
+            return None
+        self.published = interval
+        if now - self.bucket_start >= self.bucket_seconds:
+            self._rotate(now)
+        top = self.top()
+        if not top:
+            return top
+        reports = [{"slug": slug, "clicks": clicks} for slug, clicks in top[: self.max_reports]]
+        key = {KEY_ATTRIBUTE: hot_slugs_key(interval, self.shard)}
+        try:
+            repository.update(
+                key,
+                assign={RECORD_TYPE_ATTRIBUTE: HOT_SLUGS_RECORD, "interval": interval, "reports": reports},
+                if_below={"interval": interval},
+            )
+        except ClientError as error:
+            if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            repository.update(
+                key,
+                append={"reports": reports},
+                if_smaller={"reports": self.max_reports - len(reports) + 1},
+            )
+        return top
+
+
+def hot_slugs_key(interval: int, shard: int) -> str:
+    """Build the key of a hot slugs item of a publication interval.
+
+    Two sets of items alternate, one for the current interval and one for the previous.
+
+    Args:
+        interval (int): The publication interval, the epoch time divided by the publish period.
+        shard (int): The item of the interval.
+
+    Returns:
+        str: The partition key of the item.
+    """
+    return f"#{HOT_SLUGS_RECORD}:{interval % 2}:{shard}"
+
+
+def read_hot_slugs(
+    repository: Repository,
+    limit: int = HEAVY_HITTERS_TOP_K,
+    now: float | None = None,
+    publish_seconds: int = HEAVY_HITTERS_PUBLISH_SECONDS,
+    keep: Callable[[str], bool] | None = None,
+    shards: int = HEAVY_HITTERS_SHARDS,
+) -> list[dict]:
+    """Get the top links of the fleet over the current and previous publication intervals.
+
+    Args:
+        repository (Repository): The repository holding the hot slugs items.
+        limit (int): The number of links.
+        now (float | None): The current epoch time.
+        publish_seconds (int): The publication period.
+        keep (Callable[[str], bool] | None): Only return the slugs this accepts, all when None.
+        shards (int): The hot slugs items per interval.
+
+    Returns:
+        list[dict]: The "slug" and estimated "clicks" of the top links, most clicked first.
+    """
+    interval = int((time.time() if now is None else now) // publish_seconds)
+    items = repository.batch_get(
+        [{KEY_ATTRIBUTE: hot_slugs_key(interval - offset, shard)} for offset in (0, 1) for shard in range(shards)]
+    )
+    clicks: dict[str, int] = {}
+    for item in items:
+        if interval - int(item["interval"]) in (0, 1):
+            for report in item.get("reports", []):
+                if keep and not keep(report["slug"]):
+                    continue
+                clicks[report["slug"]] = clicks.get(report["slug"], 0) + int(report["clicks"])
+    top = heapq.nlargest(limit, clicks.items(), key=itemgetter(1))
+    return [{"slug": slug, "clicks": count} for slug, count in top]
@@ -0,0 +1,338 @@
+""" Idempotency.
+
+This module contains the idempotency keys of the POST and PUT Lambdas.
+
+A client may send an IDEMPOTENCY_HEADER with a create or update. The first
+request with a key claims an idempotency record, runs and stores its response
+in the record; retries with the same key replay the stored response instead of
+running again, so a retried create gets its own 201 rather than a 409, and a
+retry storm costs one small read per request without touching the links table.
+
+Records live in their own table (IDEMPOTENCY_TABLE_NAME) in the home region,
+which expires them through DynamoDB TTL on the IDEMPOTENCY_TTL_ATTRIBUTE.
+The table shares the key schema of the links table so it is served by the same
+Repository classes, and records carry a RECORD_TYPE_ATTRIBUTE so they are
+skipped by listings when the local engine keeps every table in one database.
+Each container also keeps the records it completed or replayed in a small
+least recently used cache, so its own retries are answered without any read.
+
+- A key is claimed with a conditional write that only succeeds if no record
+  exists or the existing record expired. A claim expires after
+  IDEMPOTENCY_IN_PROGRESS_SECONDS, so a request that crashed can be retried.
+- A retry while the first request runs gets a 409, and reusing a key with a
+  different request body gets a 422.
+- Only responses that would be the same on a retry are stored: 5xx and 429
+  responses release the claim instead.
+- Records are keyed by the tenant and the caller of the request as well as
+  the key, see `caller`, so two clients sending the same key never replay
+  each other's response.
+- Failures of the idempotency table never fail a request: the request then
+  runs without idempotency.
+
+- IDEMPOTENCY_TABLE_NAME: The table of idempotency records.
+- IDEMPOTENCY_TTL_SECONDS: Seconds a response is replayed for (default a day).
+- IDEMPOTENCY_IN_PROGRESS_SECONDS: Seconds a claim is held for (default 30).
+- IDEMPOTENCY_CACHE_SIZE: Records cached per container (default 1000).
+
+Functions:
+- caller(event: APIGatewayProxyEvent) -> str | None: Get the API key or authorizer principal of a request.
+
+Classes:
+- IdempotencyStore: The idempotency records of a Lambda, with a per container cache.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from functools import wraps
+from http import HTTPStatus
+from os import environ
+from typing import Callable
+
+from aws_lambda_powertools.event_handler import Response, content_types
+from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
+from botocore.exceptions import BotoCoreError, ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from repository import KEY_ATTRIBUTE, Repository
+from sharding import RECORD_TYPE_ATTRIBUTE
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENCY_TABLE_NAME = environ.get("IDEMPOTENCY_TABLE_NAME") or "dev-url-shortner-idempotency-table"
+IDEMPOTENCY_TTL_ATTRIBUTE = "expiresAt"
+IDEMPOTENCY_TTL_SECONDS = int(environ.get("IDEMPOTENCY_TTL_SECONDS") or 24 * 3600)
+IDEMPOTENCY_IN_PROGRESS_SECONDS = int(environ.get("IDEMPOTENCY_IN_PROGRESS_SECONDS") or 30)
+IDEMPOTENCY_CACHE_SIZE = int(environ.get("IDEMPOTENCY_CACHE_SIZE") or 1000)
+IDEMPOTENCY_RECORD = "idempotency"
+MAX_KEY_LENGTH = 255
+IN_PROGRESS = "IN_PROGRESS"
+COMPLETED = "COMPLETED"
+
+
+def _digest(value: str) -> str:
+    digest = hashlib.sha256(value.encode("utf-8")).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def caller(event: APIGatewayProxyEvent) -> str | None:
+    """Get the API key or authorizer principal of a request.
+
+    Both are set by API Gateway, so a client cannot claim the records of another.
+
+    Args:
+        event (APIGatewayProxyEvent): The API Gateway event.
+
+    Returns:
+        str | None: The API key, or the principal, if any.
+    """
+    request_context = event.get("requestContext") or {}
+    identity = request_context.get("identity") or {}
+    authorizer = request_context.get("authorizer") or {}
+    return identity.get("apiKey") or authorizer.get("principalId")
+
+
+def _error(status: HTTPStatus, message: str) -> Response:
+    return Response(
+        status_code=status.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=json.dumps({"message": message}),
+    )
+
+
+class IdempotencyStore:
+    """The idempotency records of a Lambda, with a per container cache."""
+
+    def __init__(
+        self,
+        repository: Repository,
+        ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS,
+        in_progress_seconds: int = IDEMPOTENCY_IN_PROGRESS_SECONDS,
+        max_size: int = IDEMPOTENCY_CACHE_SIZE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.repository = repository
+        self.ttl_seconds = ttl_seconds
+        self.in_progress_seconds = in_progress_seconds
+        self.max_size = max_size
+        self.clock = clock
+        self.entries: OrderedDict[str, dict] = OrderedDict()
+
+    @staticmethod
+    def record_key(scope: str, key: str, tenant: str | None = None, principal: str | None = None) -> str:
+        """Build the key of an idempotency record.
+
+        Args:
+            scope (str): The operation the key belongs to, such as "POST".
+            key (str): The idempotency key sent by the client.
+            tenant (str | None): The tenant of the request, if any.
+            principal (str | None): The caller of the request, see `caller`.
+
+        Returns:
+            str: The partition key of the record.
+        """
+        return f"#{IDEMPOTENCY_RECORD}:{scope}:{_digest(json.dumps([tenant, principal, key]))}"
+
+    def _cached(self, record_key: str) -> dict | None:
+        record = self.entries.get(record_key)
+        if record is None:
+            return None
+        if record[IDEMPOTENCY_TTL_ATTRIBUTE] <= self.clock():
+            del self.entries[record_key]
+            return None
+        self.entries.move_to_end(record_key)
+        return record
+
+    def _cache(self, record_key: str, record: dict) -> None:
+        self.entries[record_key] = record
+        self.entries.move_to_end(record_key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def _replay(self, record: dict, request_hash: str) -> Response:
+        if record["requestHash"] != request_hash:
+            return _error(
+                HTTPStatus.UNPROCESSABLE_ENTITY,
+                f"The {IDEMPOTENCY_HEADER} was already used with a different request.",
+            )
+        if record["status"] != COMPLETED:
+            return _error(
+                HTTPStatus.CONFLICT, f"A request with this {IDEMPOTENCY_HEADER} is in progress."
+            )
+        response = record["response"]
+        return Response(
+            status_code=int(response["statusCode"]),
+            content_type=response.get("contentType"),
+            body=response.get("body"),
+            headers={**response.get("headers", {}), IDEMPOTENCY_REPLAYED_HEADER: "true"},
+        )
+
+    def begin(self, record_key: str, request_hash: str) -> Response | None:
+        """Claim an idempotency record, or get the response to replay.
+
+        Args:
+            record_key (str): The key of the record, see `record_key`.
+            request_hash (str): The hash of the request body.
+
+        Returns:
+            Response | None: The response to return instead of running the
+                request, or None if the request claimed the record and must run.
+
+        Raises:
+            ClientError: If the idempotency table cannot be read or written.
+        """
+        record = self._cached(record_key)
+        if record is not None:
+            return self._replay(record, request_hash)
+
+        now = self.clock()
+        key = {KEY_ATTRIBUTE: record_key}
+        record = self.repository.get(key, consistent=True)
+        if record is None or int(record[IDEMPOTENCY_TTL_ATTRIBUTE]) <= now:
+            try:
+                self.repository.update(
+                    key,
+                    assign={
+                        RECORD_TYPE_ATTRIBUTE: IDEMPOTENCY_RECORD,
+                        "status": IN_PROGRESS,
+                        "requestHash": request_hash,
+                        IDEMPOTENCY_TTL_ATTRIBUTE: int(now) + self.in_progress_seconds,
+                    },
+                    if_below={IDEMPOTENCY_TTL_ATTRIBUTE: int(now) + 1},
+                )
+                return None
+            except ClientError as error:
+                if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+            # Another request claimed the key between the read and the write.
+            record = self.repository.get(key, consistent=True) or {
+                "status": IN_PROGRESS,
+                "requestHash": request_hash,
+            }
+        if record["status"] == COMPLETED:
+            self._cache(record_key, record)
+        return self._replay(record, request_hash)
+
+    def complete(self, record_key: str, request_hash: str, response: Response) -> None:
+        """Store the response of a request that claimed a record, or release the claim.
+
+        Args:
+            record_key (str): The key of the record.
+            request_hash (str): The hash of the request body.
+            response (Response): The response of the request.
+
+        Raises:
+            ClientError: If the idempotency table cannot be written.
+        """
+        key = {KEY_ATTRIBUTE: record_key}
+        if response.status_code >= 500 or response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+            self.repository.delete(key)
+            return
+        record = {
+            KEY_ATTRIBUTE: record_key,
+            RECORD_TYPE_ATTRIBUTE: IDEMPOTENCY_RECORD,
+            "status": COMPLETED,
+            "requestHash": request_hash,
+            "response": {
+                "statusCode": response.status_code,
+                "contentType": response.headers.get("Content-Type"),
+                "body": response.body,
+                "headers": {
+                    name: value
+                    for name, value in response.headers.items()
+                    if name != "Content-Type" and isinstance(value, str)
+                },
+            },
+            IDEMPOTENCY_TTL_ATTRIBUTE: int(self.clock()) + self.ttl_seconds,
+        }
+        self.repository.put(record)
+        self._cache(record_key, record)
+
+    def handle(
+        self,
+        scope: str,
+        event: APIGatewayProxyEvent,
+        route: Callable[[], Response],
+        resolve_tenant: Callable[[APIGatewayProxyEvent], str | None] | None = None,
+    ) -> Response:
+        """Run a route once per idempotency key, tenant and caller.
+
+        Requests without an IDEMPOTENCY_HEADER run as they are.
+
+        Args:
+            scope (str): The operation the route performs, such as "POST".
+            event (APIGatewayProxyEvent): The request.
+            route (Callable[[], Response]): The route function.
+            resolve_tenant (Callable[[APIGatewayProxyEvent], str | None] | None): Gets
+                the tenant of the request, if the Lambda serves several tenants.
+
+        Returns:
+            Response: The response of the route, or the replayed response.
+        """
+        key = event.get_header_value(IDEMPOTENCY_HEADER, case_sensitive=False)
+        if key is None:
+            return route()
+        if not 0 < len(key) <= MAX_KEY_LENGTH:
+            return _error(
+                HTTPStatus.BAD_REQUEST,
+                f"The {IDEMPOTENCY_HEADER} header must have 1 to {MAX_KEY_LENGTH} characters.",
+            )
+
+        request_hash = _digest(event.body or "")
+        try:
+            tenant = resolve_tenant(event) if resolve_tenant else None
+            record_key = self.record_key(scope, key, tenant, caller(event))
+            replay = self.begin(record_key, request_hash)
+        except (BotoCoreError, ClientError):
+            return route()
+        if replay is not None:
+            return replay
+
+        try:
+            response = route()
+        except BaseException:
+            self._release(record_key)
+            raise
+        try:
+            self.complete(record_key, request_hash, response)
+        except (BotoCoreError, ClientError):
+            # The claim expires after in_progress_seconds.
+            pass
+        return response
+
+    def _release(self, record_key: str) -> None:
+        try:
+            self.repository.delete({KEY_ATTRIBUTE: record_key})
+        except (BotoCoreError, ClientError):
+            pass
+
+    def idempotent(
+        self,
+        scope: str,
+        current_event: Callable[[], APIGatewayProxyEvent],
+        resolve_tenant: Callable[[APIGatewayProxyEvent], str | None] | None = None,
+    ) -> Callable:
+        """Decorate a route function to run once per idempotency key, see `handle`.
+
+        Args:
+            scope (str): The operation the route performs, such as "POST".
+            current_event (Callable[[], APIGatewayProxyEvent]): Gets the request being resolved.
+            resolve_tenant (Callable[[APIGatewayProxyEvent], str | None] | None): Gets
+                the tenant of the request, if the Lambda serves several tenants.
+
+        Returns:
+            Callable: The decorator.
+        """
+
+        def decorator(route: Callable[[], Response]) -> Callable[[], Response]:
+            @wraps(route)
+            def wrapper() -> Response:
+                return self.handle(scope, current_event(), route, resolve_tenant)
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,290 @@
+""" Link Metadata.
+
+This module contains the link preview metadata cache.
+
+Creating or updating a link enqueues an asynchronous fetch of its target URL:
+the POST and PUT Lambdas invoke the METADATA Lambda with InvocationType
+"Event", so the request does not wait for the target site. The METADATA Lambda
+fetches the page, extracts its title, description and favicon, and stores them
+in the METADATA_ATTRIBUTE map of the slug item together with a hash of the
+favicon, so clients can cache favicons by content. Metadata is refreshed after
+METADATA_TTL_SECONDS, or METADATA_RETRY_SECONDS after a failed fetch, which
+stores an "error" entry so the fetch is not enqueued again until then.
+
+Target URLs are chosen by users, so fetches only reach public addresses: the
+host of the URL and of every redirect is resolved and refused if any of its
+addresses is private, loopback, link-local or otherwise not global, such as
+the instance metadata endpoint 169.254.169.254. Each connection checks the
+address it actually reached again, so a host that resolves to another address
+on the second lookup is refused too.
+
+The GET /metadata?slugs=... route returns the metadata of up to BATCH_GET_LIMIT
+links with one batched read, and enqueues refreshes for stale entries, so a
+listing page needs a single request instead of one fetch per link.
+
+- METADATA_FUNCTION_NAME: The METADATA Lambda, fetches are not enqueued when unset.
+- METADATA_TTL_SECONDS: Seconds before metadata is refreshed (default a week).
+- METADATA_RETRY_SECONDS: Seconds before a failed fetch is retried (default an hour).
+- METADATA_FETCH_TIMEOUT: Seconds to wait for each fetch (default 3).
+
+Functions:
+- fetch(url: str, timeout: float): Fetch the preview metadata of a page.
+- is_stale(item: dict, now: float): Check whether the metadata of an item must be refreshed.
+- enqueue(slug: str, target_url: str): Enqueue a metadata fetch for a link.
+- refresh(repository, slug: str, target_url: str, now: float): Fetch and store the metadata of a link.
+"""
+
+import base64
+import hashlib
+import http.client
+import ipaddress
+import json
+import os
+import socket
+import sys
+import time
+from html.parser import HTMLParser
+from os import environ
+from typing import Callable
+from urllib.parse import urljoin, urlsplit
+from urllib.request import (HTTPHandler, HTTPRedirectHandler, HTTPSHandler,
+                            ProxyHandler, Request, build_opener)
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from core_modules import get_current_time
+from repository import Repository
+
+METADATA_ATTRIBUTE = "metadata"
+METADATA_FUNCTION_NAME = environ.get("METADATA_FUNCTION_NAME")
+METADATA_TTL_SECONDS = int(environ.get("METADATA_TTL_SECONDS") or 7 * 24 * 3600)
+METADATA_RETRY_SECONDS = int(environ.get("METADATA_RETRY_SECONDS") or 3600)
+METADATA_FETCH_TIMEOUT = float(environ.get("METADATA_FETCH_TIMEOUT") or 3)
+MAX_PAGE_BYTES = 256 * 1024
+MAX_FAVICON_BYTES = 64 * 1024
+USER_AGENT = "url-shortener-metadata/1.0"
+# Everything that can go wrong fetching and decoding a page.
+FETCH_ERRORS = (OSError, ValueError, LookupError, http.client.HTTPException)
+_clients: dict[str, any] = {}
+
+
+class _PageParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.in_title = False
+        self.title = ""
+        self.meta: dict[str, str] = {}
+        self.icon = None
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        attrs = {name: value or "" for name, value in attrs}
+        if tag == "title":
+            # Only the first title is the page's, later ones belong to SVG images.
+            self.in_title = not self.title
+        elif tag == "meta":
+            name = (attrs.get("name") or attrs.get("property") or "").lower()
+            self.meta.setdefault(name, attrs.get("content", "").strip())
+        elif tag == "link" and self.icon is None:
+            if "icon" in attrs.get("rel", "").lower().split():
+                self.icon = attrs.get("href")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "title":
+            self.in_title = False
+
+    def handle_data(self, data: str) -> None:
+        if self.in_title:
+            self.title += data
+
+
+def _check_address(address: str) -> None:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    if not ip.is_global or ip.is_multicast:
+        raise ValueError(f"Refusing to fetch the non-public address {address}.")
+
+
+def _check_url(url: str) -> None:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Unsupported URL: {url}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    for *_, address in socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM):
+        _check_address(address[0])
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def connect(self) -> None:
+        super().connect()
+        _check_address(self.sock.getpeername()[0])
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def connect(self) -> None:
+        super().connect()
+        _check_address(self.sock.getpeername()[0])
+
+
+class _PublicHTTPHandler(HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _PublicRedirectHandler(HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_public_opener = build_opener(ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler, _PublicRedirectHandler)
+
+
+def _open_public(request: Request, timeout: float):
+    _check_url(request.full_url)
+    return _public_opener.open(request, timeout=timeout)
+
+
+def _read(url: str, timeout: float, limit: int, opener: Callable) -> tuple[bytes, str, str]:
+    if urlsplit(url).scheme not in ("http", "https"):
+        raise ValueError(f"Unsupported URL: {url}")
+    request = Request(url, headers={"User-Agent": USER_AGENT})
+    with opener(request, timeout=timeout) as response:
+        charset = response.headers.get_content_charset() or "utf-8"
+        return response.read(limit), charset, response.geturl()
+
+
+def fetch(url: str, timeout: float = METADATA_FETCH_TIMEOUT, opener: Callable = _open_public) -> dict:
+    """Fetch the preview metadata of a page.
+
+    Only the first MAX_PAGE_BYTES of the page are parsed, decoded as UTF-8 if
+    its charset is unknown. A favicon that cannot be fetched is left out rather
+    than failing the fetch.
+
+    Args:
+        url (str): The URL of the page.
+        timeout (float): The seconds to wait for each request.
+        opener (Callable): Opens a request, only to public addresses by default.
+
+    Returns:
+        dict: The title, description, faviconUrl and faviconHash found.
+
+    Raises:
+        URLError: If the page cannot be fetched.
+        ValueError: If the URL is not an http or https URL, or reaches a non-public address.
+        HTTPException: If the response is malformed.
+    """
+    body, charset, final_url = _read(url, timeout, MAX_PAGE_BYTES, opener)
+    try:
+        text = body.decode(charset, errors="replace")
+    except LookupError:
+        text = body.decode("utf-8", errors="replace")
+    parser = _PageParser()
+    parser.feed(text)
+
+    metadata = {
+        "title": " ".join(parser.title.split()) or parser.meta.get("og:title"),
+        "description": parser.meta.get("description") or parser.meta.get("og:description"),
+        "faviconUrl": urljoin(final_url, parser.icon or "/favicon.ico"),
+    }
+    try:
+        icon = _read(metadata["faviconUrl"], timeout, MAX_FAVICON_BYTES, opener)[0]
+        digest = hashlib.blake2b(icon, digest_size=16).digest()
+        metadata["faviconHash"] = base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+    except FETCH_ERRORS:
+        del metadata["faviconUrl"]
+    return {name: value for name, value in metadata.items() if value}
+
+
+def is_stale(item: dict, now: float) -> bool:
+    """Check whether the metadata of an item must be fetched or refreshed.
+
+    Args:
+        item (dict): The slug item.
+        now (float): The current epoch time.
+
+    Returns:
+        bool: True if the item has no metadata for its target URL, or it expired.
+    """
+    metadata = item.get(METADATA_ATTRIBUTE)
+    return (
+        not metadata
+        or metadata.get("url") != item.get("targetUrl")
+        or int(metadata.get("refreshAt", 0)) <= now
+    )
+
+
+def _lambda_client():
+    if "lambda" not in _clients:
+        _clients["lambda"] = boto3.client("lambda")
+    return _clients["lambda"]
+
+
+def enqueue(slug: str, target_url: str, client=None) -> bool:
+    """Enqueue a metadata fetch for a link.
+
+    Failures never fail the calling request: the GET /metadata route enqueues
+    the fetch again once it finds the metadata stale.
+
+    Args:
+        slug (str): The slug of the link.
+        target_url (str): The target URL to fetch.
+        client (LambdaClient | None): The Lambda client, created once per container when None.
+
+    Returns:
+        bool: True if the fetch was enqueued, False if METADATA_FUNCTION_NAME is
+            unset or the METADATA Lambda could not be invoked.
+    """
+    if not METADATA_FUNCTION_NAME:
+        return False
+    try:
+        (client or _lambda_client()).invoke(
+            FunctionName=METADATA_FUNCTION_NAME,
+            InvocationType="Event",
+            Payload=json.dumps({"slug": slug, "targetUrl": target_url}),
+        )
+    except (BotoCoreError, ClientError):
+        return False
+    return True
+
+
+def refresh(
+    repository: Repository,
+    slug: str,
+    target_url: str,
+    now: float | None = None,
+    fetcher: Callable[[str], dict] = fetch,
+) -> dict | None:
+    """Fetch and store the metadata of a link, unless it is fresh or the link changed.
+
+    Args:
+        repository (Repository): The repository.
+        slug (str): The slug of the link.
+        target_url (str): The target URL the fetch was enqueued for.
+        now (float | None): The current epoch time.
+        fetcher (Callable[[str], dict]): Fetches the metadata of a URL.
+
+    Returns:
+        dict | None: The stored metadata, or None if nothing was fetched.
+    """
+    now = time.time() if now is None else now
+    item = repository.get({"slug": slug})
+    if not item or item.get("targetUrl") != target_url or not is_stale(item, now):
+        return None
+
+    try:
+        metadata = fetcher(target_url)
+        ttl = METADATA_TTL_SECONDS
+    except FETCH_ERRORS:
+        metadata = {"error": "fetch failed"}
+        ttl = METADATA_RETRY_SECONDS
+    metadata.update(url=target_url, fetchedAt=get_current_time(), refreshAt=int(now) + ttl)
+    repository.update({"slug": slug}, assign={METADATA_ATTRIBUTE: metadata}, if_exists=True)
+    return metadata
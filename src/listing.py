@@ -0,0 +1,188 @@
+""" Listing.
+
+This module contains the listing of links by owner and by tag, newest first.
+
+Links may carry an "owner" and a set of "tags". The owner-index global
+secondary index is keyed by owner and "createdAt", so the links of an owner
+are read with a query rather than a scan of the table. A link item can only
+sit once in an index, so each tag of a link is written as an auxiliary item
+keyed "<slug>#tag:<tag>" that holds the tag, the creation time of the link and
+the slug it belongs to, and the tag-index is keyed by tag and "createdAt".
+Owners and tags are indexed under the composite key of the tenant of the link,
+see the tenancy module's `tenant_key`, so a listing only reads the index
+entries of one tenant, and the prefix is stripped from the links it returns.
+
+Both indexes only project keys, and the slug of the tag items, so click writes
+to a link never write to an index. Listings read the keys of a page from the
+index and then the links themselves with BatchGetItem, so a listing costs
+reads proportional to the page rather than to the table.
+
+- MAX_TAGS: The maximum number of tags of a link (default 10).
+- MAX_LABEL_LENGTH: The maximum length of an owner or a tag (default 64).
+
+Functions:
+- validate(event_data: dict): Check the owner and tags of a request.
+- tag_key(slug: str, tag: str): Build the key of a tag item.
+- write_tags(repository, slug: str, created_at: str, tags: set): Write the tag items of a link.
+- delete_tags(repository, slug: str, tags: set): Delete the tag items of a link.
+- list_links(repository, index: str, value: str, limit: int, ...): Get a page of links from an index.
+- without_tenant(item: dict, tenant: str): Get a link as returned to clients of its tenant.
+"""
+
+import os
+import sys
+from os import environ
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from repository import KEY_ATTRIBUTE, TAG_INDEX, Page, Repository
+from sharding import RECORD_TYPE_ATTRIBUTE, SHARD_SEPARATOR, is_auxiliary
+from tenancy import TENANT_SEPARATOR, strip_tenant, tenant_key
+
+OWNER_ATTRIBUTE = "owner"
+TAGS_ATTRIBUTE = "tags"
+TAG_ATTRIBUTE = "tag"
+TAG_RECORD = "tag"
+MAX_TAGS = int(environ.get("MAX_TAGS") or 10)
+MAX_LABEL_LENGTH = int(environ.get("MAX_LABEL_LENGTH") or 64)
+
+
+def _is_label(value: any) -> bool:
+    return isinstance(value, str) and 0 < len(value) <= MAX_LABEL_LENGTH and TENANT_SEPARATOR not in value
+
+
+def validate(event_data: dict) -> str | None:
+    """Check the owner and tags of a create or update request.
+
+    Args:
+        event_data (dict): The request body.
+
+    Returns:
+        str | None: The error message, or None if the owner and tags are valid or absent.
+    """
+    if OWNER_ATTRIBUTE in event_data and not _is_label(event_data[OWNER_ATTRIBUTE]):
+        return (
+            f"The '{OWNER_ATTRIBUTE}' field must be a string of 1 to {MAX_LABEL_LENGTH} characters, "
+            f"without '{TENANT_SEPARATOR}'."
+        )
+    tags = event_data.get(TAGS_ATTRIBUTE, [])
+    if (
+        not isinstance(tags, list)
+        or not all(_is_label(tag) for tag in tags)
+        or len(set(tags)) > MAX_TAGS
+    ):
+        return (
+            f"The '{TAGS_ATTRIBUTE}' field must be a list of at most {MAX_TAGS} strings "
+            f"of 1 to {MAX_LABEL_LENGTH} characters, without '{TENANT_SEPARATOR}'."
+        )
+    return None
+
+
+def tag_key(slug: str, tag: str) -> str:
+    """Build the key of a tag item.
+
+    Args:
+        slug (str): The slug of the link.
+        tag (str): The tag.
+
+    Returns:
+        str: The partition key of the tag item.
+    """
+    return f"{slug}{SHARD_SEPARATOR}{TAG_RECORD}:{tag}"
+
+
+def write_tags(
+    repository: Repository, slug: str, created_at: str, tags: set[str], tenant: str | None = None
+) -> None:
+    """Write the tag items of a link.
+
+    Args:
+        repository (Repository): The repository.
+        slug (str): The slug of the link.
+        created_at (str): The creation time of the link, the sort key of the tag-index.
+        tags (set[str]): The tags to write.
+        tenant (str | None): The tenant of the link, or None for the default tenant.
+    """
+    for tag in sorted(tags):
+        repository.put(
+            {
+                KEY_ATTRIBUTE: tag_key(slug, tag),
+                RECORD_TYPE_ATTRIBUTE: TAG_RECORD,
+                TAG_ATTRIBUTE: tenant_key(tenant, tag),
+                "tagOf": slug,
+                "createdAt": created_at,
+            }
+        )
+
+
+def delete_tags(repository: Repository, slug: str, tags: set[str]) -> None:
+    """Delete the tag items of a link.
+
+    Args:
+        repository (Repository): The repository.
+        slug (str): The slug of the link.
+        tags (set[str]): The tags to delete.
+    """
+    if tags:
+        repository.batch_delete({KEY_ATTRIBUTE: tag_key(slug, tag)} for tag in sorted(tags))
+
+
+def list_links(
+    repository: Repository,
+    index: str,
+    value: str,
+    limit: int,
+    start_key: dict | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    tenant: str | None = None,
+) -> Page:
+    """Get a page of links of a tenant from the owner-index or the tag-index, newest first.
+
+    Links deleted since the index was read are left out of the page.
+
+    Args:
+        repository (Repository): The repository.
+        index (str): OWNER_INDEX or TAG_INDEX.
+        value (str): The owner or the tag.
+        limit (int): The maximum number of links.
+        start_key (dict | None): The last key of the previous page.
+        since (str | None): Only return links created at or after this time.
+        until (str | None): Only return links created at or before this time.
+        tenant (str | None): The tenant, or None for the default tenant.
+
+    Returns:
+        Page: The page of links, in index order.
+    """
+    page = repository.query(
+        index,
+        tenant_key(tenant, value),
+        limit=limit,
+        start_key=start_key,
+        projection=[KEY_ATTRIBUTE, "tagOf"],
+        forward=False,
+        since=since,
+        until=until,
+    )
+    slugs = [item["tagOf"] if index == TAG_INDEX else item[KEY_ATTRIBUTE] for item in page.items]
+    found = {
+        item[KEY_ATTRIBUTE]: without_tenant(item, tenant)
+        for item in repository.batch_get([{KEY_ATTRIBUTE: slug} for slug in slugs])
+        if not is_auxiliary(item)
+    }
+    items = [found[slug] for slug in slugs if slug in found]
+    return Page(items, len(items), page.scanned, page.last_key)
+
+
+def without_tenant(item: dict, tenant: str | None) -> dict:
+    """Get a link as returned to clients of its tenant.
+
+    Args:
+        item (dict): The link item.
+        tenant (str | None): The tenant of the link, or None for the default tenant.
+
+    Returns:
+        dict: The link, with the owner it was created with.
+    """
+    if tenant and OWNER_ATTRIBUTE in item:
+        return {**item, OWNER_ATTRIBUTE: strip_tenant(tenant, item[OWNER_ATTRIBUTE])}
+    return item
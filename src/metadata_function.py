@@ -0,0 +1,67 @@
+""" METADATA Lambda.
+
+This module contains the METADATA Lambda function, which is invoked asynchronously
+by the POST, PUT and GET Lambdas to fetch the preview metadata of a link's target
+URL and store it with the link, see the link_metadata module.
+
+Functions:
+- lambda_handler(event: dict, context: LambdaContext): Lambda handler function.
+"""
+
+from os import environ
+import os
+import sys
+
+from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools.utilities.typing import LambdaContext
+from botocore.exceptions import ClientError
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from link_metadata import refresh
+from regions import regional_repositories
+from startup import Startup
+
+APP_NAME = environ.get("APP_NAME") or "url-shortener METADATA"
+AWS_REGION = environ.get("AWS_REGION") or "us-east-1"
+TABLE_NAME = environ.get("TABLE_NAME") or "dev-url-shortner-table"
+home_repository = regional_repositories(TABLE_NAME, AWS_REGION)[1]
+log: Logger = Logger(service=APP_NAME)
+trace: Tracer = Tracer(service=APP_NAME)
+startup = Startup(APP_NAME, [home_repository])
+
+
+def refresh_metadata(event: dict, context: LambdaContext) -> dict[str, any]:
+    """Fetch and store the metadata of the link in the event.
+
+    Args:
+        event (dict): The "slug" and "targetUrl" of the link.
+        context (LambdaContext): The runtime information of the Lambda function.
+
+    Returns:
+        dict[str, any]: Whether the metadata was refreshed.
+    """
+    try:
+        metadata = refresh(home_repository, event["slug"], event["targetUrl"])
+    except ClientError as error:
+        if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        metadata = None
+    if metadata is None:
+        log.info(f"Metadata of /{event['slug']} is fresh or the link changed.")
+    return {"refreshed": metadata is not None}
+
+
+@trace.capture_lambda_handler
+def lambda_handler(event: dict, context: LambdaContext) -> dict[str, any]:
+    """Lambda handler.
+
+    This function is the entry point for the Lambda function.
+    Events go through `startup`, which answers warm-up pings and records the cold start.
+
+    Args:
+        event (dict): The "slug" and "targetUrl" of the link.
+        context (LambdaContext): The runtime information of the Lambda function.
+
+    Returns:
+        dict[str, any]: Whether the metadata was refreshed.
+    """
+    return startup.handle(event, context, refresh_metadata)
@@ -4,6 +4,8 @@ This module contains the POST Lambda function for creating shortened URLs.
 
 Functions:
 - post_item(): Creates an item in the DynamoDB table.
+- track_created(key: str): Add a created link to the slug filter delta.
+- conflict(): Build the response to a create that would duplicate a link.
 - lambda_handler(event: APIGatewayProxyEvent, context: LambdaContext): Lambda handler function.
 """
 
@@ -14,7 +16,6 @@ from os import environ
 import os
 import sys
 
-import boto3
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.event_handler import (
     APIGatewayRestResolver,
@@ -26,25 +27,51 @@ from aws_lambda_powertools.utilities.typing import LambdaContext
 from botocore.exceptions import ClientError
 sys.path.append(os.path.join(os.path.dirname(__file__)))
 from core_modules import (get_current_time)
+from idempotency import IDEMPOTENCY_TABLE_NAME, IdempotencyStore
+from link_metadata import enqueue
+from listing import OWNER_ATTRIBUTE, TAGS_ATTRIBUTE, validate, write_tags
+from rate_limiting import RateLimiter
+from regions import regional_repositories
+from repository import URL_HASH_INDEX
+from slug_filter import SLUG_FILTER_ENABLED, record_created
+from url_normalization import URL_HASH_ATTRIBUTE, RecentUrls, url_hash
+from profiling import Instrumentation
+from startup import Startup
+from tenancy import TenantResolver, tenant_key, validate_slug
 
 APP_NAME = environ.get("APP_NAME") or "url-shortener POST"
 AWS_REGION = environ.get("AWS_REGION") or "us-east-1"
 TABLE_NAME = environ.get("TABLE_NAME") or "dev-url-shortner-table"
-dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
-table = dynamodb.Table(TABLE_NAME)
+repository, home_repository = regional_repositories(TABLE_NAME, AWS_REGION)
 app = APIGatewayRestResolver()
 log: Logger = Logger(service=APP_NAME)
 trace: Tracer = Tracer(service=APP_NAME)
+instrument = Instrumentation(log, trace)
+instrument.attach(repository, home_repository)
+limiter = RateLimiter()
+tenants = TenantResolver(home_repository)
+recent_urls = RecentUrls()
+idempotency = IdempotencyStore(regional_repositories(IDEMPOTENCY_TABLE_NAME, AWS_REGION)[1])
+startup = Startup(APP_NAME, [repository, home_repository, idempotency.repository])
 
 
 @app.post("/")
-@trace.capture_method
+@instrument.capture_method
+@idempotency.idempotent("POST", lambda: app.current_event, tenants.resolve)
 def post_item() -> Response:
     """POST an item to DynamoDB table.
 
     This function handles the POST request to create a shortened URL item in the DynamoDB table and returns a 201.
+    The item is written to the table in the home region.
     If the request body is missing a required field, it returns a 400.
-    If the item already exists, it returns a 409.
+    If the slug contains the reserved shard or tenant separators or is a reserved path, it returns a 400.
+    The link is created in the tenant of the Host header, see the tenancy module.
+    The optional "owner" and "tags" fields make the link listable by owner and by tag,
+    see the listing module; if they are invalid, it returns a 400.
+    If the slug or the target URL is already in use, it returns a 409.
+    Target URLs are compared in canonical form, see the url_normalization module.
+    A fetch of the target page's preview metadata is enqueued, see the link_metadata module.
+    Retries with the same Idempotency-Key header replay the first response, see the idempotency module.
 
     Returns:
         Response: The HTTP response object.
@@ -67,28 +94,60 @@ def post_item() -> Response:
                     {"message": f"The '{field}' field is required."}
                 ),
             )
+    invalid = validate_slug(slug)
+    if invalid:
+        log.error(invalid)
+        return Response(
+            status_code=HTTPStatus.BAD_REQUEST.value,
+            content_type=content_types.APPLICATION_JSON,
+            body=json.dumps({"message": invalid}),
+        )
+    invalid = validate(event_data)
+    if invalid:
+        log.error(invalid)
+        return Response(
+            status_code=HTTPStatus.BAD_REQUEST.value,
+            content_type=content_types.APPLICATION_JSON,
+            body=json.dumps({"message": invalid}),
+        )
+    tags = set(event_data.get(TAGS_ATTRIBUTE, []))
     try:
+        tenant = tenants.resolve(app.current_event)
+        key = tenant_key(tenant, slug)
+        limited = limiter.limit(app.current_event, event_data.get("slug") and key, tenant=tenant)
+        if limited:
+            return limited
+        url_key = tenant_key(tenant, url_hash(str(target_url)))
         # check if and item with the same id OR the same url already exists
-        if (
-            table.get_item(Key={"slug": slug}).get("Item")
-            or table.scan(
-                FilterExpression=boto3.dynamodb.conditions.Attr("targetUrl").eq(target_url)
-            )["Items"]
-        ):
-            log.error("Item already exists.")
-            return Response(
-                status_code=HTTPStatus.CONFLICT.value,
-                content_type=content_types.APPLICATION_JSON,
-                body=json.dumps({"message": "Item already exists."}),
-            )
+        if recent_urls.get(url_key) or home_repository.get({"slug": key}):
+            return conflict()
+        existing = home_repository.query(URL_HASH_INDEX, url_key, limit=1, projection=["slug"]).items
+        if existing:
+            recent_urls.add(url_key, existing[0]["slug"])
+            return conflict()
 
         item = {
-            "slug": slug,
+            "slug": key,
             "targetUrl": target_url,
+            URL_HASH_ATTRIBUTE: url_key,
             "requests": [],
             "createdAt": created_at,
         }
-        table.put_item(Item=item)
+        if OWNER_ATTRIBUTE in event_data:
+            item[OWNER_ATTRIBUTE] = tenant_key(tenant, event_data[OWNER_ATTRIBUTE])
+        if tags:
+            item[TAGS_ATTRIBUTE] = tags
+        try:
+            home_repository.put(item, if_not_exists=True)
+        except ClientError as error:
+            if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            return conflict()
+        recent_urls.add(url_key, key)
+        write_tags(home_repository, key, created_at, tags, tenant)
+        if SLUG_FILTER_ENABLED:
+            track_created(key)
+        enqueue(key, target_url)
 
         return Response(
             status_code=HTTPStatus.CREATED.value,
@@ -104,12 +163,43 @@ def post_item() -> Response:
         )
 
 
+def track_created(key: str) -> None:
+    """Add a created link to the slug filter delta, see the slug_filter module.
+
+    The link exists whether or not this succeeds, so failures are logged rather than returned.
+
+    Args:
+        key (str): The key of the link.
+    """
+    try:
+        if not record_created(home_repository, key):
+            log.warning("The slug filter delta is full, rebuild the slug filter.")
+    except ClientError as error:
+        log.error(f"Failed to add /{key} to the slug filter: {error.response['Error']['Message']}")
+
+
+def conflict() -> Response:
+    """Build the response to a create that would duplicate a link.
+
+    Returns:
+        Response: The 409 response.
+    """
+    log.error("Item already exists.")
+    return Response(
+        status_code=HTTPStatus.CONFLICT.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=json.dumps({"message": "Item already exists."}),
+    )
+
+
 def lambda_handler(
     event: APIGatewayProxyEvent, context: LambdaContext
 ) -> dict[str, any]:
     """Lambda handler.
 
     This function is the entry point for the Lambda function.
+    Events go through `startup`, which answers warm-up pings and records the cold start,
+    and `instrument`, which times the request phases.
 
     Args:
         event (APIGatewayProxyEvent): The event data passed to the Lambda function.
@@ -118,4 +208,4 @@ def lambda_handler(
     Returns:
         dict[str, any]: The response from the Lambda function.
     """
-    return app.resolve(event=event, context=context)
+    return startup.handle(event, context, instrument.wrap(app.resolve))
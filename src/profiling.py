@@ -0,0 +1,251 @@
+""" Profiling.
+
+This module contains the tracing sampling, profiling and phase timings shared by
+the Lambda functions.
+
+Each handler module creates an Instrumentation and decorates its routes with
+`instrument.capture_method` instead of `trace.capture_method`:
+
+- Tracing: a route call is traced with an X-Ray subsegment only for a sampled
+  fraction of calls, TRACE_SAMPLE_RATE by default or the rate configured for the
+  route function in TRACE_SAMPLE_RATES. Responses are never captured as
+  subsegment metadata.
+- Profiling: an opt-in PROFILE_SAMPLE_RATE fraction of invocations is profiled
+  by a Profiler that samples the stack every PROFILE_INTERVAL_SECONDS of wall
+  clock time. The samples are logged as folded stacks in the "profile" field,
+  the input format of flamegraph.pl and speedscope.
+- Phase timings: every invocation logs a "Request phases" line whose "phases"
+  field holds the milliseconds spent parsing and routing the event ("parse"),
+  in the route function ("route"), in DynamoDB calls made by the route
+  ("dynamodb", part of "route") and serializing the response ("serialize").
+
+- TRACE_SAMPLE_RATE: The fraction of route calls traced (default 1).
+- TRACE_SAMPLE_RATES: Optional JSON map of route function name to its own rate.
+- PROFILE_SAMPLE_RATE: The fraction of invocations profiled (default 0).
+- PROFILE_INTERVAL_SECONDS: The interval between stack samples (default 0.005).
+
+Classes:
+- PhaseTimer: Per invocation timings of the request phases.
+- Profiler: Wall clock sampling profiler producing folded stacks.
+- Instrumentation: The tracing sampling, profiling and phase timings of a handler.
+"""
+
+import functools
+import json
+import os
+import random
+import signal
+import threading
+import time
+from collections import Counter
+from os import environ
+from typing import Callable
+
+from aws_lambda_powertools import Logger, Tracer
+
+TRACE_SAMPLE_RATE = float(environ.get("TRACE_SAMPLE_RATE") or 1)
+TRACE_SAMPLE_RATES: dict[str, float] = json.loads(environ.get("TRACE_SAMPLE_RATES") or "{}")
+PROFILE_SAMPLE_RATE = float(environ.get("PROFILE_SAMPLE_RATE") or 0)
+PROFILE_INTERVAL_SECONDS = float(environ.get("PROFILE_INTERVAL_SECONDS") or 0.005)
+
+
+class PhaseTimer:
+    """Per invocation timings of the request phases."""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        self.clock = clock
+        self.mark = 0.0
+        self.opened: dict[str, float] = {}
+        self.phases: dict[str, float] = {}
+
+    def start(self) -> None:
+        """Start timing an invocation."""
+        self.phases = {}
+        self.opened = {}
+        self.mark = self.clock()
+
+    def lap(self, name: str) -> None:
+        """Record the time since the previous lap as a phase.
+
+        Args:
+            name (str): The phase.
+        """
+        now = self.clock()
+        self.phases[name] = self.phases.get(name, 0.0) + (now - self.mark) * 1000
+        self.mark = now
+
+    def begin(self, name: str, **kwargs) -> None:
+        """Open a phase that may be nested in other phases.
+
+        Args:
+            name (str): The phase.
+        """
+        self.opened[name] = self.clock()
+
+    def end(self, name: str, **kwargs) -> None:
+        """Close a phase opened with begin, adding its time to the phase.
+
+        Args:
+            name (str): The phase.
+        """
+        started = self.opened.pop(name, None)
+        if started is not None:
+            self.phases[name] = self.phases.get(name, 0.0) + (self.clock() - started) * 1000
+
+    def fields(self) -> dict[str, float]:
+        """Get the phase timings as log fields.
+
+        Returns:
+            dict[str, float]: The milliseconds spent in each phase.
+        """
+        return {name: round(milliseconds, 3) for name, milliseconds in self.phases.items()}
+
+
+class Profiler:
+    """Wall clock sampling profiler producing folded stacks.
+
+    Stacks are sampled from a SIGALRM handler, so the profiler only runs in the
+    main thread of platforms with interval timers, which include Lambda.
+    """
+
+    def __init__(self, interval_seconds: float = PROFILE_INTERVAL_SECONDS) -> None:
+        self.interval_seconds = interval_seconds
+        self.samples: Counter[str] = Counter()
+        self.previous = None
+
+    @staticmethod
+    def available() -> bool:
+        """Check whether stacks can be sampled in the calling thread.
+
+        Returns:
+            bool: True if the profiler can run.
+        """
+        return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+    def sample(self, signum, frame) -> None:
+        """Record the stack of the interrupted frame.
+
+        Args:
+            signum (int): The signal number.
+            frame (FrameType): The interrupted frame.
+        """
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        """Start sampling stacks."""
+        self.samples.clear()
+        self.previous = signal.signal(signal.SIGALRM, self.sample)
+        signal.setitimer(signal.ITIMER_REAL, self.interval_seconds, self.interval_seconds)
+
+    def stop(self) -> None:
+        """Stop sampling stacks."""
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self.previous or signal.SIG_DFL)
+
+    def folded(self) -> list[str]:
+        """Get the samples as folded stacks.
+
+        Returns:
+            list[str]: One "frame;frame;frame count" line per distinct stack, root first.
+        """
+        return [f"{stack} {count}" for stack, count in self.samples.most_common()]
+
+
+class Instrumentation:
+    """The tracing sampling, profiling and phase timings of a handler."""
+
+    def __init__(
+        self,
+        log: Logger,
+        tracer: Tracer,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        sample_rates: dict[str, float] = TRACE_SAMPLE_RATES,
+        profile_rate: float = PROFILE_SAMPLE_RATE,
+        sampler: Callable[[], float] = random.random,
+    ) -> None:
+        self.log = log
+        self.tracer = tracer
+        self.sample_rate = sample_rate
+        self.sample_rates = sample_rates
+        self.profile_rate = profile_rate
+        self.sampler = sampler
+        self.timer = PhaseTimer()
+        self.profiler = Profiler()
+
+    def attach(self, *repositories) -> None:
+        """Time the DynamoDB calls of repositories as the "dynamodb" phase.
+
+        Repositories without a DynamoDB resource are ignored.
+
+        Args:
+            *repositories (Repository): The repositories.
+        """
+        clients = {}
+        for repository in repositories:
+            dynamodb = getattr(repository, "dynamodb", None)
+            if dynamodb is not None:
+                clients[id(dynamodb.meta.client)] = dynamodb.meta.client
+        for client in clients.values():
+            events = client.meta.events
+            events.register("before-call.dynamodb", functools.partial(self.timer.begin, "dynamodb"))
+            for event in ("after-call.dynamodb", "after-call-error.dynamodb"):
+                events.register(event, functools.partial(self.timer.end, "dynamodb"))
+
+    def capture_method(self, method: Callable) -> Callable:
+        """Decorate a route, tracing a sampled fraction of its calls and timing it.
+
+        Args:
+            method (Callable): The route function.
+
+        Returns:
+            Callable: The decorated route function.
+        """
+        traced = self.tracer.capture_method(method, capture_response=False)
+        rate = self.sample_rates.get(method.__name__, self.sample_rate)
+
+        @functools.wraps(method)
+        def decorate(*args, **kwargs):
+            self.timer.lap("parse")
+            try:
+                if rate >= 1 or (rate > 0 and self.sampler() < rate):
+                    return traced(*args, **kwargs)
+                return method(*args, **kwargs)
+            finally:
+                self.timer.lap("route")
+
+        return decorate
+
+    def wrap(self, handler: Callable) -> Callable:
+        """Wrap a handler to time, and maybe profile, its invocations.
+
+        Args:
+            handler (Callable): The handler routing the event.
+
+        Returns:
+            Callable: The wrapped handler.
+        """
+
+        @functools.wraps(handler)
+        def invoke(event, context):
+            profiling = (
+                self.profile_rate > 0 and self.sampler() < self.profile_rate and Profiler.available()
+            )
+            if profiling:
+                self.profiler.start()
+            self.timer.start()
+            try:
+                return handler(event, context)
+            finally:
+                # Events no route matched are all parsing.
+                self.timer.lap("serialize" if "route" in self.timer.phases else "parse")
+                if profiling:
+                    self.profiler.stop()
+                    self.log.info("Request profile", profile=self.profiler.folded())
+                self.log.info("Request phases", phases=self.timer.fields())
+
+        return invoke
@@ -5,6 +5,7 @@ The Lambda function is triggered by an API Gateway REST API.
 
 Functions:
 - put_item(): Update an item in the DynamoDB table.
+- track_created(key: str): Add a link created by an update to the slug filter delta.
 - lambda_handler(event: APIGatewayProxyEvent, context: LambdaContext): Lambda handler function.
 """
 import json
@@ -13,7 +14,6 @@ from os import environ
 import os
 import sys
 
-import boto3
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.event_handler import (
     APIGatewayRestResolver,
@@ -25,27 +25,53 @@ from aws_lambda_powertools.utilities.typing import LambdaContext
 from botocore.exceptions import ClientError
 sys.path.append(os.path.join(os.path.dirname(__file__)))
 from core_modules import (get_current_time)
+from idempotency import IDEMPOTENCY_TABLE_NAME, IdempotencyStore
+from link_metadata import enqueue
+from listing import OWNER_ATTRIBUTE, TAGS_ATTRIBUTE, delete_tags, validate, write_tags
+from rate_limiting import RateLimiter
+from regions import regional_repositories
+from slug_filter import SLUG_FILTER_ENABLED, record_created
+from url_normalization import URL_HASH_ATTRIBUTE, url_hash
+from profiling import Instrumentation
+from startup import Startup
+from tenancy import TenantResolver, tenant_key, validate_slug
 
 APP_NAME = environ.get("APP_NAME") or "url-shortener POST"
 AWS_REGION = environ.get("AWS_REGION") or "us-east-1"
 TABLE_NAME = environ.get("TABLE_NAME") or "dev-url-shortner-table"
-dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
-table = dynamodb.Table(TABLE_NAME)
+# Attributes of a link a request may write; the others are maintained by the functions.
+WRITABLE_ATTRIBUTES = ("targetUrl", OWNER_ATTRIBUTE)
+repository, home_repository = regional_repositories(TABLE_NAME, AWS_REGION)
 app = APIGatewayRestResolver()
 log: Logger = Logger(service=APP_NAME)
 trace: Tracer = Tracer(service=APP_NAME)
+instrument = Instrumentation(log, trace)
+instrument.attach(repository, home_repository)
+limiter = RateLimiter()
+tenants = TenantResolver(home_repository)
+idempotency = IdempotencyStore(regional_repositories(IDEMPOTENCY_TABLE_NAME, AWS_REGION)[1])
+startup = Startup(APP_NAME, [repository, home_repository, idempotency.repository])
 
 
 @app.put("/")
-@trace.capture_method
+@instrument.capture_method
+@idempotency.idempotent("PUT", lambda: app.current_event, tenants.resolve)
 def put_item() -> Response:
     """Update an item in DynamoDB table.
 
     This function updates an item in a DynamoDB table based on the provided event data.
     It checks for the presence of required fields ('slug' and 'targetUrl') in the event data.
     If any required field is missing, it returns a 400 bad request.
-    Otherwise, it constructs the update expression and updates the item in the table.
+    If the slug contains the reserved shard or tenant separators or is a reserved path, it returns a 400.
+    Otherwise, it updates the target URL and the optional owner of the item in the table in the home region,
+    along with the hash of the new target URL, and enqueues a fetch of its preview metadata.
+    Other fields of the request body are ignored.
+    If "tags" is provided, it replaces the tags of the item and its tag items, see the listing module.
+    If the owner or tags are invalid, it returns a 400.
+    The link is looked up in the tenant of the Host header, see the tenancy module.
+    Links the update creates are added to the slug filter, see the slug_filter module.
     If the update is successful, it returns an 200 OK response with a success message.
+    Retries with the same Idempotency-Key header replay the first response, see the idempotency module.
     If any error occurs during the update, it returns a 500 internal server error response.
 
     Returns:
@@ -65,25 +91,55 @@ def put_item() -> Response:
                     {"message": f"The '{field}' field is required."}
                 ),
             )
-    try:
-        update_expression = []
-        expression_attribute_values = {
-            ":lastUpdatedAt": str(last_updated_at)
-        }
-        separator = ", "
-
-        for attribute in event_data:
-            if attribute != "slug":
-                update_expression.append(f"{attribute} = :{attribute}")
-                expression_attribute_values[f":{attribute}"] = event_data[attribute]
-
-        table.update_item(
-            Key={"slug": event_data["slug"]},
-            UpdateExpression=(
-                "SET lastUpdatedAt = :lastUpdatedAt, " +
-                separator.join(update_expression)),
-            ExpressionAttributeValues=expression_attribute_values,
+    invalid = validate_slug(event_data["slug"]) or validate(event_data)
+    if invalid:
+        log.error(invalid)
+        return Response(
+            status_code=HTTPStatus.BAD_REQUEST.value,
+            content_type=content_types.APPLICATION_JSON,
+            body=json.dumps({"message": invalid}),
         )
+    try:
+        tenant = tenants.resolve(app.current_event)
+        key = {"slug": tenant_key(tenant, event_data["slug"])}
+        limited = limiter.limit(app.current_event, key["slug"], tenant=tenant)
+        if limited:
+            return limited
+        attributes = {"lastUpdatedAt": str(last_updated_at)}
+        for attribute in WRITABLE_ATTRIBUTES:
+            if attribute in event_data:
+                attributes[attribute] = event_data[attribute]
+        if OWNER_ATTRIBUTE in attributes:
+            attributes[OWNER_ATTRIBUTE] = tenant_key(tenant, attributes[OWNER_ATTRIBUTE])
+        attributes[URL_HASH_ATTRIBUTE] = tenant_key(tenant, url_hash(str(event_data["targetUrl"])))
+
+        existing = None
+        if SLUG_FILTER_ENABLED or TAGS_ATTRIBUTE in event_data:
+            existing = home_repository.get(key, projection=["slug", TAGS_ATTRIBUTE, "createdAt"])
+        if TAGS_ATTRIBUTE not in event_data:
+            home_repository.update(key, assign=attributes)
+        else:
+            tags = set(event_data[TAGS_ATTRIBUTE])
+            previous = set((existing or {}).get(TAGS_ATTRIBUTE, ()))
+            if tags:
+                attributes[TAGS_ATTRIBUTE] = tags
+            home_repository.update(
+                key,
+                assign=attributes,
+                # DynamoDB does not store empty sets, so clearing the tags removes the attribute.
+                discard={TAGS_ATTRIBUTE: previous} if previous and not tags else None,
+            )
+            delete_tags(home_repository, key["slug"], previous - tags)
+            write_tags(
+                home_repository,
+                key["slug"],
+                (existing or {}).get("createdAt") or last_updated_at,
+                tags - previous,
+                tenant,
+            )
+        if SLUG_FILTER_ENABLED and existing is None:
+            track_created(key["slug"])
+        enqueue(key["slug"], event_data["targetUrl"])
 
         return Response(
             status_code=HTTPStatus.OK.value,
@@ -99,12 +155,29 @@ def put_item() -> Response:
         )
 
 
+def track_created(key: str) -> None:
+    """Add a link created by an update to the slug filter delta, see the slug_filter module.
+
+    The link exists whether or not this succeeds, so failures are logged rather than returned.
+
+    Args:
+        key (str): The key of the link.
+    """
+    try:
+        if not record_created(home_repository, key):
+            log.warning("The slug filter delta is full, rebuild the slug filter.")
+    except ClientError as error:
+        log.error(f"Failed to add /{key} to the slug filter: {error.response['Error']['Message']}")
+
+
 def lambda_handler(
     event: APIGatewayProxyEvent, context: LambdaContext
 ) -> dict[str, any]:
     """Lambda handler.
 
     This function is the entry point for the Lambda function.
+    Events go through `startup`, which answers warm-up pings and records the cold start,
+    and `instrument`, which times the request phases.
 
     Args:
         event (APIGatewayProxyEvent): The event data passed to the Lambda function.
@@ -113,4 +186,4 @@ def lambda_handler(
     Returns:
         dict[str, any]: The response from the Lambda function.
     """
-    return app.resolve(event, context)
+    return startup.handle(event, context, instrument.wrap(app.resolve))
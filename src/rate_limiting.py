@@ -0,0 +1,253 @@
+""" Rate Limiting.
+
+This module contains the in-handler rate limiting and load shedding used by the Lambda functions.
+
+Requests are limited with token buckets keyed by API key, source IP, slug and
+tenant, see the tenancy module.
+Bucket state lives in memory per container, so the effective limit for a key is
+the configured limit times the number of warm containers. Limits are configured
+as "<tokens per second>/<burst>" strings, and a rate of 0 disables a scope:
+
+- RATE_LIMIT_API_KEY (default "500/1000")
+- RATE_LIMIT_SOURCE_IP (default "20/50")
+- RATE_LIMIT_SLUG (default "1000/2000")
+- RATE_LIMIT_TENANT (default "5000/10000")
+
+Requests that scan the table cost SCAN_REQUEST_COST tokens instead of one.
+
+Clients are identified by the X-Forwarded-For entry of the last proxy in front of
+API Gateway, see `source_ip`:
+
+- TRUSTED_PROXY_HOPS: Trailing X-Forwarded-For entries added by proxies after the client IP:
+  the stack sets 2, one for the CloudFront distribution and one for the edge of the API
+  (default 1, the edge of the API alone).
+
+Functions:
+- parse_limit(value: str, default: str): Parse a "<rate>/<burst>" limit.
+- is_throttling_error(error: ClientError): Check whether DynamoDB rejected a call for capacity.
+- source_ip(event: APIGatewayProxyEvent): Get the client IP of a request.
+
+Classes:
+- TokenBucket: A single token bucket.
+- RateLimiter: Token buckets keyed by API key, source IP, slug and tenant.
+- LoadShedder: Tracks whether optional writes should be skipped.
+"""
+
+import json
+import math
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from os import environ
+from typing import Callable
+
+from aws_lambda_powertools.event_handler import Response, content_types
+from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
+from botocore.exceptions import ClientError
+
+API_KEY = "apiKey"
+SOURCE_IP = "sourceIp"
+SLUG = "slug"
+TENANT = "tenant"
+MAX_BUCKETS = int(environ.get("RATE_LIMIT_MAX_BUCKETS") or 10000)
+LOAD_SHED_SECONDS = float(environ.get("LOAD_SHED_SECONDS") or 30)
+SCAN_REQUEST_COST = float(environ.get("SCAN_REQUEST_COST") or 5)
+TRUSTED_PROXY_HOPS = int(environ.get("TRUSTED_PROXY_HOPS") or 1)
+THROTTLING_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+
+
+def parse_limit(value: str | None, default: str) -> tuple[float, float]:
+    """Parse a "<rate>/<burst>" limit.
+
+    Args:
+        value (str | None): The configured limit, if any.
+        default (str): The limit used when none is configured.
+
+    Returns:
+        tuple[float, float]: The refill rate in tokens per second and the bucket capacity.
+    """
+    rate, _, burst = (value or default).partition("/")
+    rate = float(rate)
+    return rate, float(burst or rate)
+
+
+def is_throttling_error(error: ClientError) -> bool:
+    """Check whether DynamoDB rejected a call because of missing capacity.
+
+    Args:
+        error (ClientError): The error raised by boto3.
+
+    Returns:
+        bool: True if the call was throttled.
+    """
+    return error.response["Error"]["Code"] in THROTTLING_ERROR_CODES
+
+
+def source_ip(event: APIGatewayProxyEvent, hops: int = TRUSTED_PROXY_HOPS) -> str | None:
+    """Get the client IP of a request.
+
+    Requests arriving through the CloudFront distribution carry the IP of the
+    edge location as their source IP. Each proxy appends the IP it received the
+    request from to X-Forwarded-For, so the client IP is the entry before the
+    `hops` entries added by proxies of the stack. Entries further left are sent
+    by the client and cannot be trusted.
+
+    Args:
+        event (APIGatewayProxyEvent): The API Gateway event.
+        hops (int): The trailing X-Forwarded-For entries added by trusted proxies.
+
+    Returns:
+        str | None: The client IP, if known.
+    """
+    forwarded_for = event.get_header_value("X-Forwarded-For")
+    if hops and forwarded_for:
+        entries = [entry.strip() for entry in forwarded_for.split(",")]
+        if len(entries) > hops:
+            return entries[-hops - 1]
+    return _identity(event).get("sourceIp")
+
+
+def _identity(event: APIGatewayProxyEvent) -> dict:
+    return (event.get("requestContext") or {}).get("identity") or {}
+
+
+class TokenBucket:
+    """A single token bucket."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, cost: float, now: float) -> float:
+        """Take tokens from the bucket.
+
+        Args:
+            cost (float): The number of tokens the request costs.
+            now (float): The current time in seconds.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds until they are available.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets keyed by API key, source IP, slug and tenant.
+
+    At most MAX_BUCKETS buckets are kept; the least recently used bucket is
+    evicted first, which only ever makes the limiter more lenient.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, tuple[float, float]] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        max_buckets: int = MAX_BUCKETS,
+    ) -> None:
+        self.limits = limits or {
+            API_KEY: parse_limit(environ.get("RATE_LIMIT_API_KEY"), "500/1000"),
+            SOURCE_IP: parse_limit(environ.get("RATE_LIMIT_SOURCE_IP"), "20/50"),
+            SLUG: parse_limit(environ.get("RATE_LIMIT_SLUG"), "1000/2000"),
+            TENANT: parse_limit(environ.get("RATE_LIMIT_TENANT"), "5000/10000"),
+        }
+        self.clock = clock
+        self.max_buckets = max_buckets
+        self.buckets: OrderedDict[tuple[str, str], TokenBucket] = OrderedDict()
+
+    def take(self, scope: str, key: str | None, cost: float = 1) -> float:
+        """Take tokens from the bucket of a key.
+
+        Args:
+            scope (str): The scope of the key, such as SOURCE_IP.
+            key (str | None): The key; requests without one are not limited.
+            cost (float): The number of tokens the request costs.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the seconds to wait.
+        """
+        rate, capacity = self.limits.get(scope, (0, 0))
+        if not key or rate <= 0:
+            return 0.0
+        now = self.clock()
+        bucket = self.buckets.get((scope, key))
+        if bucket is None:
+            bucket = self.buckets[(scope, key)] = TokenBucket(rate, capacity, now)
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end((scope, key))
+        return bucket.take(cost, now)
+
+    def limit(
+        self,
+        event: APIGatewayProxyEvent,
+        slug: str | None = None,
+        cost: float = 1,
+        tenant: str | None = None,
+    ) -> Response | None:
+        """Apply the limits of every scope to a request.
+
+        Args:
+            event (APIGatewayProxyEvent): The API Gateway event.
+            slug (str | None): The slug the request targets, if any.
+            cost (float): The number of tokens the request costs.
+            tenant (str | None): The tenant of the request, if any.
+
+        Returns:
+            Response | None: A 429 response if the request is limited, otherwise None.
+        """
+        api_key = _identity(event).get("apiKey") or event.get_header_value("x-api-key")
+        retry_after = max(
+            self.take(API_KEY, api_key, cost),
+            self.take(SOURCE_IP, source_ip(event), cost),
+            self.take(SLUG, slug, cost),
+            self.take(TENANT, tenant, cost),
+        )
+        if not retry_after:
+            return None
+        return Response(
+            status_code=HTTPStatus.TOO_MANY_REQUESTS.value,
+            content_type=content_types.APPLICATION_JSON,
+            headers={
+                "Retry-After": str(math.ceil(retry_after)),
+                "Access-Control-Allow-Origin": "*",
+            },
+            body=json.dumps({"message": "Too many requests."}),
+        )
+
+
+class LoadShedder:
+    """Tracks whether optional writes should be skipped.
+
+    After DynamoDB throttles a call, optional writes such as click logging are
+    skipped for `seconds`, leaving the remaining capacity to lookups.
+    """
+
+    def __init__(
+        self, seconds: float = LOAD_SHED_SECONDS, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.seconds = seconds
+        self.clock = clock
+        self.until = 0.0
+
+    @property
+    def active(self) -> bool:
+        """bool: True while optional writes should be skipped."""
+        return self.clock() < self.until
+
+    def trip(self) -> None:
+        """Start shedding optional writes."""
+        self.until = self.clock() + self.seconds
@@ -0,0 +1,152 @@
+""" Regions.
+
+This module contains the global table awareness shared by the Lambda functions.
+
+Every region serves reads from its local replica of the table, while writes to
+links are routed to HOME_REGION. A region other than HOME_REGION is a replica:
+lookups that miss locally fall back to a consistent read in the home region, to
+cover the replication lag of freshly created slugs, and clicks are written to
+click shards owned by the replica region so they never race with writes made
+in the home region.
+
+- HOME_REGION: The region links are written to (default AWS_REGION).
+- REPLICA_REGIONS: Comma separated regions holding replicas of the table.
+- DYNAMODB_ENDPOINT_URLS: Optional JSON map of region to endpoint URL, used to
+  point each region at its own local DynamoDB when testing several regions.
+
+Functions:
+- is_replica(region: str): Check whether a region is a replica region.
+- click_region(region: str): Get the region that owns click shards written in a region.
+- resource(region: str): Get the DynamoDB service resource of a region.
+- regional_repositories(table_name: str, region: str): Get the local and home repositories.
+- get_item(repository, home_repository, key: dict): Get an item, falling back to the home region.
+- batch_get_items(repository, home_repository, keys: list, projection: list): Get several items, falling back to the home region.
+"""
+
+import json
+import os
+import sys
+from os import environ
+
+import boto3
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from repository import STORAGE_BACKEND, Repository, create_repository
+
+AWS_REGION = environ.get("AWS_REGION") or "us-east-1"
+HOME_REGION = environ.get("HOME_REGION") or AWS_REGION
+REPLICA_REGIONS = [
+    region.strip()
+    for region in (environ.get("REPLICA_REGIONS") or "").split(",")
+    if region.strip()
+]
+ENDPOINT_URLS: dict[str, str] = json.loads(environ.get("DYNAMODB_ENDPOINT_URLS") or "{}")
+
+_resources = {}
+
+
+def is_replica(region: str = AWS_REGION) -> bool:
+    """Check whether a region is a replica region.
+
+    Args:
+        region (str): The region to check.
+
+    Returns:
+        bool: True if links are not written in the region.
+    """
+    return region != HOME_REGION
+
+
+def click_region(region: str = AWS_REGION) -> str | None:
+    """Get the region that owns the click shards written in a region.
+
+    Args:
+        region (str): The region serving the click.
+
+    Returns:
+        str | None: The replica region, or None in the home region.
+    """
+    return region if is_replica(region) else None
+
+
+def resource(region: str = AWS_REGION):
+    """Get the DynamoDB service resource of a region.
+
+    Resources are created once per container and region.
+
+    Args:
+        region (str): The region of the resource.
+
+    Returns:
+        DynamoDBServiceResource: The service resource.
+    """
+    if region not in _resources:
+        _resources[region] = boto3.resource(
+            "dynamodb", region_name=region, endpoint_url=ENDPOINT_URLS.get(region)
+        )
+    return _resources[region]
+
+
+def _repository(table_name: str, region: str) -> Repository:
+    if STORAGE_BACKEND == "dynamodb":
+        return create_repository(table_name, resource(region))
+    return create_repository(table_name)
+
+
+def regional_repositories(table_name: str, region: str = AWS_REGION) -> tuple[Repository, Repository]:
+    """Get the local and home repositories.
+
+    Args:
+        table_name (str): The name of the global table.
+        region (str): The region the function runs in.
+
+    Returns:
+        tuple[Repository, Repository]: The local and home repositories, which are
+            the same object in the home region and for the local engine.
+    """
+    repository = _repository(table_name, region)
+    if not is_replica(region):
+        return repository, repository
+    return repository, _repository(table_name, HOME_REGION)
+
+
+def get_item(repository: Repository, home_repository: Repository, key: dict) -> dict | None:
+    """Get an item from the local repository, falling back to the home region.
+
+    Args:
+        repository (Repository): The local repository.
+        home_repository (Repository): The home repository.
+        key (dict): The key of the item.
+
+    Returns:
+        dict | None: The item, if it exists in either region.
+    """
+    item = repository.get(key)
+    if item is None and home_repository is not repository:
+        item = home_repository.get(key, consistent=True)
+    return item
+
+
+def batch_get_items(
+    repository: Repository,
+    home_repository: Repository,
+    keys: list[dict],
+    projection: list[str] | None = None,
+) -> list[dict]:
+    """Get several items from the local repository, falling back to the home region.
+
+    Args:
+        repository (Repository): The local repository.
+        home_repository (Repository): The home repository.
+        keys (list[dict]): The keys of the items.
+        projection (list[str] | None): The attributes to return, all when None.
+
+    Returns:
+        list[dict]: The items that exist in either region, in no particular order.
+    """
+    items = repository.batch_get(keys, projection)
+    if home_repository is not repository and len(items) < len(keys):
+        found = {item["slug"] for item in items}
+        missing = [key for key in keys if key["slug"] not in found]
+        items.extend(home_repository.batch_get(missing, projection))
+    return items
@@ -0,0 +1,722 @@
+""" Repository.
+
+This module contains the storage abstraction used by the Lambda functions.
+
+The route functions only talk to a Repository, which has two implementations:
+
+- DynamoDBRepository: The DynamoDB table used in AWS.
+- SQLiteRepository: A local engine on SQLite in WAL mode, for tests, benchmarks
+  and self-hosted deployments without a network hop per request.
+
+Global secondary indexes are declared in INDEXES, by name, as their partition
+and optional sort attribute. Items missing an index attribute are not in the
+index, as in DynamoDB. Index attributes hold strings. The local engine backs
+each index with an expression index on the JSON documents. Queries of an index
+with a sort attribute may bound it with `since` and `until`.
+
+Keys DynamoDB leaves unprocessed by a batched read are retried with capped,
+jittered exponential backoff, up to BATCH_MAX_RETRIES times.
+
+STORAGE_BACKEND selects the implementation ("dynamodb" by default, or "sqlite")
+and SQLITE_PATH the database file of the local engine. Both implementations
+follow DynamoDB semantics, numbers are returned as `Decimal` and failures are
+raised as botocore `ClientError`s with DynamoDB error codes, so callers handle
+errors the same way whatever the backend.
+
+Functions:
+- create_repository(table_name: str, dynamodb): Create the repository selected by STORAGE_BACKEND.
+
+Classes:
+- Page: A page of items returned by a scan.
+- Repository: The storage interface.
+- DynamoDBRepository: A repository backed by a DynamoDB table.
+- SQLiteRepository: A repository backed by SQLite.
+"""
+
+import base64
+import json
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from decimal import Decimal
+from os import environ
+from typing import Iterable, Iterator, NamedTuple
+
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+
+STORAGE_BACKEND = environ.get("STORAGE_BACKEND") or "dynamodb"
+SQLITE_PATH = environ.get("SQLITE_PATH") or "/tmp/url-shortener.db"
+KEY_ATTRIBUTE = "slug"
+BATCH_GET_LIMIT = 100
+BATCH_MAX_RETRIES = int(environ.get("BATCH_MAX_RETRIES") or 8)
+BATCH_RETRY_BASE_SECONDS = 0.025
+BATCH_RETRY_MAX_SECONDS = 1.0
+URL_HASH_INDEX = "urlHash-index"
+OWNER_INDEX = "owner-index"
+TAG_INDEX = "tag-index"
+INDEXES: dict[str, tuple[str, str | None]] = {
+    URL_HASH_INDEX: ("urlHash", None),
+    OWNER_INDEX: ("owner", "createdAt"),
+    TAG_INDEX: ("tag", "createdAt"),
+}
+
+
+class Page(NamedTuple):
+    """A page of items returned by a scan."""
+
+    items: list[dict]
+    count: int
+    scanned: int
+    last_key: dict | None
+
+
+class Repository(ABC):
+    """The storage interface.
+
+    Keys are dicts holding the KEY_ATTRIBUTE of an item.
+    """
+
+    @abstractmethod
+    def get(self, key: dict, consistent: bool = False, projection: list[str] | None = None) -> dict | None:
+        """Get an item.
+
+        Args:
+            key (dict): The key of the item.
+            consistent (bool): Whether the read must reflect every acknowledged write.
+            projection (list[str] | None): The attributes to return, all when None.
+
+        Returns:
+            dict | None: The item, if it exists.
+        """
+
+    @abstractmethod
+    def put(self, item: dict, if_not_exists: bool = False) -> None:
+        """Create or replace an item.
+
+        Args:
+            item (dict): The item.
+            if_not_exists (bool): Fail with ConditionalCheckFailedException if the item exists.
+        """
+
+    @abstractmethod
+    def update(
+        self,
+        key: dict,
+        assign: dict | None = None,
+        add: dict | None = None,
+        append: dict | None = None,
+        discard: dict | None = None,
+        if_exists: bool = False,
+        if_below: dict | None = None,
+        trim: dict | None = None,
+        if_smaller: dict | None = None,
+    ) -> None:
+        """Update an item, creating it if it does not exist.
+
+        Args:
+            key (dict): The key of the item.
+            assign (dict | None): Attributes to set.
+            add (dict | None): Numbers to add, or sets to merge into set attributes.
+            append (dict | None): Lists to append to list attributes, which may be missing.
+            discard (dict | None): Sets to remove from set attributes.
+            trim (dict | None): The number of elements to remove from the front of existing list attributes.
+            if_exists (bool): Fail with ConditionalCheckFailedException if the item does not exist.
+            if_below (dict | None): Fail with ConditionalCheckFailedException unless each
+                attribute is missing or below the given number.
+            if_smaller (dict | None): Fail with ConditionalCheckFailedException unless each
+                set or list attribute is missing or has fewer elements than the given number.
+        """
+
+    @abstractmethod
+    def delete(self, key: dict) -> None:
+        """Delete an item.
+
+        Args:
+            key (dict): The key of the item.
+        """
+
+    @abstractmethod
+    def scan(
+        self,
+        limit: int | None = None,
+        start_key: dict | None = None,
+        equals: dict | None = None,
+        exclude: str | None = None,
+        projection: list[str] | None = None,
+        segment: int | None = None,
+        total_segments: int | None = None,
+    ) -> Page:
+        """Scan a page of items.
+
+        As in DynamoDB, `limit` bounds the items read before filtering.
+
+        Args:
+            limit (int | None): The maximum number of items to read.
+            start_key (dict | None): The last key of the previous page.
+            equals (dict | None): Only return items whose attributes equal these values.
+            exclude (str | None): Only return items without this attribute.
+            projection (list[str] | None): The attributes to return, all when None.
+            segment (int | None): The segment of a parallel scan.
+            total_segments (int | None): The number of segments of a parallel scan.
+
+        Returns:
+            Page: The page of items.
+        """
+
+    @abstractmethod
+    def query(
+        self,
+        index: str,
+        value: any,
+        limit: int | None = None,
+        start_key: dict | None = None,
+        projection: list[str] | None = None,
+        forward: bool = True,
+        since: str | None = None,
+        until: str | None = None,
+    ) -> Page:
+        """Query a page of items from a global secondary index.
+
+        Like all reads from a global secondary index, queries are eventually consistent.
+
+        Args:
+            index (str): The name of the index, one of INDEXES.
+            value (any): The partition key value.
+            limit (int | None): The maximum number of items to read.
+            start_key (dict | None): The last key of the previous page.
+            projection (list[str] | None): The attributes to return, all when None.
+            forward (bool): Whether to return items in ascending sort key order.
+            since (str | None): Only return items whose sort key is at least this value.
+            until (str | None): Only return items whose sort key is at most this value.
+
+        Returns:
+            Page: The page of items.
+        """
+
+    @abstractmethod
+    def batch_get(self, keys: list[dict], projection: list[str] | None = None) -> list[dict]:
+        """Get several items, in no particular order.
+
+        Args:
+            keys (list[dict]): The keys of the items.
+            projection (list[str] | None): The attributes to return, all when None.
+
+        Returns:
+            list[dict]: The items that exist.
+
+        Raises:
+            ClientError: ProvisionedThroughputExceededException if keys are still
+                unprocessed after BATCH_MAX_RETRIES retries.
+        """
+
+    @abstractmethod
+    def batch_delete(self, keys: Iterable[dict]) -> None:
+        """Delete several items.
+
+        Args:
+            keys (Iterable[dict]): The keys of the items.
+        """
+
+
+def _throttled(operation: str) -> ClientError:
+    return ClientError(
+        {
+            "Error": {
+                "Code": "ProvisionedThroughputExceededException",
+                "Message": "Keys were still unprocessed after retrying",
+            }
+        },
+        operation,
+    )
+
+
+def _condition_failed(operation: str) -> ClientError:
+    return ClientError(
+        {
+            "Error": {
+                "Code": "ConditionalCheckFailedException",
+                "Message": "The conditional request failed",
+            }
+        },
+        operation,
+    )
+
+
+class DynamoDBRepository(Repository):
+    """A repository backed by a DynamoDB table."""
+
+    def __init__(self, dynamodb, table_name: str) -> None:
+        self.dynamodb = dynamodb
+        self.table = dynamodb.Table(table_name)
+        self.table_name = table_name
+
+    @staticmethod
+    def _projection(projection: list[str] | None, kwargs: dict) -> dict:
+        if projection:
+            names = {f"#p{index}": name for index, name in enumerate(projection)}
+            kwargs["ProjectionExpression"] = ", ".join(names)
+            kwargs.setdefault("ExpressionAttributeNames", {}).update(names)
+        return kwargs
+
+    def get(self, key: dict, consistent: bool = False, projection: list[str] | None = None) -> dict | None:
+        kwargs = self._projection(projection, {"Key": key})
+        if consistent:
+            kwargs["ConsistentRead"] = True
+        return self.table.get_item(**kwargs).get("Item")
+
+    def put(self, item: dict, if_not_exists: bool = False) -> None:
+        kwargs = {"Item": item}
+        if if_not_exists:
+            kwargs["ConditionExpression"] = Attr(KEY_ATTRIBUTE).not_exists()
+        self.table.put_item(**kwargs)
+
+    def update(
+        self,
+        key: dict,
+        assign: dict | None = None,
+        add: dict | None = None,
+        append: dict | None = None,
+        discard: dict | None = None,
+        if_exists: bool = False,
+        if_below: dict | None = None,
+        trim: dict | None = None,
+        if_smaller: dict | None = None,
+    ) -> None:
+        names, values, clauses = {}, {}, {"SET": [], "ADD": [], "DELETE": [], "REMOVE": []}
+
+        def placeholder(attribute: str, value: any) -> tuple[str, str]:
+            index = len(names)
+            names[f"#a{index}"] = attribute
+            values[f":v{index}"] = value
+            return f"#a{index}", f":v{index}"
+
+        for attribute, value in (assign or {}).items():
+            name, value_name = placeholder(attribute, value)
+            clauses["SET"].append(f"{name} = {value_name}")
+        for attribute, value in (append or {}).items():
+            name, value_name = placeholder(attribute, value)
+            values[":empty"] = []
+            clauses["SET"].append(f"{name} = list_append(if_not_exists({name}, :empty), {value_name})")
+        for attribute, value in (add or {}).items():
+            clauses["ADD"].append(" ".join(placeholder(attribute, value)))
+        for attribute, value in (discard or {}).items():
+            clauses["DELETE"].append(" ".join(placeholder(attribute, value)))
+        for attribute, count in (trim or {}).items():
+            if not count:
+                continue
+            name = f"#a{len(names)}"
+            names[name] = attribute
+            # Indexes refer to the list before the update.
+            clauses["REMOVE"].extend(f"{name}[{index}]" for index in range(count))
+
+        kwargs = {
+            "Key": key,
+            "UpdateExpression": " ".join(
+                f"{action} {', '.join(parts)}" for action, parts in clauses.items() if parts
+            ),
+        }
+        conditions = []
+        if if_exists:
+            names["#key"] = KEY_ATTRIBUTE
+            conditions.append("attribute_exists(#key)")
+        for attribute, value in (if_below or {}).items():
+            name, value_name = placeholder(attribute, value)
+            conditions.append(f"(attribute_not_exists({name}) OR {name} < {value_name})")
+        for attribute, value in (if_smaller or {}).items():
+            name, value_name = placeholder(attribute, value)
+            conditions.append(f"(attribute_not_exists({name}) OR size({name}) < {value_name})")
+        if conditions:
+            kwargs["ConditionExpression"] = " AND ".join(conditions)
+        if names:
+            kwargs["ExpressionAttributeNames"] = names
+        if values:
+            kwargs["ExpressionAttributeValues"] = values
+        self.table.update_item(**kwargs)
+
+    def delete(self, key: dict) -> None:
+        self.table.delete_item(Key=key)
+
+    def scan(
+        self,
+        limit: int | None = None,
+        start_key: dict | None = None,
+        equals: dict | None = None,
+        exclude: str | None = None,
+        projection: list[str] | None = None,
+        segment: int | None = None,
+        total_segments: int | None = None,
+    ) -> Page:
+        kwargs = self._projection(projection, {})
+        conditions = [Attr(name).eq(value) for name, value in (equals or {}).items()]
+        if exclude:
+            conditions.append(Attr(exclude).not_exists())
+        if conditions:
+            condition = conditions[0]
+            for other in conditions[1:]:
+                condition = condition & other
+            kwargs["FilterExpression"] = condition
+        if limit:
+            kwargs["Limit"] = limit
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        if total_segments:
+            kwargs["Segment"] = segment
+            kwargs["TotalSegments"] = total_segments
+        response = self.table.scan(**kwargs)
+        return Page(
+            response["Items"],
+            response["Count"],
+            response["ScannedCount"],
+            response.get("LastEvaluatedKey"),
+        )
+
+    def query(
+        self,
+        index: str,
+        value: any,
+        limit: int | None = None,
+        start_key: dict | None = None,
+        projection: list[str] | None = None,
+        forward: bool = True,
+        since: str | None = None,
+        until: str | None = None,
+    ) -> Page:
+        partition, sort = INDEXES[index]
+        condition = Key(partition).eq(value)
+        if sort and since and until:
+            condition = condition & Key(sort).between(since, until)
+        elif sort and since:
+            condition = condition & Key(sort).gte(since)
+        elif sort and until:
+            condition = condition & Key(sort).lte(until)
+        kwargs = self._projection(
+            projection,
+            {
+                "IndexName": index,
+                "KeyConditionExpression": condition,
+                "ScanIndexForward": forward,
+            },
+        )
+        if limit:
+            kwargs["Limit"] = limit
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        response = self.table.query(**kwargs)
+        return Page(
+            response["Items"],
+            response["Count"],
+            response["ScannedCount"],
+            response.get("LastEvaluatedKey"),
+        )
+
+    def batch_get(self, keys: list[dict], projection: list[str] | None = None) -> list[dict]:
+        items = []
+        for start in range(0, len(keys), BATCH_GET_LIMIT):
+            request = {
+                self.table_name: self._projection(
+                    projection, {"Keys": keys[start : start + BATCH_GET_LIMIT]}
+                )
+            }
+            for attempt in range(BATCH_MAX_RETRIES + 1):
+                if attempt:
+                    delay = min(BATCH_RETRY_MAX_SECONDS, BATCH_RETRY_BASE_SECONDS * 2**attempt)
+                    time.sleep(random.uniform(0, delay))
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                items.extend(response["Responses"].get(self.table_name, []))
+                request = response.get("UnprocessedKeys")
+                if not request:
+                    break
+            else:
+                raise _throttled("BatchGetItem")
+        return items
+
+    def batch_delete(self, keys: Iterable[dict]) -> None:
+        with self.table.batch_writer() as batch:
+            for key in keys:
+                batch.delete_item(Key=key)
+
+
+def _encode(value: any) -> any:
+    if isinstance(value, Decimal):
+        return {"$n": str(value)}
+    if isinstance(value, (set, frozenset)):
+        return {"$set": [_encode(member) for member in sorted(value, key=str)]}
+    if isinstance(value, Binary):
+        value = value.value
+    if isinstance(value, (bytes, bytearray)):
+        return {"$b": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return {"$n": str(value)}
+    if isinstance(value, dict):
+        return {name: _encode(member) for name, member in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(member) for member in value]
+    raise TypeError(f"Unsupported type {type(value).__name__}")
+
+
+def _decode(value: any) -> any:
+    if isinstance(value, dict):
+        if "$n" in value:
+            return Decimal(value["$n"])
+        if "$set" in value:
+            return {_decode(member) for member in value["$set"]}
+        if "$b" in value:
+            return Binary(base64.b64decode(value["$b"]))
+        return {name: _decode(member) for name, member in value.items()}
+    if isinstance(value, list):
+        return [_decode(member) for member in value]
+    return value
+
+
+def _segment_of(pk: str, total_segments: int) -> int:
+    return zlib.crc32(pk.encode("utf-8")) % total_segments
+
+
+def _json_path(attribute: str) -> str:
+    return f"json_extract(item, '$.{attribute}')"
+
+
+def _project(item: dict, projection: list[str] | None) -> dict:
+    if not projection:
+        return item
+    return {name: item[name] for name in projection if name in item}
+
+
+class SQLiteRepository(Repository):
+    """A repository backed by SQLite in WAL mode.
+
+    Items are stored as JSON documents keyed by KEY_ATTRIBUTE. A single
+    connection is shared by every thread of the process behind a lock, and
+    writes run in immediate transactions so several processes can share a file.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH) -> None:
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.create_function("segment_of", 2, _segment_of, deterministic=True)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS items (pk TEXT PRIMARY KEY, item TEXT NOT NULL) WITHOUT ROWID"
+        )
+        for index, attributes in INDEXES.items():
+            columns = ", ".join(_json_path(attribute) for attribute in attributes if attribute)
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{index}" ON items ({columns})')
+
+    @contextmanager
+    def _session(self, operation: str, write: bool = False) -> Iterator[sqlite3.Connection]:
+        with self.lock:
+            try:
+                if write:
+                    self.connection.execute("BEGIN IMMEDIATE")
+                try:
+                    yield self.connection
+                except BaseException:
+                    if write:
+                        self.connection.execute("ROLLBACK")
+                    raise
+                if write:
+                    self.connection.execute("COMMIT")
+            except sqlite3.Error as error:
+                raise ClientError(
+                    {"Error": {"Code": "InternalServerError", "Message": str(error)}}, operation
+                ) from error
+
+    @staticmethod
+    def _read(connection: sqlite3.Connection, pk: str) -> dict | None:
+        row = connection.execute("SELECT item FROM items WHERE pk = ?", (pk,)).fetchone()
+        return _decode(json.loads(row[0])) if row else None
+
+    @staticmethod
+    def _write(connection: sqlite3.Connection, item: dict) -> None:
+        connection.execute(
+            "INSERT OR REPLACE INTO items (pk, item) VALUES (?, ?)",
+            (item[KEY_ATTRIBUTE], json.dumps(_encode(item), separators=(",", ":"))),
+        )
+
+    def get(self, key: dict, consistent: bool = False, projection: list[str] | None = None) -> dict | None:
+        with self._session("GetItem") as connection:
+            item = self._read(connection, key[KEY_ATTRIBUTE])
+        return _project(item, projection) if item else None
+
+    def put(self, item: dict, if_not_exists: bool = False) -> None:
+        with self._session("PutItem", write=True) as connection:
+            if if_not_exists and self._read(connection, item[KEY_ATTRIBUTE]) is not None:
+                raise _condition_failed("PutItem")
+            self._write(connection, item)
+
+    def update(
+        self,
+        key: dict,
+        assign: dict | None = None,
+        add: dict | None = None,
+        append: dict | None = None,
+        discard: dict | None = None,
+        if_exists: bool = False,
+        if_below: dict | None = None,
+        trim: dict | None = None,
+        if_smaller: dict | None = None,
+    ) -> None:
+        with self._session("UpdateItem", write=True) as connection:
+            item = self._read(connection, key[KEY_ATTRIBUTE])
+            if if_exists and item is None:
+                raise _condition_failed("UpdateItem")
+            item = item or dict(key)
+            for attribute, value in (if_below or {}).items():
+                if attribute in item and not item[attribute] < value:
+                    raise _condition_failed("UpdateItem")
+            for attribute, value in (if_smaller or {}).items():
+                if attribute in item and not len(item[attribute]) < value:
+                    raise _condition_failed("UpdateItem")
+            item.update(assign or {})
+            for attribute, value in (append or {}).items():
+                item[attribute] = list(item.get(attribute, [])) + list(value)
+            for attribute, value in (add or {}).items():
+                if isinstance(value, (set, frozenset)):
+                    item[attribute] = set(item.get(attribute, ())) | value
+                else:
+                    item[attribute] = Decimal(item.get(attribute, 0)) + Decimal(value)
+            for attribute, value in (discard or {}).items():
+                remaining = set(item.get(attribute, ())) - value
+                if remaining:
+                    item[attribute] = remaining
+                else:
+                    # DynamoDB removes sets that become empty.
+                    item.pop(attribute, None)
+            for attribute, count in (trim or {}).items():
+                if attribute in item:
+                    item[attribute] = list(item[attribute])[count:]
+            self._write(connection, item)
+
+    def delete(self, key: dict) -> None:
+        with self._session("DeleteItem", write=True) as connection:
+            connection.execute("DELETE FROM items WHERE pk = ?", (key[KEY_ATTRIBUTE],))
+
+    def scan(
+        self,
+        limit: int | None = None,
+        start_key: dict | None = None,
+        equals: dict | None = None,
+        exclude: str | None = None,
+        projection: list[str] | None = None,
+        segment: int | None = None,
+        total_segments: int | None = None,
+    ) -> Page:
+        query = "SELECT pk, item FROM items WHERE pk > ?"
+        parameters = [start_key[KEY_ATTRIBUTE] if start_key else ""]
+        if total_segments:
+            query += " AND segment_of(pk, ?) = ?"
+            parameters.extend([total_segments, segment])
+        query += " ORDER BY pk"
+        if limit:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        with self._session("Scan") as connection:
+            rows = connection.execute(query, parameters).fetchall()
+        items = []
+        for _, document in rows:
+            item = _decode(json.loads(document))
+            if exclude and exclude in item:
+                continue
+            if any(item.get(name) != value for name, value in (equals or {}).items()):
+                continue
+            items.append(_project(item, projection))
+        last_key = {KEY_ATTRIBUTE: rows[-1][0]} if limit and len(rows) == limit else None
+        return Page(items, len(items), len(rows), last_key)
+
+    def query(
+        self,
+        index: str,
+        value: any,
+        limit: int | None = None,
+        start_key: dict | None = None,
+        projection: list[str] | None = None,
+        forward: bool = True,
+        since: str | None = None,
+        until: str | None = None,
+    ) -> Page:
+        partition, sort = INDEXES[index]
+        order = "ASC" if forward else "DESC"
+        query = f"SELECT pk, item FROM items WHERE {_json_path(partition)} = ?"
+        parameters = [value]
+        if sort:
+            query += f" AND {_json_path(sort)} IS NOT NULL"
+            if since:
+                query += f" AND {_json_path(sort)} >= ?"
+                parameters.append(since)
+            if until:
+                query += f" AND {_json_path(sort)} <= ?"
+                parameters.append(until)
+            if start_key:
+                query += f" AND ({_json_path(sort)}, pk) {'>' if forward else '<'} (?, ?)"
+                parameters.extend([start_key[sort], start_key[KEY_ATTRIBUTE]])
+            query += f" ORDER BY {_json_path(sort)} {order}, pk {order}"
+        else:
+            if start_key:
+                query += f" AND pk {'>' if forward else '<'} ?"
+                parameters.append(start_key[KEY_ATTRIBUTE])
+            query += f" ORDER BY pk {order}"
+        if limit:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        with self._session("Query") as connection:
+            rows = connection.execute(query, parameters).fetchall()
+        items = [_decode(json.loads(document)) for _, document in rows]
+        last_key = None
+        if limit and len(rows) == limit:
+            last_key = {
+                attribute: items[-1][attribute]
+                for attribute in (KEY_ATTRIBUTE, partition, sort)
+                if attribute
+            }
+        items = [_project(item, projection) for item in items]
+        return Page(items, len(items), len(rows), last_key)
+
+    def batch_get(self, keys: list[dict], projection: list[str] | None = None) -> list[dict]:
+        items = []
+        for start in range(0, len(keys), BATCH_GET_LIMIT):
+            chunk = [key[KEY_ATTRIBUTE] for key in keys[start : start + BATCH_GET_LIMIT]]
+            with self._session("BatchGetItem") as connection:
+                rows = connection.execute(
+                    f"SELECT item FROM items WHERE pk IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            items.extend(_project(_decode(json.loads(row[0])), projection) for row in rows)
+        return items
+
+    def batch_delete(self, keys: Iterable[dict]) -> None:
+        with self._session("BatchWriteItem", write=True) as connection:
+            connection.executemany(
+                "DELETE FROM items WHERE pk = ?", [(key[KEY_ATTRIBUTE],) for key in keys]
+            )
+
+
+_sqlite_repositories: dict[str, SQLiteRepository] = {}
+
+
+def create_repository(table_name: str, dynamodb=None) -> Repository:
+    """Create the repository selected by STORAGE_BACKEND.
+
+    The local engine is shared by every table name and region of a process,
+    since a self-hosted deployment has a single copy of the data.
+
+    Args:
+        table_name (str): The name of the DynamoDB table.
+        dynamodb: The DynamoDB service resource, required for the "dynamodb" backend.
+
+    Returns:
+        Repository: The repository.
+    """
+    if STORAGE_BACKEND == "sqlite":
+        if SQLITE_PATH not in _sqlite_repositories:
+            _sqlite_repositories[SQLITE_PATH] = SQLiteRepository(SQLITE_PATH)
+        return _sqlite_repositories[SQLITE_PATH]
+    return DynamoDBRepository(dynamodb, table_name)
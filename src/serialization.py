@@ -0,0 +1,175 @@
+""" Serialization.
+
+This module contains the JSON serialization layer shared by the Lambda functions.
+It understands the types the boto3 resource layer hands back from DynamoDB
+(`Decimal`, sets and `Binary`) and can encode list responses incrementally, one
+chunk of items at a time, so the encoder never holds more than a page of items.
+
+Functions:
+- to_json_value(value: any): Convert a single DynamoDB value to a JSON-ready value.
+- dumps(value: any): Serialize a value to a compact JSON string.
+- iter_encode_items(items: Iterable, chunk_size: int): Yield a JSON array in chunks.
+- iter_encode_page(items: Iterable, **fields): Yield a JSON list response in chunks.
+- encode_page(items: Iterable, **fields): Serialize a JSON list response.
+- encode_cursor(key: dict): Encode a DynamoDB LastEvaluatedKey as an opaque cursor.
+- decode_cursor(cursor: str): Decode a cursor back into an ExclusiveStartKey.
+"""
+
+import base64
+import json
+from decimal import Decimal
+from itertools import islice
+from typing import Iterable, Iterator
+
+from boto3.dynamodb.types import Binary
+
+DEFAULT_CHUNK_SIZE = 100
+
+
+def to_json_value(value: any) -> any:
+    """Convert a single DynamoDB value to a JSON-ready value.
+
+    Integral `Decimal` values become `int` so counters round-trip exactly, other
+    `Decimal` values become `float`. Sets become sorted lists and binary values
+    are base64 encoded.
+
+    Args:
+        value (any): The value json could not serialize on its own.
+
+    Returns:
+        any: A value the json module can serialize.
+
+    Raises:
+        TypeError: If the value is not a known DynamoDB type.
+    """
+    if isinstance(value, Decimal):
+        if value == value.to_integral_value():
+            return int(value)
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if isinstance(value, Binary):
+        value = value.value
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(default=to_json_value, separators=(",", ":"))
+
+
+def dumps(value: any) -> str:
+    """Serialize a value to a compact JSON string.
+
+    Args:
+        value (any): The value to serialize, which may contain DynamoDB types.
+
+    Returns:
+        str: The JSON document.
+    """
+    return _encoder.encode(value)
+
+
+def iter_encode_items(
+    items: Iterable[dict], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[str]:
+    """Yield a JSON array of items in chunks.
+
+    Only `chunk_size` items are encoded at a time, so the items can come from a
+    generator walking several DynamoDB pages without materializing all of them.
+
+    Args:
+        items (Iterable[dict]): The items to encode.
+        chunk_size (int): The number of items encoded per chunk.
+
+    Yields:
+        str: Consecutive fragments of the JSON array.
+    """
+    iterator = iter(items)
+    yield "["
+    separator = ""
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        # Encoding the chunk as one list keeps the work inside the C encoder.
+        yield separator + _encoder.encode(chunk)[1:-1]
+        separator = ","
+    yield "]"
+
+
+def iter_encode_page(
+    items: Iterable[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, **fields: any
+) -> Iterator[str]:
+    """Yield a JSON list response in chunks.
+
+    The response is an object with an "Items" array followed by the given fields.
+    Fields whose value is None are left out.
+
+    Args:
+        items (Iterable[dict]): The items to encode.
+        chunk_size (int): The number of items encoded per chunk.
+        **fields (any): Additional top-level fields such as "Count".
+
+    Yields:
+        str: Consecutive fragments of the JSON object.
+    """
+    yield '{"Items":'
+    yield from iter_encode_items(items, chunk_size)
+    for name, value in fields.items():
+        if value is not None:
+            yield f",{_encoder.encode(name)}:{_encoder.encode(value)}"
+    yield "}"
+
+
+def encode_page(
+    items: Iterable[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, **fields: any
+) -> str:
+    """Serialize a JSON list response.
+
+    Args:
+        items (Iterable[dict]): The items to encode.
+        chunk_size (int): The number of items encoded per chunk.
+        **fields (any): Additional top-level fields such as "Count".
+
+    Returns:
+        str: The JSON document.
+    """
+    return "".join(iter_encode_page(items, chunk_size, **fields))
+
+
+def encode_cursor(key: dict | None) -> str | None:
+    """Encode a DynamoDB LastEvaluatedKey as an opaque, URL safe cursor.
+
+    Args:
+        key (dict | None): The LastEvaluatedKey returned by DynamoDB.
+
+    Returns:
+        str | None: The cursor, or None when there are no more pages.
+    """
+    if not key:
+        return None
+    return base64.urlsafe_b64encode(dumps(key).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str | None) -> dict | None:
+    """Decode a cursor back into a DynamoDB ExclusiveStartKey.
+
+    Args:
+        cursor (str | None): The cursor returned by a previous page.
+
+    Returns:
+        dict | None: The ExclusiveStartKey, or None when no cursor was given.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError) as error:
+        raise ValueError("Invalid cursor.") from error
+    if not isinstance(key, dict):
+        raise ValueError("Invalid cursor.")
+    return key
@@ -0,0 +1,246 @@
+""" Sharding.
+
+This module contains the write sharding used for click records of hot slugs.
+
+A slug starts unsharded and its clicks are appended to the slug item itself.
+Once DynamoDB throttles a click write of a slug, or a container sees a slug
+reach HOT_KEY_THRESHOLD clicks within HOT_KEY_WINDOW_SECONDS, the container
+promotes the slug by raising the "shards" attribute on the slug item. A
+container serves one request at a time, so the threshold is one it reaches on
+its own (5 clicks a second by default), and throttling catches slugs hot across
+the fleet whatever the clicks of each container. Clicks for a sharded slug are spread over auxiliary items
+keyed "<slug>#<n>", so no single partition key absorbs all the writes, and the
+shards are merged again on read.
+
+Replica regions always write clicks to shards keyed "<slug>#<region>.<n>",
+which only they write to, see the regions module.
+
+Auxiliary items carry a RECORD_TYPE_ATTRIBUTE so listings can filter them out.
+
+Functions:
+- shard_key(slug: str, shard: int, region: str): Build the key of a click shard.
+- shard_count(item: dict): Get the number of click shards of a slug item.
+- is_auxiliary(item: dict): Check whether an item is an auxiliary record.
+- record_click(repository, slug: str, shards: int, click: dict, region: str): Write a click to a random shard.
+- record_clicks(repository, slug: str, shards: int, clicks: list, region: str): Write clicks to a random shard in one update.
+- promote(repository, slug: str, shards: int): Raise the shard count of a hot slug.
+- read_clicks(repository, item: dict, regions: list): Merge the click counts of all shards.
+- delete_shards(repository, slug: str, shards: int, regions: list): Delete the click shards of a slug.
+
+Classes:
+- HotKeyDetector: Per container detector of slugs that are clicked too often.
+"""
+
+import os
+import random
+import sys
+import time
+from os import environ
+from typing import Callable
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from repository import Repository
+
+RECORD_TYPE_ATTRIBUTE = "recordType"
+CLICK_SHARD = "clickShard"
+SHARD_SEPARATOR = "#"
+MIN_HOT_SHARDS = int(environ.get("MIN_HOT_SHARDS") or 8)
+MAX_SHARDS = int(environ.get("MAX_SHARDS") or 64)
+HOT_KEY_THRESHOLD = int(environ.get("HOT_KEY_THRESHOLD") or 50)
+HOT_KEY_WINDOW_SECONDS = float(environ.get("HOT_KEY_WINDOW_SECONDS") or 10)
+
+
+def shard_key(slug: str, shard: int, region: str | None = None) -> str:
+    """Build the key of a click shard.
+
+    Args:
+        slug (str): The slug the shard belongs to.
+        shard (int): The shard number.
+        region (str | None): The replica region owning the shard, if any.
+
+    Returns:
+        str: The partition key of the shard item.
+    """
+    if region:
+        return f"{slug}{SHARD_SEPARATOR}{region}.{shard}"
+    return f"{slug}{SHARD_SEPARATOR}{shard}"
+
+
+def _shard_keys(slug: str, shards: int, regions: list[str]) -> list[dict]:
+    return [
+        {"slug": shard_key(slug, shard, region)}
+        for region in [None, *regions]
+        for shard in range(shards)
+        if region or shards > 1
+    ]
+
+
+def shard_count(item: dict) -> int:
+    """Get the number of click shards of a slug item.
+
+    Args:
+        item (dict): The slug item.
+
+    Returns:
+        int: The number of shards, 1 when the slug is unsharded.
+    """
+    return max(int(item.get("shards", 1)), 1)
+
+
+def is_auxiliary(item: dict) -> bool:
+    """Check whether an item is an auxiliary record rather than a slug.
+
+    Args:
+        item (dict): The item to check.
+
+    Returns:
+        bool: True if the item must not be served as a link.
+    """
+    return RECORD_TYPE_ATTRIBUTE in item
+
+
+def record_click(
+    repository: Repository, slug: str, shards: int, click: dict, region: str | None = None
+) -> None:
+    """Write a click to the slug item or to a random click shard.
+
+    Args:
+        repository (Repository): The repository.
+        slug (str): The slug that was clicked.
+        shards (int): The shard count of the slug.
+        click (dict): The click record to append.
+        region (str | None): The replica region writing the click, if any.
+    """
+    record_clicks(repository, slug, shards, [click], region)
+
+
+def record_clicks(
+    repository: Repository, slug: str, shards: int, clicks: list[dict], region: str | None = None
+) -> None:
+    """Write clicks to the slug item or to a random click shard, in a single update.
+
+    Args:
+        repository (Repository): The repository.
+        slug (str): The slug that was clicked.
+        shards (int): The shard count of the slug.
+        clicks (list[dict]): The click records to append.
+        region (str | None): The replica region writing the clicks, if any.
+    """
+    if shards <= 1 and not region:
+        repository.update({"slug": slug}, append={"requests": clicks}, add={"clicks": len(clicks)})
+        return
+
+    repository.update(
+        {"slug": shard_key(slug, random.randrange(shards), region)},
+        assign={RECORD_TYPE_ATTRIBUTE: CLICK_SHARD, "shardOf": slug},
+        append={"requests": clicks},
+        add={"clicks": len(clicks)},
+    )
+
+
+def promote(repository: Repository, slug: str, shards: int) -> int:
+    """Raise the shard count of a hot slug.
+
+    The update is conditional so concurrent containers promoting the same slug
+    never lower its shard count.
+
+    Args:
+        repository (Repository): The repository.
+        slug (str): The hot slug.
+        shards (int): The current shard count of the slug.
+
+    Returns:
+        int: The shard count after promotion.
+    """
+    target = min(max(shards * 2, MIN_HOT_SHARDS), MAX_SHARDS)
+    if target <= shards:
+        return shards
+    try:
+        repository.update(
+            {"slug": slug},
+            assign={"shards": target},
+            if_exists=True,
+            if_below={"shards": target},
+        )
+    except ClientError as error:
+        if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+    return target
+
+
+def _item_clicks(item: dict) -> int:
+    # Items written before the counter existed only carry click records.
+    return max(int(item.get("clicks", 0)), len(item.get("requests", [])))
+
+
+def read_clicks(repository: Repository, item: dict, regions: list[str] = ()) -> int:
+    """Merge the click counts of a slug item and all of its shards.
+
+    Args:
+        repository (Repository): The repository.
+        item (dict): The slug item.
+        regions (list[str]): The replica regions that may own click shards.
+
+    Returns:
+        int: The total number of clicks of the slug.
+    """
+    total = _item_clicks(item) + int(item.get("archivedClicks", 0))
+    keys = _shard_keys(item["slug"], shard_count(item), list(regions))
+    for shard in repository.batch_get(keys) if keys else []:
+        total += _item_clicks(shard) + int(shard.get("archivedClicks", 0))
+    return total
+
+
+def delete_shards(
+    repository: Repository, slug: str, shards: int, regions: list[str] = ()
+) -> None:
+    """Delete the click shards of a slug.
+
+    Args:
+        repository (Repository): The repository.
+        slug (str): The slug being deleted.
+        shards (int): The shard count of the slug.
+        regions (list[str]): The replica regions that may own click shards.
+    """
+    keys = _shard_keys(slug, shards, list(regions))
+    if keys:
+        repository.batch_delete(keys)
+
+
+class HotKeyDetector:
+    """Per container detector of slugs that are clicked too often.
+
+    Clicks are counted in fixed windows of `window_seconds`. A slug is reported
+    hot once per window, the moment its count reaches `threshold`.
+    """
+
+    def __init__(
+        self,
+        threshold: int = HOT_KEY_THRESHOLD,
+        window_seconds: float = HOT_KEY_WINDOW_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self.window_start = clock()
+        self.counts: dict[str, int] = {}
+
+    def record(self, slug: str) -> bool:
+        """Count a click and report whether the slug just became hot.
+
+        Args:
+            slug (str): The slug that was clicked.
+
+        Returns:
+            bool: True if the slug reached the threshold in the current window.
+        """
+        now = self.clock()
+        if now - self.window_start >= self.window_seconds:
+            self.window_start = now
+            self.counts.clear()
+        count = self.counts.get(slug, 0) + 1
+        self.counts[slug] = count
+        return count == self.threshold
@@ -0,0 +1,340 @@
+""" Slug Filter.
+
+This module contains the negative lookup index used to answer requests for
+slugs that do not exist without reading DynamoDB.
+
+A Bloom filter of every slug is built periodically into a snapshot file at
+SLUG_FILTER_PATH, which containers load at cold start. Slugs created after the
+snapshot was built are added to a small delta item in the table by the POST
+Lambda and removed from it again by the DELETE Lambda. Containers re-read the
+delta at most every SLUG_FILTER_DELTA_TTL seconds, and only when the snapshot
+alone says a slug does not exist, so junk paths cost no reads in between.
+
+The delta holds at most SLUG_FILTER_DELTA_MAX slugs, so it stays far below the
+item size limit of DynamoDB. A create that finds it full stamps it as
+overflowed instead, and containers stop filtering until a snapshot built after
+the overflow is published; the rebuild should then be run.
+
+Rebuilding the snapshot removes the slugs it now contains from the delta and
+stamps the delta with the build time. A container holding an older snapshot
+reloads SLUG_FILTER_PATH when it sees a newer stamp, and stops filtering if the
+file there is not the newer snapshot, so a slug is never reported missing
+because a container is behind. Slugs that are deleted stay in the snapshot
+until the next rebuild, which only costs a read.
+
+Usage:
+    python src/slug_filter.py <snapshot path> [expected slugs] [error rate]
+
+Functions:
+- build_from_table(repository, capacity: int, error_rate: float): Build a filter of every slug in the table.
+- rebuild(repository, path: str, capacity: int, error_rate: float): Write a new snapshot and trim the delta.
+- record_created(repository, slug: str, max_slugs: int): Add a slug to the delta.
+- record_deleted(repository, slug: str): Remove a slug from the delta.
+
+Classes:
+- BloomFilter: A Bloom filter of strings.
+- SlugFilter: The snapshot and delta of a container.
+"""
+
+import hashlib
+import math
+import os
+import struct
+import sys
+import time
+from decimal import Decimal
+from os import environ
+from typing import Callable
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from repository import Repository
+from sharding import RECORD_TYPE_ATTRIBUTE
+
+SNAPSHOT_PATH = environ.get("SLUG_FILTER_PATH")
+SLUG_FILTER_ENABLED = bool(SNAPSHOT_PATH)
+DELTA_TTL_SECONDS = float(environ.get("SLUG_FILTER_DELTA_TTL") or 5)
+DEFAULT_CAPACITY = int(environ.get("SLUG_FILTER_CAPACITY") or 1_000_000)
+DEFAULT_ERROR_RATE = float(environ.get("SLUG_FILTER_ERROR_RATE") or 0.01)
+DELTA_MAX_SLUGS = int(environ.get("SLUG_FILTER_DELTA_MAX") or 5000)
+DELTA_KEY = "#slug-filter-delta"
+SLUG_FILTER_DELTA = "slugFilterDelta"
+_HEADER = struct.Struct(">4sQId")
+_MAGIC = b"SLBF"
+
+
+class BloomFilter:
+    """A Bloom filter of strings.
+
+    Positions are derived from a single 128 bit BLAKE2b digest by double hashing.
+    """
+
+    def __init__(
+        self, size: int, hash_count: int, bits: bytearray | None = None, built_at: float = 0.0
+    ) -> None:
+        self.size = size
+        self.hash_count = hash_count
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+        self.built_at = built_at
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float, built_at: float = 0.0) -> "BloomFilter":
+        """Create a filter sized for a number of keys and a false positive rate.
+
+        Args:
+            capacity (int): The expected number of keys.
+            error_rate (float): The acceptable false positive rate.
+            built_at (float): The time the keys were read.
+
+        Returns:
+            BloomFilter: The empty filter.
+        """
+        capacity = max(capacity, 1)
+        size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        hash_count = max(round(size / capacity * math.log(2)), 1)
+        return cls(size, hash_count, built_at=built_at)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for index in range(self.hash_count):
+            yield (first + index * second) % self.size
+
+    def add(self, key: str) -> None:
+        """Add a key to the filter.
+
+        Args:
+            key (str): The key to add.
+        """
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def to_bytes(self) -> bytes:
+        """Serialize the filter.
+
+        Returns:
+            bytes: The snapshot of the filter.
+        """
+        return _HEADER.pack(_MAGIC, self.size, self.hash_count, self.built_at) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BloomFilter":
+        """Deserialize a filter.
+
+        Args:
+            data (bytes): The snapshot of the filter.
+
+        Returns:
+            BloomFilter: The filter.
+
+        Raises:
+            ValueError: If the data is not a snapshot.
+        """
+        if len(data) < _HEADER.size:
+            raise ValueError("Invalid slug filter snapshot.")
+        magic, size, hash_count, built_at = _HEADER.unpack_from(data)
+        bits = bytearray(data[_HEADER.size :])
+        if magic != _MAGIC or len(bits) != (size + 7) // 8:
+            raise ValueError("Invalid slug filter snapshot.")
+        return cls(size, hash_count, bits, built_at)
+
+    def save(self, path: str) -> None:
+        """Atomically write the filter to a snapshot file.
+
+        Args:
+            path (str): The path of the snapshot file.
+        """
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as snapshot:
+            snapshot.write(self.to_bytes())
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str | None) -> "BloomFilter | None":
+        """Load a filter from a snapshot file.
+
+        Args:
+            path (str | None): The path of the snapshot file.
+
+        Returns:
+            BloomFilter | None: The filter, or None if there is no valid snapshot.
+        """
+        if not path:
+            return None
+        try:
+            with open(path, "rb") as snapshot:
+                return cls.from_bytes(snapshot.read())
+        except (OSError, ValueError):
+            return None
+
+
+class SlugFilter:
+    """The snapshot and delta of a container.
+
+    Without a snapshot every slug might exist and the table is always read.
+    """
+
+    def __init__(
+        self,
+        repository: Repository,
+        path: str | None = SNAPSHOT_PATH,
+        ttl_seconds: float = DELTA_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.repository = repository
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.snapshot = BloomFilter.load(path)
+        self.delta: set[str] = set()
+        self.delta_read_at: float | None = None
+        self.overflowed = False
+
+    def _refresh_delta(self) -> None:
+        item = self.repository.get({"slug": DELTA_KEY}, consistent=True) or {}
+        self.delta = set(item.get("slugs", ()))
+        self.delta_read_at = self.clock()
+        built_at = float(item.get("snapshotBuiltAt", 0))
+        if self.snapshot and built_at > self.snapshot.built_at:
+            snapshot = BloomFilter.load(self.path)
+            self.snapshot = snapshot if snapshot and snapshot.built_at >= built_at else None
+        # Slugs created while the delta was full are only in snapshots built after.
+        self.overflowed = bool(self.snapshot) and float(item.get("overflowedAt", -1)) >= self.snapshot.built_at
+
+    def might_exist(self, slug: str) -> bool:
+        """Check whether a slug might exist.
+
+        Args:
+            slug (str): The slug to check.
+
+        Returns:
+            bool: False only if the slug certainly does not exist.
+        """
+        if self.snapshot is None or slug in self.snapshot:
+            return True
+        if self.delta_read_at is None or self.clock() - self.delta_read_at >= self.ttl_seconds:
+            self._refresh_delta()
+            # The refresh may have loaded a newer snapshot, or stopped filtering.
+            if self.snapshot is None or slug in self.snapshot:
+                return True
+        return self.overflowed or slug in self.delta
+
+
+def record_created(repository: Repository, slug: str, max_slugs: int = DELTA_MAX_SLUGS) -> bool:
+    """Add a slug to the delta.
+
+    Args:
+        repository (Repository): The repository.
+        slug (str): The slug that was created.
+        max_slugs (int): The maximum number of slugs in the delta.
+
+    Returns:
+        bool: True, or False if the delta was full and marked as overflowed instead.
+    """
+    try:
+        repository.update(
+            {"slug": DELTA_KEY},
+            assign={RECORD_TYPE_ATTRIBUTE: SLUG_FILTER_DELTA},
+            add={"slugs": {slug}},
+            if_smaller={"slugs": max_slugs},
+        )
+        return True
+    except ClientError as error:
+        if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+    repository.update({"slug": DELTA_KEY}, assign={"overflowedAt": Decimal(str(time.time()))})
+    return False
+
+
+def record_deleted(repository: Repository, slug: str) -> None:
+    """Remove a slug from the delta.
+
+    Args:
+        repository (Repository): The repository.
+        slug (str): The slug that was deleted.
+    """
+    try:
+        repository.update({"slug": DELTA_KEY}, discard={"slugs": {slug}}, if_exists=True)
+    except ClientError as error:
+        if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def build_from_table(
+    repository: Repository,
+    capacity: int = DEFAULT_CAPACITY,
+    error_rate: float = DEFAULT_ERROR_RATE,
+) -> BloomFilter:
+    """Build a filter of every slug in the table.
+
+    Args:
+        repository (Repository): The repository.
+        capacity (int): The expected number of slugs.
+        error_rate (float): The acceptable false positive rate.
+
+    Returns:
+        BloomFilter: The filter, stamped with the time the scan started.
+    """
+    bloom = BloomFilter.for_capacity(capacity, error_rate, built_at=time.time())
+    start_key = None
+    while True:
+        page = repository.scan(
+            start_key=start_key, exclude=RECORD_TYPE_ATTRIBUTE, projection=["slug"]
+        )
+        for item in page.items:
+            bloom.add(item["slug"])
+        if not page.last_key:
+            return bloom
+        start_key = page.last_key
+
+
+def rebuild(
+    repository: Repository,
+    path: str,
+    capacity: int = DEFAULT_CAPACITY,
+    error_rate: float = DEFAULT_ERROR_RATE,
+) -> BloomFilter:
+    """Write a new snapshot and trim the delta.
+
+    Only slugs that were in the delta before the scan started are removed from
+    it, since slugs created during the scan may be missing from the snapshot.
+
+    Args:
+        repository (Repository): The repository.
+        path (str): The path of the snapshot file.
+        capacity (int): The expected number of slugs.
+        error_rate (float): The acceptable false positive rate.
+
+    Returns:
+        BloomFilter: The new filter.
+    """
+    delta = repository.get({"slug": DELTA_KEY}, consistent=True) or {}
+    included = set(delta.get("slugs", ()))
+    bloom = build_from_table(repository, capacity, error_rate)
+    bloom.save(path)
+    repository.update(
+        {"slug": DELTA_KEY},
+        assign={
+            RECORD_TYPE_ATTRIBUTE: SLUG_FILTER_DELTA,
+            "snapshotBuiltAt": Decimal(str(bloom.built_at)),
+        },
+        discard={"slugs": included} if included else None,
+    )
+    return bloom
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from regions import regional_repositories
+
+    rebuild(
+        regional_repositories(environ.get("TABLE_NAME") or "dev-url-shortner-table")[1],
+        sys.argv[1],
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CAPACITY,
+        float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_ERROR_RATE,
+    )
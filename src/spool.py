@@ -0,0 +1,283 @@
+""" Spool.
+
+This module contains the write-behind of click records through a local spool.
+
+With CLICK_SPOOL_PATH set, the GET Lambda appends each click to a local
+append-only spool file instead of writing it to the table, and a background
+worker drains the spool into the table. A redirect then costs the lookup and a
+local append whatever the state of the table, and click writes follow the
+write capacity that is available rather than the traffic:
+
+- The worker reads up to SPOOL_BATCH_SIZE clicks at a time and writes them with
+  one update per slug, see the sharding module's record_clicks.
+- Clicks spooled as hot, and clicks whose write was throttled, promote their
+  slug before they are written, see the sharding module's promote, so
+  promotion never slows down a redirect either.
+- Updates are paced by a token bucket. Its rate starts at SPOOL_WRITE_RATE, is
+  halved whenever DynamoDB throttles, and grows back by a tenth of the
+  configured rate after each batch written, so writes settle at the capacity
+  other traffic leaves.
+- A batch that fails is retried after a capped, jittered exponential backoff,
+  without writing again the slugs of the batch that were already written.
+  Throttled clicks are never dropped, but a batch failing with another error
+  SPOOL_MAX_ATTEMPTS times in a row is, so one bad record cannot block the spool.
+
+The offset of the first click not written yet is saved to "<path>.offset"
+after each batch, so clicks spooled before a crash or a restart are drained by
+the next process. A crash in the middle of a batch writes part of it twice.
+Once the worker catches up, the offset is reset and then the spool truncated.
+
+In Lambda the spool lives in the /tmp storage of the container, which outlives
+invocations but not the container, and the worker is frozen along with the
+container between invocations. Clicks still spooled when a container shuts down
+are lost, like the pending clicks of the coalescing module.
+
+- CLICK_SPOOL_PATH: The spool file; clicks are written directly when unset.
+- SPOOL_BATCH_SIZE: The clicks drained per batch (default 100).
+- SPOOL_WRITE_RATE: The updates per second, as "<rate>/<burst>" (default "50/100").
+- SPOOL_POLL_SECONDS: Seconds the worker waits for more clicks (default 0.5).
+- SPOOL_MAX_ATTEMPTS: Attempts at a batch failing for other reasons than throttling (default 10).
+
+Classes:
+- ClickSpool: A local append-only spool of clicks, drained into the table by a background worker.
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from os import environ
+from typing import Callable
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from rate_limiting import TokenBucket, is_throttling_error, parse_limit
+from repository import Repository
+from sharding import promote, record_clicks
+
+CLICK_SPOOL_PATH = environ.get("CLICK_SPOOL_PATH")
+SPOOL_BATCH_SIZE = int(environ.get("SPOOL_BATCH_SIZE") or 100)
+SPOOL_WRITE_RATE = parse_limit(environ.get("SPOOL_WRITE_RATE"), "50/100")
+SPOOL_POLL_SECONDS = float(environ.get("SPOOL_POLL_SECONDS") or 0.5)
+SPOOL_MAX_ATTEMPTS = int(environ.get("SPOOL_MAX_ATTEMPTS") or 10)
+SPOOL_RETRY_BASE_SECONDS = 0.05
+SPOOL_RETRY_MAX_SECONDS = 5.0
+
+
+class ClickSpool:
+    """A local append-only spool of clicks, drained into the table by a background worker."""
+
+    def __init__(
+        self,
+        path: str,
+        repository: Repository,
+        region: str | None = None,
+        home_repository: Repository | None = None,
+        batch_size: int = SPOOL_BATCH_SIZE,
+        rate: tuple[float, float] = SPOOL_WRITE_RATE,
+        poll_seconds: float = SPOOL_POLL_SECONDS,
+        max_attempts: int = SPOOL_MAX_ATTEMPTS,
+        background: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        log: Logger | None = None,
+    ) -> None:
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self.repository = repository
+        self.region = region
+        self.home_repository = home_repository or repository
+        self.batch_size = batch_size
+        self.max_rate = rate[0]
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.background = background
+        self.clock = clock
+        self.sleep = sleep
+        self.log = log or Logger(service="click-spool")
+        self.bucket = TokenBucket(rate[0], rate[1], clock())
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.closed = threading.Event()
+        self.worker: threading.Thread | None = None
+        self.attempts = 0
+        self.written: set[str] = set()
+        self.throttled: set[str] = set()
+        self.dropped = 0
+        self.file = open(path, "ab")
+        self.offset = 0
+        if os.path.exists(self.offset_path):
+            with open(self.offset_path) as offset:
+                self.offset = int(offset.read() or 0)
+        # Clicks spooled by a previous process count as pending until drained.
+        records, end = self._read(None)
+        self.pending: Counter[str] = Counter(record["slug"] for record in records)
+        if end < self.file.tell():
+            # The last click of a process that crashed while appending it.
+            self.file.truncate(end)
+        if self.background and self.pending:
+            self.start()
+
+    def append(self, slug: str, shards: int, click: dict, hot: bool = False) -> None:
+        """Spool a click.
+
+        Args:
+            slug (str): The slug that was clicked.
+            shards (int): The current shard count of the slug.
+            click (dict): The click record.
+            hot (bool): Whether the slug just became hot and must be promoted.
+        """
+        record = {"slug": slug, "shards": shards, "click": click}
+        if hot:
+            record["hot"] = True
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self.lock:
+            self.file.write(line.encode("utf-8") + b"\n")
+            self.file.flush()
+            self.pending[slug] += 1
+            size = self.pending.total()
+        if self.background:
+            self.start()
+            if size >= self.batch_size:
+                self.wake.set()
+
+    def pending_clicks(self, slug: str) -> int:
+        """Get the number of spooled clicks of a slug that are not written yet.
+
+        Args:
+            slug (str): The slug.
+
+        Returns:
+            int: The number of spooled clicks.
+        """
+        return self.pending[slug]
+
+    def start(self) -> None:
+        """Start the background worker, unless it is running."""
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, name="click-spool", daemon=True)
+            self.worker.start()
+
+    def close(self) -> None:
+        """Stop the background worker and close the spool. Spooled clicks stay for the next process."""
+        self.closed.set()
+        self.wake.set()
+        if self.worker is not None:
+            self.worker.join()
+        self.file.close()
+
+    def _run(self) -> None:
+        while not self.closed.is_set():
+            self.wake.wait(self.poll_seconds)
+            self.wake.clear()
+            try:
+                while not self.closed.is_set() and self.drain():
+                    pass
+            except Exception:
+                # Keep the worker alive; the batch is read again on the next poll.
+                self.log.exception("Click spool drain failed.")
+                self.sleep(SPOOL_RETRY_MAX_SECONDS)
+
+    def _read(self, limit: int | None) -> tuple[list[dict], int]:
+        records, end = [], self.offset
+        with open(self.path, "rb") as spool:
+            spool.seek(self.offset)
+            for line in spool:
+                if not line.endswith(b"\n"):
+                    # A click still being appended.
+                    break
+                end += len(line)
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    self.dropped += 1
+                if limit and len(records) >= limit:
+                    break
+        return records, end
+
+    def _throttle(self) -> None:
+        while True:
+            wait = self.bucket.take(1, self.clock())
+            if not wait:
+                return
+            self.sleep(wait)
+
+    def drain(self) -> int:
+        """Write one batch of spooled clicks to the table.
+
+        Returns:
+            int: The number of clicks drained, 0 if the spool is empty or the batch failed.
+
+        Raises:
+            OSError: If the spool cannot be read.
+        """
+        records, end = self._read(self.batch_size)
+        if not records:
+            if end > self.offset:
+                self._commit(end)
+            return 0
+        groups: dict[str, tuple[int, list[dict]]] = {}
+        hot = set()
+        for record in records:
+            shards, clicks = groups.setdefault(record["slug"], (int(record["shards"]), []))
+            clicks.append(record["click"])
+            if record.get("hot"):
+                hot.add(record["slug"])
+        try:
+            for slug, (shards, clicks) in groups.items():
+                if slug in self.written:
+                    continue
+                if slug in hot or slug in self.throttled:
+                    self._throttle()
+                    shards = promote(self.home_repository, slug, shards)
+                    self.throttled.discard(slug)
+                self._throttle()
+                record_clicks(self.repository, slug, shards, clicks, self.region)
+                self._written(slug, len(clicks))
+        except ClientError as error:
+            self.attempts += 1
+            throttled = is_throttling_error(error)
+            if throttled:
+                self.throttled.add(slug)
+                self.bucket.rate = max(self.max_rate / 64, self.bucket.rate / 2)
+            if throttled or self.attempts < self.max_attempts:
+                delay = min(SPOOL_RETRY_MAX_SECONDS, SPOOL_RETRY_BASE_SECONDS * 2**self.attempts)
+                self.sleep(random.uniform(0, delay))
+                return 0
+            for slug, (_, clicks) in groups.items():
+                if slug not in self.written:
+                    self.dropped += len(clicks)
+                    self._written(slug, len(clicks))
+        else:
+            self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate / 10)
+        self._commit(end)
+        return len(records)
+
+    def _written(self, slug: str, count: int) -> None:
+        with self.lock:
+            self.pending[slug] -= count
+            if self.pending[slug] <= 0:
+                del self.pending[slug]
+        self.written.add(slug)
+
+    def _commit(self, end: int) -> None:
+        with self.lock:
+            # Caught up: nothing can be appended while the lock is held.
+            caught_up = end >= self.file.tell()
+            self.offset = 0 if caught_up else end
+            temporary_path = f"{self.offset_path}.tmp"
+            with open(temporary_path, "w") as offset:
+                offset.write(str(self.offset))
+            os.replace(temporary_path, self.offset_path)
+            if caught_up:
+                # Truncated only once the offset is reset, so a crash in between
+                # drains the last clicks again rather than skipping new ones.
+                self.file.truncate(0)
+                self.file.seek(0)
+        self.written.clear()
+        self.attempts = 0
@@ -0,0 +1,161 @@
+""" Startup.
+
+This module contains the cold start handling shared by the Lambda functions.
+
+Each handler module creates a Startup once its imports are done. Startup:
+
+- Pre-warms the repositories at init, with a read of a key that never exists,
+  so the first request does not pay for loading the DynamoDB service model and
+  opening the connection pool. The init phase runs with a full CPU even at
+  128 MB, and ahead of any request with provisioned concurrency.
+- Answers warm-up pings (WARMUP_EVENT, sent by an EventBridge schedule) without
+  routing or logging them, pre-warming first if that did not happen at init.
+- Publishes the cold start phases of the container as CloudWatch metrics once
+  its first request is served: ColdStartImport (from process start to the end
+  of the imports), ColdStartClientInit (the pre-warm) and
+  ColdStartFirstRequest, dimensioned by initialization type, so provisioned
+  concurrency can be sized from data.
+
+- STARTUP_PREWARM: Pre-warm at init ("true" by default inside Lambda).
+- POWERTOOLS_METRICS_NAMESPACE: The namespace of the metrics.
+
+Functions:
+- is_warmup(event: dict): Check whether an event is a warm-up ping.
+- process_age(): Get the seconds since the process started.
+
+Classes:
+- Startup: The cold start state of a container.
+"""
+
+import os
+import sys
+import time
+from os import environ
+from typing import Callable
+
+from aws_lambda_powertools import Logger, Metrics
+from aws_lambda_powertools.metrics import MetricUnit
+from aws_lambda_powertools.metrics.provider.cloudwatch_emf.cloudwatch import \
+    AmazonCloudWatchEMFProvider
+from botocore.exceptions import BotoCoreError, ClientError
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from repository import Repository
+
+WARMUP_KEY = "warmup"
+WARMUP_EVENT = {WARMUP_KEY: True}
+WARMUP_RESPONSE = {"statusCode": 200, "body": "warm"}
+PREWARM_KEY = {"slug": "#prewarm"}
+PREWARM_ON_INIT = (
+    environ.get("STARTUP_PREWARM")
+    or ("true" if environ.get("AWS_LAMBDA_FUNCTION_NAME") else "false")
+).lower() == "true"
+INITIALIZATION_TYPE = environ.get("AWS_LAMBDA_INITIALIZATION_TYPE") or "on-demand"
+METRICS_NAMESPACE = environ.get("POWERTOOLS_METRICS_NAMESPACE") or "url-shortener"
+
+
+def is_warmup(event: dict) -> bool:
+    """Check whether an event is a warm-up ping.
+
+    Args:
+        event (dict): The Lambda event.
+
+    Returns:
+        bool: True for WARMUP_EVENT and for scheduled EventBridge events.
+    """
+    if not isinstance(event, dict):
+        return False
+    return event.get(WARMUP_KEY) is True or (
+        event.get("source") == "aws.events" and event.get("detail-type") == "Scheduled Event"
+    )
+
+
+def process_age() -> float | None:
+    """Get the seconds since the process started.
+
+    Returns:
+        float | None: The age of the process, or None outside Linux.
+    """
+    try:
+        with open("/proc/self/stat") as stat:
+            # The fields after the command name start at field 3, the state.
+            start_ticks = int(stat.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as uptime:
+            return float(uptime.read().split()[0]) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Startup:
+    """The cold start state of a container."""
+
+    def __init__(
+        self,
+        service: str,
+        repositories: list[Repository],
+        prewarm: bool = PREWARM_ON_INIT,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.service = service
+        self.repositories = list({id(repository): repository for repository in repositories}.values())
+        self.clock = clock
+        self.log = Logger(service=service)
+        # Metrics instances share their metrics at class level unless given a provider.
+        self.metrics = Metrics(
+            provider=AmazonCloudWatchEMFProvider(namespace=METRICS_NAMESPACE, service=service)
+        )
+        self.phases: dict[str, float] = {}
+        age = process_age()
+        if age is not None:
+            self.phases["ColdStartImport"] = age * 1000
+        self.prewarmed = False
+        self.served = False
+        if prewarm:
+            self.prewarm()
+
+    def prewarm(self) -> None:
+        """Initialize the clients and connection pools of the repositories.
+
+        Failures are logged, the first request will then initialize them.
+        """
+        started = self.clock()
+        try:
+            for repository in self.repositories:
+                repository.get(PREWARM_KEY)
+        except (BotoCoreError, ClientError) as error:
+            self.log.warning(f"Pre-warming failed: {error}")
+        self.phases["ColdStartClientInit"] = (self.clock() - started) * 1000
+        self.prewarmed = True
+
+    def handle(self, event: dict, context, handler: Callable) -> dict:
+        """Handle an invocation.
+
+        Args:
+            event (dict): The Lambda event.
+            context (LambdaContext): The Lambda context.
+            handler (Callable): The handler routing the event.
+
+        Returns:
+            dict: The response of the handler, or WARMUP_RESPONSE to a warm-up ping.
+        """
+        if is_warmup(event):
+            if not self.prewarmed:
+                self.prewarm()
+            return WARMUP_RESPONSE
+        if self.served:
+            return handler(event, context)
+
+        started = self.clock()
+        try:
+            return handler(event, context)
+        finally:
+            self.served = True
+            self.phases["ColdStartFirstRequest"] = (self.clock() - started) * 1000
+            self.publish()
+
+    def publish(self) -> None:
+        """Publish the cold start phases as metrics."""
+        self.metrics.add_dimension(name="initializationType", value=INITIALIZATION_TYPE)
+        for name, milliseconds in self.phases.items():
+            self.metrics.add_metric(name=name, unit=MetricUnit.Milliseconds, value=milliseconds)
+        self.metrics.flush_metrics()
@@ -0,0 +1,241 @@
+""" Tenancy.
+
+This module contains the multi-tenant routing of links served on several domains.
+
+Each brand is a tenant with its own domains, and the same slug resolves
+independently on each of them. The tenant of a request is resolved from its
+Host header through host items keyed "#tenantHost:<host>", so domains are
+onboarded with a write instead of a deploy (see Usage). Hosts without a host
+item, such as the API's own domain, belong to the default tenant.
+
+Links of a tenant are stored under the composite key "<tenant>/<slug>", built by
+`tenant_key`, while links of the default tenant keep their plain slug. Slugs
+may not contain TENANT_SEPARATOR, see `validate_slug`, so keys of different
+tenants never collide, and a redirect stays a single keyed read. Listings of
+links, by owner, by tag or of the hot links, only keep the keys of the tenant
+of the request, see `in_tenant`. Everything keyed by slug, such as
+click shards, tag items, the slug filter and the per container caches and
+counters, is keyed by the composite key and so kept per tenant. URL hashes,
+owners and tags are prefixed the same way, so two tenants may shorten the same
+target URL, and a listing by owner or tag only reads the index entries of its
+tenant.
+
+Each container caches the tenant of the hosts it serves in a least recently
+used cache, unknown hosts included, for TENANT_CACHE_TTL seconds, so resolving
+the tenant costs no read in the steady state. Requests of a tenant also share a
+tenant token bucket in the rate limiter, see the rate_limiting module, so one
+noisy tenant cannot use up the capacity of the others.
+
+Usage:
+    python src/tenancy.py <host> <tenant>
+        Serve the links of a tenant on a host.
+
+- TENANT_CACHE_TTL: Seconds a host is cached for (default 300).
+- TENANT_CACHE_SIZE: Hosts cached per container (default 1000).
+
+Functions:
+- normalize_host(host: str): Get the canonical form of a Host header.
+- host_key(host: str): Build the key of the host item of a host.
+- tenant_key(tenant: str, value: str): Build the key of a slug or URL hash of a tenant.
+- in_tenant(tenant: str, key: str): Check whether a slug key belongs to a tenant.
+- strip_tenant(tenant: str, key: str): Get the value of a key built by `tenant_key`.
+- validate_slug(slug: str): Check the slug of a request.
+- register_host(repository, host: str, tenant: str): Serve the links of a tenant on a host.
+
+Classes:
+- TenantResolver: A least recently used cache of the tenant of each host.
+"""
+
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from os import environ
+from typing import Callable
+
+from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from repository import KEY_ATTRIBUTE, Repository
+from sharding import RECORD_TYPE_ATTRIBUTE, SHARD_SEPARATOR
+
+TENANT_CACHE_TTL = float(environ.get("TENANT_CACHE_TTL") or 300)
+TENANT_CACHE_SIZE = int(environ.get("TENANT_CACHE_SIZE") or 1000)
+TENANT_ATTRIBUTE = "tenant"
+TENANT_HOST_RECORD = "tenantHost"
+TENANT_SEPARATOR = "/"
+TENANT_PATTERN = re.compile(r"[a-z0-9][a-z0-9-]{0,62}")
+# Paths of GET routes that would shadow a slug.
+RESERVED_SLUGS = {"hot", "metadata", "resolve"}
+
+
+def normalize_host(host: str) -> str:
+    """Get the canonical form of a Host header.
+
+    Args:
+        host (str): The Host header.
+
+    Returns:
+        str: The lowercased host, without port or trailing dot.
+    """
+    return re.sub(r":\d+$", "", host.strip().lower()).rstrip(".")
+
+
+def host_key(host: str) -> str:
+    """Build the key of the host item of a host.
+
+    Args:
+        host (str): The normalized host.
+
+    Returns:
+        str: The partition key of the host item.
+    """
+    return f"#{TENANT_HOST_RECORD}:{host}"
+
+
+def tenant_key(tenant: str | None, value: str) -> str:
+    """Build the key of a slug, URL hash, owner or tag of a tenant.
+
+    Args:
+        tenant (str | None): The tenant, or None for the default tenant.
+        value (str): The slug, URL hash, owner or tag.
+
+    Returns:
+        str: The composite key, or the value itself for the default tenant.
+    """
+    return f"{tenant}{TENANT_SEPARATOR}{value}" if tenant else value
+
+
+def in_tenant(tenant: str | None, key: str) -> bool:
+    """Check whether a slug key belongs to a tenant.
+
+    Args:
+        tenant (str | None): The tenant, or None for the default tenant.
+        key (str): The key of a link, as built by `tenant_key`.
+
+    Returns:
+        bool: Whether the link belongs to the tenant.
+    """
+    if tenant:
+        return key.startswith(f"{tenant}{TENANT_SEPARATOR}")
+    return TENANT_SEPARATOR not in key
+
+
+def strip_tenant(tenant: str | None, key: str) -> str:
+    """Get the value of a key built by `tenant_key`.
+
+    Args:
+        tenant (str | None): The tenant, or None for the default tenant.
+        key (str): The composite key.
+
+    Returns:
+        str: The key without the prefix of the tenant.
+    """
+    prefix = f"{tenant}{TENANT_SEPARATOR}" if tenant else ""
+    return key[len(prefix):] if key.startswith(prefix) else key
+
+
+def validate_slug(slug: any) -> str | None:
+    """Check the slug of a request.
+
+    Slugs may not contain SHARD_SEPARATOR, which every key other than a link's
+    contains or starts with: click shards, tag items, host items, idempotency
+    records and hot slugs items. Nor may they contain TENANT_SEPARATOR, so a
+    request cannot reach the links of another tenant.
+
+    Args:
+        slug (any): The slug of the request body.
+
+    Returns:
+        str | None: The error message, or None if the slug is valid.
+    """
+    if not isinstance(slug, str) or not slug:
+        return "The 'slug' field must be a non-empty string."
+    for separator in (SHARD_SEPARATOR, TENANT_SEPARATOR):
+        if separator in slug:
+            return f"The slug may not contain '{separator}'."
+    if slug in RESERVED_SLUGS:
+        return f"The slug '{slug}' is reserved."
+    return None
+
+
+def register_host(repository: Repository, host: str, tenant: str) -> None:
+    """Serve the links of a tenant on a host.
+
+    Containers pick the change up within TENANT_CACHE_TTL seconds.
+
+    Args:
+        repository (Repository): The repository of the home region.
+        host (str): The host, such as "brand-a.link".
+        tenant (str): The tenant: lowercase letters, digits and dashes.
+
+    Raises:
+        ValueError: If the tenant name is invalid.
+    """
+    if not TENANT_PATTERN.fullmatch(tenant):
+        raise ValueError("Tenants are 1 to 63 lowercase letters, digits and dashes.")
+    repository.put(
+        {
+            KEY_ATTRIBUTE: host_key(normalize_host(host)),
+            RECORD_TYPE_ATTRIBUTE: TENANT_HOST_RECORD,
+            TENANT_ATTRIBUTE: tenant,
+        }
+    )
+
+
+class TenantResolver:
+    """A least recently used cache of the tenant of each host."""
+
+    def __init__(
+        self,
+        repository: Repository,
+        ttl_seconds: float = TENANT_CACHE_TTL,
+        max_size: int = TENANT_CACHE_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.repository = repository
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.clock = clock
+        self.entries: OrderedDict[str, tuple[str | None, float]] = OrderedDict()
+
+    def resolve(self, event: APIGatewayProxyEvent) -> str | None:
+        """Get the tenant of a request from its Host header.
+
+        Args:
+            event (APIGatewayProxyEvent): The API Gateway event.
+
+        Returns:
+            str | None: The tenant, or None for the default tenant.
+
+        Raises:
+            ClientError: If the host item cannot be read.
+        """
+        host = event.get_header_value("Host", case_sensitive=False)
+        if not host:
+            return None
+        host = normalize_host(host)
+        now = self.clock()
+        entry = self.entries.get(host)
+        if entry is not None and now < entry[1]:
+            self.entries.move_to_end(host)
+            return entry[0]
+
+        item = self.repository.get({KEY_ATTRIBUTE: host_key(host)}, projection=[TENANT_ATTRIBUTE])
+        tenant = item.get(TENANT_ATTRIBUTE) if item else None
+        self.entries[host] = (tenant, now + self.ttl_seconds)
+        self.entries.move_to_end(host)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return tenant
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from regions import regional_repositories
+
+    register_host(
+        regional_repositories(environ.get("TABLE_NAME") or "dev-url-shortner-table")[1],
+        sys.argv[1],
+        sys.argv[2],
+    )
@@ -0,0 +1,203 @@
+""" URL Normalization.
+
+This module contains the canonicalization of target URLs used to deduplicate links.
+
+URLs that differ only in ways that do not change the resource they point to
+map to the same canonical form, and so to the same fixed-length hash:
+
+- The scheme and host are lowercased and a trailing dot on the host is dropped.
+- Default ports (80 for http, 443 for https) are dropped.
+- Empty paths become "/" and trailing slashes are dropped from other paths.
+- Query parameters are sorted, and tracking parameters (TRACKING_PARAMETERS and
+  any "utm_" parameter) are removed.
+
+Links store the hash of their target URL in the "urlHash" attribute, which is
+the partition key of the URL_HASH_INDEX index, so the POST Lambda finds an
+existing link with one indexed query instead of a scan. Each container also
+remembers the hashes of links it recently created or found in a RecentUrls
+cache, so repeated creates of the same URL are answered without any read.
+Entries expire after URL_CACHE_TTL seconds, since another container may delete
+the link in the meantime.
+
+Usage:
+    python src/url_normalization.py
+        Store the urlHash of every link created before it existed.
+
+Functions:
+- canonicalize(url: str): Get the canonical form of a URL.
+- url_hash(url: str): Get the fixed-length hash of the canonical form of a URL.
+- backfill(repository): Store the urlHash of every link that lacks one.
+
+Classes:
+- RecentUrls: A least recently used cache of URL hashes and their slugs.
+"""
+
+import base64
+import hashlib
+import os
+import sys
+import time
+from collections import OrderedDict
+from os import environ
+from typing import Callable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+sys.path.append(os.path.join(os.path.dirname(__file__)))
+from repository import Repository
+from sharding import RECORD_TYPE_ATTRIBUTE
+
+URL_HASH_ATTRIBUTE = "urlHash"
+URL_CACHE_SIZE = int(environ.get("URL_CACHE_SIZE") or 10000)
+URL_CACHE_TTL = float(environ.get("URL_CACHE_TTL") or 300)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAMETERS = {
+    "fbclid",
+    "gclid",
+    "dclid",
+    "msclkid",
+    "yclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_ga",
+    "_hsenc",
+    "_hsmi",
+}
+
+
+def _is_tracking(name: str) -> bool:
+    name = name.lower()
+    return name.startswith("utm_") or name in TRACKING_PARAMETERS
+
+
+def canonicalize(url: str) -> str:
+    """Get the canonical form of a URL.
+
+    Strings that are not absolute URLs are only stripped of surrounding whitespace.
+
+    Args:
+        url (str): The URL.
+
+    Returns:
+        str: The canonical URL.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.hostname:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = parts.hostname.rstrip(".")
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    userinfo = parts.netloc.rpartition("@")[0]
+    netloc = f"{userinfo}@{host}" if userinfo else host
+
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+    query = urlencode(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not _is_tracking(name)
+        )
+    )
+    return urlunsplit((scheme, netloc, path, query, parts.fragment))
+
+
+def url_hash(url: str) -> str:
+    """Get the fixed-length hash of the canonical form of a URL.
+
+    Args:
+        url (str): The URL.
+
+    Returns:
+        str: A 22 character URL-safe hash.
+    """
+    digest = hashlib.blake2b(canonicalize(url).encode("utf-8"), digest_size=16).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+class RecentUrls:
+    """A least recently used cache of URL hashes and their slugs."""
+
+    def __init__(
+        self,
+        max_size: int = URL_CACHE_SIZE,
+        ttl_seconds: float = URL_CACHE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    def get(self, key: str) -> str | None:
+        """Get the slug of a recently seen URL hash.
+
+        Args:
+            key (str): The URL hash.
+
+        Returns:
+            str | None: The slug, if the hash was seen within the TTL.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        slug, expires_at = entry
+        if self.clock() >= expires_at:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return slug
+
+    def add(self, key: str, slug: str) -> None:
+        """Remember the slug of a URL hash.
+
+        Args:
+            key (str): The URL hash.
+            slug (str): The slug of the link.
+        """
+        self.entries[key] = (slug, self.clock() + self.ttl_seconds)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+def backfill(repository: Repository) -> int:
+    """Store the urlHash of every link that lacks one.
+
+    Args:
+        repository (Repository): The repository.
+
+    Returns:
+        int: The number of links updated.
+    """
+    updated = 0
+    start_key = None
+    while True:
+        page = repository.scan(start_key=start_key, exclude=RECORD_TYPE_ATTRIBUTE)
+        for item in page.items:
+            if URL_HASH_ATTRIBUTE not in item and "targetUrl" in item:
+                repository.update(
+                    {"slug": item["slug"]},
+                    assign={URL_HASH_ATTRIBUTE: url_hash(str(item["targetUrl"]))},
+                    if_exists=True,
+                )
+                updated += 1
+        if not page.last_key:
+            return updated
+        start_key = page.last_key
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from regions import regional_repositories
+
+    print(backfill(regional_repositories(environ.get("TABLE_NAME") or "dev-url-shortner-table")[1]))
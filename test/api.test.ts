@@ -113,4 +113,58 @@ describe('GET Lambda: Role', () => {
     );
   });
 
-});
\ No newline at end of file
+});
+describe('Cold Starts', () => {
+  it('Should have a "live" GET Lambda alias with provisioned concurrency', () => {
+    template.hasResourceProperties('AWS::Lambda::Alias',
+      Match.objectLike({
+        Name: "live",
+        ProvisionedConcurrencyConfig: {
+          ProvisionedConcurrentExecutions: 1
+        }
+      })
+    );
+  });
+  it('Should have warm-up rules sending {"warmup": true} every 5 minutes', () => {
+    template.resourcePropertiesCountIs('AWS::Events::Rule',
+      Match.objectLike({
+        ScheduleExpression: "rate(5 minutes)",
+        Targets: [
+          Match.objectLike({
+            Input: JSON.stringify({ warmup: true })
+          })
+        ]
+      }),
+      3
+    );
+  });
+});
+
+describe('Rate Limiting', () => {
+  it('Should trust the X-Forwarded-For entries of CloudFront and the edge of the API', () => {
+    template.hasResourceProperties('AWS::Lambda::Function',
+      Match.objectLike({
+        Environment: {
+          Variables: Match.objectLike({
+            TRUSTED_PROXY_HOPS: "2"
+          })
+        }
+      })
+    );
+  });
+});
+
+describe('Idempotency', () => {
+  it('Should point the POST and PUT Lambdas at the idempotency table', () => {
+    template.resourcePropertiesCountIs('AWS::Lambda::Function',
+      Match.objectLike({
+        Environment: {
+          Variables: Match.objectLike({
+            IDEMPOTENCY_TABLE_NAME: "dev-url-shortner-idempotency-table"
+          })
+        }
+      }),
+      2
+    );
+  });
+});
@@ -0,0 +1,74 @@
+""" Serialization Benchmark.
+
+Compares the previous list response path (building the whole response dict and
+calling json.dumps on it) with the chunked encoder in src/serialization.py.
+The previous path raises TypeError on Decimal values, so it is given `default=str`.
+
+Usage:
+    python test/benchmark/bench_serialization.py [item_count] [repeat]
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+from decimal import Decimal
+
+sys.path.append(os.path.abspath("."))
+
+from src.serialization import encode_page  # noqa: E402
+
+
+def make_items(count: int) -> list[dict]:
+    """Build items shaped like the ones the boto3 resource layer returns."""
+    return [
+        {
+            "slug": f"{index:08x}",
+            "targetUrl": f"https://www.example.com/{index}",
+            "createdAt": "2023-10-01T00:00:00Z",
+            "clicks": Decimal(index),
+            "requests": [
+                {
+                    "ip": "0.0.0.0",
+                    "userAgent": "Mozilla/5.0",
+                    "referer": None,
+                    "timestamp": "2023-10-01T00:00:00Z",
+                }
+            ]
+            * 5,
+        }
+        for index in range(count)
+    ]
+
+
+def previous_path(items: list[dict]) -> str:
+    return json.dumps(
+        {"Count": len(items), "Items": items, "Scanned": len(items)}, default=str
+    )
+
+
+def chunked_path(items: list[dict]) -> str:
+    return encode_page(iter(items), Count=len(items), Scanned=len(items))
+
+
+def peak_memory(function, items: list[dict]) -> int:
+    tracemalloc.start()
+    function(items)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    items = make_items(count)
+    print(f"{count} items, best of {repeat}")
+    for name, function in (("previous", previous_path), ("chunked", chunked_path)):
+        seconds = min(timeit.repeat(lambda: function(items), number=1, repeat=repeat))
+        peak = peak_memory(function, items)
+        print(f"{name:>10}: {seconds * 1000:8.2f} ms  peak {peak / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
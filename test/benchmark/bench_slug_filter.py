@@ -0,0 +1,42 @@
+""" Slug Filter Benchmark.
+
+Measures the memory footprint, build time, lookup time and false positive rate
+of the slug filter in src/slug_filter.py.
+
+Usage:
+    python test/benchmark/bench_slug_filter.py [slug_count] [error_rate] [probes]
+"""
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.abspath("."))
+
+from src.slug_filter import BloomFilter  # noqa: E402
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    error_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    probes = int(sys.argv[3]) if len(sys.argv) > 3 else 1_000_000
+
+    bloom = BloomFilter.for_capacity(count, error_rate)
+    print(f"{count} slugs at a target false positive rate of {error_rate}")
+    print(f"  size: {bloom.size} bits, {bloom.hash_count} hashes, {len(bloom.to_bytes()) / 2**20:.1f} MiB snapshot")
+
+    started = time.perf_counter()
+    for index in range(count):
+        bloom.add(f"{index:08x}")
+    print(f"  build: {time.perf_counter() - started:.1f} s")
+
+    junk = [str(uuid.uuid4()) for _ in range(probes)]
+    started = time.perf_counter()
+    false_positives = sum(slug in bloom for slug in junk)
+    elapsed = time.perf_counter() - started
+    print(f"  lookup: {elapsed / probes * 1e6:.2f} us per junk slug")
+    print(f"  false positive rate: {false_positives / probes:.4%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,55 @@ describe('DynamoDB Table', () => {
       }
     );
   });
+  it('Should have owner and tag indexes sorted by creation time', () => {
+    template.hasResourceProperties('AWS::DynamoDB::Table',
+      Match.objectLike({
+        GlobalSecondaryIndexes: Match.arrayWith([
+          Match.objectLike({
+            IndexName: "owner-index",
+            KeySchema: [
+              { AttributeName: "owner", KeyType: "HASH" },
+              { AttributeName: "createdAt", KeyType: "RANGE" },
+            ],
+            Projection: { ProjectionType: "KEYS_ONLY" },
+          }),
+          Match.objectLike({
+            IndexName: "tag-index",
+            KeySchema: [
+              { AttributeName: "tag", KeyType: "HASH" },
+              { AttributeName: "createdAt", KeyType: "RANGE" },
+            ],
+            Projection: { ProjectionType: "INCLUDE", NonKeyAttributes: ["tagOf"] },
+          }),
+        ]),
+      })
+    );
+  });
+  it('Should only add the first indexes when tableIndexes is set', () => {
+    const partial = Template.fromStack(new DatabaseStack(new cdk.App(), 'PartialDatabaseStack', {
+      ...coreStackProps,
+      tableIndexes: 1,
+    }));
+    partial.hasResourceProperties('AWS::DynamoDB::Table',
+      Match.objectLike({
+        TableName: "dev-url-shortner-table",
+        GlobalSecondaryIndexes: [
+          Match.objectLike({ IndexName: "urlHash-index" }),
+        ],
+      })
+    );
+  });
+  it('Should have an idempotency table expiring records through TTL', () => {
+    template.hasResourceProperties('AWS::DynamoDB::Table',
+      {
+        TableName: "dev-url-shortner-idempotency-table",
+        TimeToLiveSpecification: {
+          AttributeName: "expiresAt",
+          Enabled: true
+        }
+      }
+    );
+  });
   it('Should have tags with the keys "project" and "stage" ', () => {
     template.hasResourceProperties('AWS::DynamoDB::Table',
       Match.objectLike({
@@ -0,0 +1,81 @@
+""" Unit Test Configuration.
+
+Starts the DynamoDB mock and creates the mocked tables once per test session,
+and empties them and resets the handler containers before each test, see
+fixtures.py.
+
+Options:
+- --benchmark: Time every call of a Lambda handler and print the timings of
+  each route after the run. Also enabled by setting BENCHMARK=1.
+- --benchmark-json: Write the timings to a JSON file, to compare runs.
+- --dataset-size: The number of items seeded by tests that run against a
+  generated dataset (default 200). Also read from DATASET_SIZE.
+"""
+import json
+import os
+import sys
+
+import pytest
+from moto import mock_dynamodb
+
+sys.path.append(os.path.abspath("."))
+sys.path.append(os.path.dirname(__file__))
+
+import fixtures  # noqa: E402
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark",
+        action="store_true",
+        default=bool(os.environ.get("BENCHMARK")),
+        help="Time every Lambda handler call and report the timings of each route.",
+    )
+    parser.addoption("--benchmark-json", default=None, help="Write the handler timings to a file.")
+    parser.addoption(
+        "--dataset-size",
+        type=int,
+        default=int(os.environ.get("DATASET_SIZE") or 200),
+        help="The number of items of generated datasets.",
+    )
+
+
+def pytest_configure(config):
+    config.handler_timings = fixtures.HandlerTimings() if config.getoption("benchmark") else None
+    fixtures.DATASET_SIZE = config.getoption("dataset_size")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def mocked_aws(request):
+    """Mock DynamoDB and create the tables once for the whole session."""
+    with mock_dynamodb():
+        fixtures.create_tables()
+        timings = request.config.handler_timings
+        if timings is None:
+            yield
+            return
+        patches = pytest.MonkeyPatch()
+        for name in fixtures.HANDLER_MODULES:
+            module = __import__(f"src.{name}", fromlist=["lambda_handler"])
+            patches.setattr(module, "lambda_handler", timings.wrap(name, module.lambda_handler))
+        yield
+        patches.undo()
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(mocked_aws):
+    """Start every test with empty tables and fresh containers."""
+    fixtures.clear_tables()
+    fixtures.reset_containers()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    timings = config.handler_timings
+    if not timings or not timings.samples:
+        return
+    terminalreporter.section("handler timings")
+    for line in timings.report():
+        terminalreporter.write_line(line)
+    path = config.getoption("benchmark_json")
+    if path:
+        with open(path, "w") as output:
+            json.dump(timings.to_json(), output, indent=2)
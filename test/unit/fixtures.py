@@ -0,0 +1,401 @@
+""" Unit Test Fixtures.
+
+This module contains the shared fixtures of the unit tests. The mocked tables
+are created once per test session by conftest.py and emptied before each test,
+so a test only pays for the items it seeds.
+
+Functions:
+- create_tables(regions: list): Create the mocked table in each region, and the idempotency table.
+- table(region: str): Get the mocked table of a region.
+- repository(region: str): Get a repository over the mocked table of a region.
+- clear_tables(): Delete every item from the mocked tables.
+- reset_containers(): Reset the per-container state of the imported handler modules.
+- seed(items: list, region: str): Write items to the mocked table of a region.
+- generate_items(count: int, clicks: int): Generate a dataset of slug items.
+- api_event(method: str, path: str, body, query: dict, referer: str, source_ip: str, headers: dict): Build an API Gateway event.
+- context(): Build a Lambda context.
+
+Classes:
+- HandlerTimings: Wall clock timings of handler calls, grouped by route.
+- PageServer: A local HTTP server standing in for the target sites of links.
+"""
+import json
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from unittest.mock import Mock
+
+import boto3
+from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
+
+from src.repository import OWNER_INDEX, TAG_INDEX, URL_HASH_INDEX, DynamoDBRepository
+from src.url_normalization import url_hash
+
+TABLE_NAME = "dev-url-shortner-table"
+IDEMPOTENCY_TABLE_NAME = "dev-url-shortner-idempotency-table"
+HOME_REGION = "us-east-1"
+REPLICA_REGION = "eu-west-1"
+REGIONS = (HOME_REGION, REPLICA_REGION)
+# The number of items of generated datasets, set from --dataset-size.
+DATASET_SIZE = 200
+
+SEED_ITEMS = [
+    {
+        "slug": "de305d54",
+        "targetUrl": "https://www.google.com",
+        "urlHash": url_hash("https://www.google.com"),
+        "requests": [],
+        "createdAt": "2021-01-01T00:00:00.000Z",
+    },
+    {
+        "slug": "75b4431b",
+        "targetUrl": "https://www.example.com",
+        "urlHash": url_hash("https://www.example.com"),
+        "requests": [],
+        "createdAt": "2022-03-08T00:00:00.000Z",
+    },
+]
+
+HANDLER_MODULES = ("get_function", "post_function", "put_function", "delete_function")
+
+_tables = {}
+
+
+def create_tables(regions: list[str] = REGIONS) -> None:
+    """Create the mocked table in each region, and the idempotency table in the home region.
+
+    Args:
+        regions (list[str]): The regions to create the table in.
+    """
+    for region in regions:
+        dynamodb = boto3.resource("dynamodb", region_name=region)
+        dynamodb.create_table(
+            TableName=TABLE_NAME,
+            KeySchema=[
+                {"AttributeName": "slug", "KeyType": "HASH"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "slug", "AttributeType": "S"},
+                {"AttributeName": "urlHash", "AttributeType": "S"},
+                {"AttributeName": "owner", "AttributeType": "S"},
+                {"AttributeName": "tag", "AttributeType": "S"},
+                {"AttributeName": "createdAt", "AttributeType": "S"},
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": URL_HASH_INDEX,
+                    "KeySchema": [{"AttributeName": "urlHash", "KeyType": "HASH"}],
+                    "Projection": {"ProjectionType": "KEYS_ONLY"},
+                    "ProvisionedThroughput": {"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
+                },
+                {
+                    "IndexName": OWNER_INDEX,
+                    "KeySchema": [
+                        {"AttributeName": "owner", "KeyType": "HASH"},
+                        {"AttributeName": "createdAt", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "KEYS_ONLY"},
+                    "ProvisionedThroughput": {"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
+                },
+                {
+                    "IndexName": TAG_INDEX,
+                    "KeySchema": [
+                        {"AttributeName": "tag", "KeyType": "HASH"},
+                        {"AttributeName": "createdAt", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": ["tagOf"]},
+                    "ProvisionedThroughput": {"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
+                },
+            ],
+            ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
+        )
+        _tables[region] = dynamodb.Table(TABLE_NAME)
+
+    dynamodb = boto3.resource("dynamodb", region_name=HOME_REGION)
+    dynamodb.create_table(
+        TableName=IDEMPOTENCY_TABLE_NAME,
+        KeySchema=[{"AttributeName": "slug", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "slug", "AttributeType": "S"}],
+        ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
+    )
+    _tables[IDEMPOTENCY_TABLE_NAME] = dynamodb.Table(IDEMPOTENCY_TABLE_NAME)
+
+
+def table(region: str = HOME_REGION):
+    """Get the mocked table of a region.
+
+    Args:
+        region (str): The region of the table, or IDEMPOTENCY_TABLE_NAME for the idempotency table.
+
+    Returns:
+        Table: The boto3 table.
+    """
+    return _tables[region]
+
+
+def repository(region: str = HOME_REGION) -> DynamoDBRepository:
+    """Get a repository over the mocked table of a region.
+
+    Args:
+        region (str): The region of the table.
+
+    Returns:
+        DynamoDBRepository: The repository.
+    """
+    return DynamoDBRepository(boto3.resource("dynamodb", region_name=region), TABLE_NAME)
+
+
+def clear_tables() -> None:
+    """Delete every item from the mocked tables."""
+    for mocked_table in _tables.values():
+        keys = [item["slug"] for item in mocked_table.scan(ProjectionExpression="slug")["Items"]]
+        if keys:
+            with mocked_table.batch_writer() as batch:
+                for slug in keys:
+                    batch.delete_item(Key={"slug": slug})
+
+
+def reset_containers() -> None:
+    """Reset the per-container state of the imported handler modules.
+
+    Rate limits, load shedding, hot key counts, top links, recent URLs, pending clicks, idempotency records and tenants of hosts would otherwise carry over
+    from one test to the next, since the modules are imported once.
+    """
+    for name in HANDLER_MODULES:
+        module = sys.modules.get(f"src.{name}")
+        if module is None:
+            continue
+        module.limiter.buckets.clear()
+        if hasattr(module, "shedder"):
+            module.shedder.until = 0.0
+        if hasattr(module, "hot_keys"):
+            module.hot_keys.counts.clear()
+        if hasattr(module, "heavy_hitters"):
+            module.heavy_hitters.clear()
+        if hasattr(module, "recent_urls"):
+            module.recent_urls.entries.clear()
+        if hasattr(module, "idempotency"):
+            module.idempotency.entries.clear()
+        if hasattr(module, "coalescer"):
+            module.coalescer.pending.clear()
+            module.coalescer.size = 0
+        if hasattr(module, "tenants"):
+            module.tenants.entries.clear()
+
+
+def seed(items: list[dict] = SEED_ITEMS, region: str = HOME_REGION):
+    """Write items to the mocked table of a region.
+
+    Args:
+        items (list[dict]): The items to write.
+        region (str): The region of the table.
+
+    Returns:
+        Table: The boto3 table.
+    """
+    mocked_table = _tables[region]
+    with mocked_table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+    return mocked_table
+
+
+def generate_items(count: int, clicks: int = 0) -> list[dict]:
+    """Generate a dataset of slug items.
+
+    Args:
+        count (int): The number of items.
+        clicks (int): The number of click records of each item.
+
+    Returns:
+        list[dict]: The items, with deterministic slugs.
+    """
+    return [
+        {
+            "slug": f"{index:08x}",
+            "targetUrl": f"https://www.example.com/{index}",
+            "urlHash": url_hash(f"https://www.example.com/{index}"),
+            "requests": [
+                {"ip": "0.0.0.0", "userAgent": "Mozilla/5.0", "referer": None}
+                for _ in range(clicks)
+            ],
+            "createdAt": "2021-01-01T00:00:00.000Z",
+        }
+        for index in range(count)
+    ]
+
+
+def api_event(
+    method: str,
+    path: str,
+    body: dict | None = None,
+    query: dict | None = None,
+    referer: str | None = None,
+    source_ip: str = "0.0.0.0",
+    headers: dict | None = None,
+) -> APIGatewayProxyEvent:
+    """Build an API Gateway event.
+
+    Args:
+        method (str): The HTTP method.
+        path (str): The request path.
+        body (dict | None): The JSON body.
+        query (dict | None): The query string parameters.
+        referer (str | None): The Referer header.
+        source_ip (str): The client IP address.
+        headers (dict | None): Additional headers.
+
+    Returns:
+        APIGatewayProxyEvent: The event.
+    """
+    return APIGatewayProxyEvent(
+        data={
+            "path": path,
+            "httpMethod": method,
+            "headers": {"Content-Type": "application/json", **(headers or {})},
+            "multiValueHeaders": {"Referer": [referer] if referer else None},
+            "queryStringParameters": query,
+            "body": json.dumps(body) if body is not None else None,
+            "requestContext": {
+                "identity": {"sourceIp": source_ip, "userAgent": "Mozilla/5.0"}
+            },
+        }
+    )
+
+
+def context() -> Mock:
+    """Build a Lambda context.
+
+    Returns:
+        Mock: The context.
+    """
+    return Mock()
+
+
+def _route(path: str) -> str:
+    # Group the calls of every slug under the same route.
+    segments = path.split("/")
+    if len(segments) > 1 and segments[1]:
+        segments[1] = "<slug>"
+    return "/".join(segments)
+
+
+class HandlerTimings:
+    """Wall clock timings of handler calls, grouped by route."""
+
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = defaultdict(list)
+
+    def wrap(self, name: str, handler: Callable) -> Callable:
+        """Time every call of a handler.
+
+        Args:
+            name (str): The name of the handler.
+            handler (Callable): The Lambda handler.
+
+        Returns:
+            Callable: The timed handler.
+        """
+
+        def timed(event, context):
+            started = time.perf_counter()
+            try:
+                return handler(event, context)
+            finally:
+                data = getattr(event, "raw_event", event)
+                self.samples[f"{name} {data.get('httpMethod')} {_route(data.get('path') or '/')}"].append(
+                    time.perf_counter() - started
+                )
+
+        return timed
+
+    def report(self) -> list[str]:
+        """Summarize the timings.
+
+        Returns:
+            list[str]: One line per route, slowest median first.
+        """
+        lines = []
+        for route, samples in sorted(
+            self.samples.items(), key=lambda entry: -statistics.median(entry[1])
+        ):
+            ordered = sorted(samples)
+            lines.append(
+                f"{route:<48} {len(samples):>5} calls "
+                f"median {statistics.median(ordered) * 1e3:8.2f} ms "
+                f"p95 {ordered[int(0.95 * (len(ordered) - 1))] * 1e3:8.2f} ms "
+                f"max {ordered[-1] * 1e3:8.2f} ms"
+            )
+        return lines
+
+    def to_json(self) -> dict:
+        """Get the timings as JSON.
+
+        Returns:
+            dict: The median and call count of each route, in milliseconds.
+        """
+        return {
+            route: {"calls": len(samples), "median_ms": statistics.median(samples) * 1e3}
+            for route, samples in self.samples.items()
+        }
+
+
+class PageServer:
+    """A local HTTP server standing in for the target sites of links.
+
+    Use as a context manager. Paths in `redirects` are answered with a 302 to
+    their URL, and paths missing from `pages` with a 404.
+    """
+
+    def __init__(self, pages: dict[str, tuple[str, bytes]], redirects: dict[str, str] | None = None) -> None:
+        self.pages = pages
+        self.redirects = redirects or {}
+        self.requests: list[str] = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                server.requests.append(self.path)
+                if self.path in server.redirects:
+                    self.send_response(302)
+                    self.send_header("Location", server.redirects[self.path])
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                page = server.pages.get(self.path)
+                if page is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", page[0])
+                self.send_header("Content-Length", str(len(page[1])))
+                self.end_headers()
+                self.wfile.write(page[1])
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+    def url(self, path: str = "/") -> str:
+        """Get the URL of a path on the server.
+
+        Args:
+            path (str): The path.
+
+        Returns:
+            str: The URL.
+        """
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{path}"
+
+    def __enter__(self) -> "PageServer":
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,102 @@
+""" Unit Tests for the coalescing module. """
+import os
+import signal
+import sys
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+
+
+class test_coalescing(TestCase):
+    """Test coalescing module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import coalescing
+
+        self.coalescing = coalescing
+        self.now = 0.0
+        self.coalescer = coalescing.ClickCoalescer(
+            fixtures.repository(), max_clicks=10, window_seconds=1, clock=lambda: self.now
+        )
+        self.table = fixtures.seed()
+
+    def test_threshold(self):
+        """Test pending clicks are written once the threshold is reached."""
+        for _ in range(9):
+            self.coalescer.add("de305d54", 1, {"ip": "1.1.1.1"})
+        self.coalescer.add("75b4431b", 1, {"ip": "1.1.1.1"})
+        self.assertEqual(self.coalescer.pending_clicks("de305d54"), 0)
+        self.assertEqual(self.coalescer.size, 0)
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertEqual(item["clicks"], 9)
+        self.assertEqual(len(item["requests"]), 9)
+        self.assertEqual(self.table.get_item(Key={"slug": "75b4431b"})["Item"]["clicks"], 1)
+
+    def test_window(self):
+        """Test pending clicks are written once the oldest has waited the window."""
+        self.coalescer.add("de305d54", 1, {"ip": "1.1.1.1"})
+        self.assertEqual(self.coalescer.pending_clicks("de305d54"), 1)
+        self.assertNotIn("clicks", self.table.get_item(Key={"slug": "de305d54"})["Item"])
+        self.now = 1.0
+        self.coalescer.add("de305d54", 8, {"ip": "1.1.1.1"})
+        self.assertEqual(self.coalescer.pending_clicks("de305d54"), 0)
+        shards = self.table.scan(
+            FilterExpression="shardOf = :slug", ExpressionAttributeValues={":slug": "de305d54"}
+        )["Items"]
+        self.assertEqual([int(shard["clicks"]) for shard in shards], [2])
+
+    def test_flush_error(self):
+        """Test a failed write drops the clicks of its slug only, and only fails the click of that slug."""
+        error = ClientError({"Error": {"Code": "500", "Message": "Error"}}, "UpdateItem")
+        repository = MagicMock()
+        repository.update.side_effect = [error, None]
+        coalescer = self.coalescing.ClickCoalescer(repository, max_clicks=10)
+        coalescer.add("de305d54", 1, {})
+        coalescer.add("75b4431b", 1, {})
+        self.assertEqual(coalescer.flush(), {"de305d54": error})
+        self.assertEqual((coalescer.size, coalescer.dropped), (0, 1))
+
+        coalescer.max_clicks = 2
+        repository.update.side_effect = [error, None]
+        coalescer.add("de305d54", 1, {})
+        coalescer.add("75b4431b", 1, {})
+        repository.update.side_effect = [None, error]
+        coalescer.add("de305d54", 1, {})
+        with self.assertRaises(ClientError):
+            coalescer.add("75b4431b", 1, {})
+        self.assertEqual((coalescer.size, coalescer.dropped), (0, 3))
+
+    def test_flush_on_shutdown(self):
+        """Test SIGTERM flushes the pending clicks before the previous handler runs."""
+        previous = MagicMock()
+        self.coalescer.add("de305d54", 1, {"ip": "1.1.1.1"})
+        with patch("signal.getsignal", return_value=previous), patch(
+            "signal.signal"
+        ) as mock_signal:
+            self.coalescing.flush_on_shutdown(self.coalescer)
+        shutdown = mock_signal.call_args.args[1]
+        shutdown(signal.SIGTERM, None)
+        previous.assert_called_once_with(signal.SIGTERM, None)
+        self.assertEqual(self.table.get_item(Key={"slug": "de305d54"})["Item"]["clicks"], 1)
+
+        for handler in (signal.SIG_DFL, signal.SIG_IGN):
+            with patch("signal.getsignal", return_value=handler), patch(
+                "signal.signal"
+            ) as mock_signal:
+                self.coalescing.flush_on_shutdown(self.coalescer)
+            shutdown = mock_signal.call_args.args[1]
+            if handler == signal.SIG_DFL:
+                with self.assertRaises(SystemExit):
+                    shutdown(signal.SIGTERM, None)
+            else:
+                shutdown(signal.SIGTERM, None)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
@@ -0,0 +1,169 @@
+""" Unit Tests for the compaction module. """
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_s3
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+
+NOW = datetime(2023, 3, 31, tzinfo=timezone.utc).timestamp()
+OLD = "2023-01-15T00:00:00Z"
+NEW = "2023-03-30T00:00:00Z"
+
+
+def clicks(*timestamps):
+    return [{"ip": "0.0.0.0", "userAgent": "Mozilla/5.0", "referer": None, "timestamp": timestamp} for timestamp in timestamps]
+
+
+class test_compaction(TestCase):
+    """Test compaction module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import compaction
+
+        self.compaction = compaction
+        self.repository = fixtures.repository()
+        self.directory = tempfile.TemporaryDirectory()
+        self.archives = os.path.join(self.directory.name, "archives")
+        self.store = compaction.ArchiveStore(self.archives)
+
+    def compactor(self, **kwargs):
+        kwargs.setdefault("segments", 1)
+        kwargs.setdefault("page_size", 2)
+        kwargs.setdefault("clock", lambda: NOW)
+        return self.compaction.Compactor(kwargs.pop("repository", self.repository), self.store, **kwargs)
+
+    def archived(self) -> list[dict]:
+        records = []
+        for path in self.paths():
+            with open(path, "rb") as archive:
+                records.extend(self.compaction.decode_archive(archive.read()))
+        return records
+
+    def paths(self) -> list[str]:
+        return [os.path.join(root, name) for root, _, names in os.walk(self.archives) for name in names]
+
+    def seed(self):
+        fixtures.seed(
+            [
+                {"slug": "de305d54", "targetUrl": "https://a", "requests": clicks(OLD, OLD, NEW), "clicks": 3},
+                {"slug": "75b4431b", "targetUrl": "https://b", "requests": clicks(None, None)},
+                {"slug": "2cd9cab6", "targetUrl": "https://c", "requests": clicks(NEW), "clicks": 1},
+                {"slug": "de305d54#0", "recordType": "clickShard", "shardOf": "de305d54", "requests": clicks(OLD), "clicks": 1},
+                {"slug": "#hotSlugs:0", "recordType": "hotSlugs", "reports": []},
+            ]
+        )
+
+    def test_archivable(self):
+        """Test only the old records at the front of the list are archivable."""
+        cutoff = "2023-03-01T00:00:00Z"
+        self.assertEqual(self.compaction.archivable(clicks(OLD, None, NEW, OLD), cutoff), 2)
+        self.assertEqual(self.compaction.archivable(clicks(NEW), cutoff), 0)
+        self.assertEqual(self.compaction.archivable([], cutoff), 0)
+
+    def test_archive_encoding(self):
+        """Test archives store one list per column and decode to the records."""
+        records = [{"slug": "de305d54", **click} for click in clicks(OLD, NEW)]
+        self.assertEqual(self.compaction.decode_archive(self.compaction.encode_archive(records)), records)
+
+    def test_run(self):
+        """Test old clicks move to archives while click totals stay the same."""
+        from src.sharding import read_clicks
+
+        self.seed()
+        totals = {slug: read_clicks(self.repository, self.repository.get({"slug": slug})) for slug in ("de305d54", "75b4431b")}
+        checkpoint = self.compaction.Checkpoint()
+        result = self.compactor(checkpoint=checkpoint).run()
+        self.assertEqual(result, {"items": 3, "clicks": 5, "archives": 2})
+        self.assertEqual(checkpoint.progress(0), (None, True))
+
+        item = self.repository.get({"slug": "de305d54"})
+        self.assertEqual([click["timestamp"] for click in item["requests"]], [NEW])
+        self.assertEqual((item["clicks"], item["archivedClicks"]), (Decimal(1), Decimal(2)))
+        self.assertEqual(self.repository.get({"slug": "75b4431b"})["requests"], [])
+        self.assertNotIn("archivedClicks", self.repository.get({"slug": "2cd9cab6"}))
+        for slug, total in totals.items():
+            self.assertEqual(read_clicks(self.repository, self.repository.get({"slug": slug})), total)
+
+        records = self.archived()
+        self.assertEqual(sorted(record["slug"] for record in records), ["75b4431b", "75b4431b", "de305d54", "de305d54", "de305d54#0"])
+        self.assertEqual(records[0]["userAgent"], "Mozilla/5.0")
+        self.assertTrue(all(os.path.dirname(path).endswith("2023-03-01") for path in self.paths()))
+
+        self.assertEqual(self.compactor().run(), {"items": 0, "clicks": 0, "archives": 0})
+
+    def test_resume(self):
+        """Test a rerun with the checkpoint continues after the last completed page."""
+        self.seed()
+        path = os.path.join(self.directory.name, "checkpoint.json")
+        write = self.store.write
+        self.store.write = MagicMock(side_effect=[None, OSError("disk full")])
+        with self.assertRaises(OSError):
+            self.compactor(checkpoint=self.compaction.Checkpoint(path), page_size=1).run()
+        self.assertEqual(self.store.write.call_count, 2)
+
+        self.store.write = write
+        result = self.compactor(checkpoint=self.compaction.Checkpoint(path), page_size=1).run()
+        # The page archived before the crash is not read again.
+        self.assertEqual(result["items"], 2)
+        self.assertEqual(self.compaction.Checkpoint(path).progress(0), (None, True))
+
+    def test_parallel_scan(self):
+        """Test every segment is compacted once by its own thread."""
+        from src.repository import SQLiteRepository
+
+        repository = SQLiteRepository(os.path.join(self.directory.name, "links.db"))
+        for index in range(20):
+            repository.put({"slug": f"link-{index}", "requests": clicks(OLD, NEW), "clicks": 2})
+        result = self.compactor(repository=repository, segments=4, page_size=3).run()
+        self.assertEqual(result["items"], 20)
+        self.assertEqual(sorted(record["slug"] for record in self.archived()), sorted(f"link-{index}" for index in range(20)))
+        self.assertEqual(repository.get({"slug": "link-7"})["requests"], clicks(NEW))
+
+    def test_trim_chunks(self):
+        """Test long runs of old clicks are trimmed in several rate limited updates."""
+        fixtures.seed([{"slug": "de305d54", "requests": clicks(*[OLD] * 5, NEW), "clicks": 6}])
+        now = [NOW]
+        sleep = MagicMock(side_effect=lambda seconds: now.__setitem__(0, now[0] + seconds))
+        with patch.object(self.compaction, "MAX_TRIM", 2):
+            compactor = self.compactor(rate=(1, 1), clock=lambda: now[0], sleep=sleep)
+            self.assertEqual(compactor.run()["clicks"], 5)
+        self.assertEqual(sleep.call_count, 2)
+        item = self.repository.get({"slug": "de305d54"})
+        self.assertEqual((len(item["requests"]), item["clicks"], item["archivedClicks"]), (1, Decimal(1), Decimal(5)))
+
+    def test_deleted_link(self):
+        """Test links deleted during the scan are skipped, and other errors raised."""
+        self.seed()
+        error = ClientError({"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}}, "UpdateItem")
+        with patch.object(self.repository, "update", side_effect=error):
+            self.assertEqual(self.compactor().run()["items"], 0)
+        error.response["Error"]["Code"] = "ValidationException"
+        with patch.object(self.repository, "update", side_effect=error), self.assertRaises(ClientError):
+            self.compactor().run()
+
+    @mock_s3
+    def test_s3_store(self):
+        """Test archives are written under the prefix of an S3 location."""
+        s3 = boto3.client("s3", region_name=fixtures.HOME_REGION)
+        s3.create_bucket(Bucket="archives")
+        store = self.compaction.ArchiveStore("s3://archives/clicks/", s3=s3)
+        self.assertEqual(store.write("2023-03-01/a.json.gz", b"data"), "s3://archives/clicks/2023-03-01/a.json.gz")
+        body = s3.get_object(Bucket="archives", Key="clicks/2023-03-01/a.json.gz")["Body"].read()
+        self.assertEqual(body, b"data")
+        self.assertEqual(self.compaction.ArchiveStore("s3://archives", s3=s3).write("a", b"").split("/")[-1], "a")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        return super().tearDown()
@@ -4,86 +4,94 @@ import os
 import sys
 from http import HTTPStatus
 from unittest import TestCase
-from unittest.mock import Mock, patch
+from unittest.mock import patch
 
-import boto3
-from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
-from aws_lambda_powertools.utilities.typing import LambdaContext
 from botocore.exceptions import ClientError
-from moto import mock_dynamodb
 
 sys.path.append(os.path.abspath("."))
 
+import fixtures  # noqa: E402
+from fixtures import api_event, context  # noqa: E402
+
 
-@mock_dynamodb
 class test_delete_function(TestCase):
     """Test DELETE Lambda."""
 
     def setUp(self):
         """Setup before each test."""
         super().setUp()
-        self.table_name = "dev-url-shortner-table"
-        self.dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        self.dynamodb.create_table(
-            TableName=self.table_name,
-            KeySchema=[
-                {"AttributeName": "slug", "KeyType": "HASH"},
-            ],
-            AttributeDefinitions=[
-                {"AttributeName": "slug", "AttributeType": "S"},
-            ],
-            ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
-        )
-        self.table = self.dynamodb.Table(self.table_name)
         from src.delete_function import delete_item_by_slug, lambda_handler
 
         self.lambda_handler = lambda_handler
         self.delete_item_by_slug = delete_item_by_slug
-        self.seed_data()
-
-    def seed_data(self):
-        table = self.table
-        table.put_item(
-            Item={
-                "slug": "de305d54",
-                "targetUrl": "https://www.google.com",
-                "createdAt": "2021-01-01T00:00:00.000Z",
-            }
-        )
-        table.put_item(
-            Item={
-                "slug": "75b4431b",
-                "targetUrl": "https://www.example.com",
-                "createdAt": "2022-03-08T00:00:00.000Z",
-            }
-        )
+        self.table = fixtures.seed()
 
     def test_delete_item_by_slug(self):
         """Test delete_item_by_slug function."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "DELETE",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"slug": "de305d54"}),
-            }
+        response = self.lambda_handler(
+            api_event("DELETE", "/", body={"slug": "de305d54"}), context()
+        )
+        self.assertEqual(response["statusCode"], HTTPStatus.NO_CONTENT.value)
+        self.assertNotIn("Item", self.table.get_item(Key={"slug": "de305d54"}))
+
+    def test_delete_item_by_slug_tenant(self):
+        """Test delete_item_by_slug function deletes the link of the tenant of the Host header."""
+        from src.tenancy import register_host
+
+        register_host(fixtures.repository(), "brand-a.link", "brand-a")
+        self.table.put_item(Item={"slug": "brand-a/de305d54", "targetUrl": "https://www.brand-a.com"})
+        event = api_event("DELETE", "/", body={"slug": "de305d54"}, headers={"Host": "brand-a.link"})
+        self.assertEqual(self.lambda_handler(event, context())["statusCode"], HTTPStatus.NO_CONTENT.value)
+        self.assertNotIn("Item", self.table.get_item(Key={"slug": "brand-a/de305d54"}))
+        self.assertIn("Item", self.table.get_item(Key={"slug": "de305d54"}))
+        self.assertEqual(self.lambda_handler(event, context())["statusCode"], HTTPStatus.NOT_FOUND.value)
+
+    def test_delete_item_by_slug_other_tenant(self):
+        """Test delete_item_by_slug function rejects slugs naming the links of another tenant."""
+        from src.tenancy import register_host
+
+        register_host(fixtures.repository(), "brand-a.link", "brand-a")
+        self.table.put_item(Item={"slug": "brand-a/de305d54", "targetUrl": "https://www.brand-a.com"})
+        for slug in ("brand-a/de305d54", "de305d54#0"):
+            response = self.lambda_handler(api_event("DELETE", "/", body={"slug": slug}), context())
+            self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+        self.assertIn("Item", self.table.get_item(Key={"slug": "brand-a/de305d54"}))
+
+    def test_delete_item_by_slug_sharded(self):
+        """Test delete_item_by_slug function also deletes click shards."""
+        self.table.update_item(
+            Key={"slug": "de305d54"},
+            UpdateExpression="SET shards = :shards",
+            ExpressionAttributeValues={":shards": 2},
+        )
+        for shard in range(2):
+            self.table.put_item(
+                Item={"slug": f"de305d54#{shard}", "recordType": "clickShard"}
+            )
+        response = self.lambda_handler(
+            api_event("DELETE", "/", body={"slug": "de305d54"}), context()
+        )
+        self.assertEqual(response["statusCode"], HTTPStatus.NO_CONTENT.value)
+        self.assertEqual(self.table.scan()["Count"], 1)
+
+    def test_delete_item_by_slug_tagged(self):
+        """Test delete_item_by_slug function also deletes tag items."""
+        self.table.update_item(
+            Key={"slug": "de305d54"},
+            UpdateExpression="SET tags = :tags",
+            ExpressionAttributeValues={":tags": {"a", "b"}},
+        )
+        for tag in ("a", "b"):
+            self.table.put_item(Item={"slug": f"de305d54#tag:{tag}", "recordType": "tag"})
+        response = self.lambda_handler(
+            api_event("DELETE", "/", body={"slug": "de305d54"}), context()
         )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
         self.assertEqual(response["statusCode"], HTTPStatus.NO_CONTENT.value)
+        self.assertEqual(self.table.scan()["Count"], 1)
 
     def test_delete_item_by_slug_not_found(self):
         """Test delete_item_by_slug function when the item is NOT FOUND."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "DELETE",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"slug": "123"}),
-            }
-        )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
+        response = self.lambda_handler(api_event("DELETE", "/", body={"slug": "123"}), context())
         self.assertEqual(response["statusCode"], HTTPStatus.NOT_FOUND.value)
         self.assertEqual(
             json.loads(response["body"])["message"], "Item with a slug of /123 not found."
@@ -91,32 +99,15 @@ class test_delete_function(TestCase):
 
     def test_delete_item_by_slug_bad_request(self):
         """Test delete_item_by_slug function when there is a BAD REQUEST."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "DELETE",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"slugs": ""}),
-            }
-        )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
+        response = self.lambda_handler(api_event("DELETE", "/", body={"slugs": ""}), context())
         self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
         self.assertEqual(json.loads(response["body"])["message"], "slug is required.")
 
     def test_delete_item_by_slug_error(self):
         """Test delete_item_by_slug function when there is an error."""
-        context: LambdaContext = Mock()
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "DELETE",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"slug": "de305d54"}),
-            }
-        )
+        event = api_event("DELETE", "/", body={"slug": "de305d54"})
         with patch(
-            "src.delete_function.table.delete_item",
+            "src.delete_function.home_repository.delete",
             side_effect=ClientError(
                 error_response={
                     "Error": {"Code": "500", "Message": "Internal Server Error"}
@@ -124,7 +115,7 @@ class test_delete_function(TestCase):
                 operation_name="delete_item",
             ),
         ):
-            response = self.lambda_handler(event, context)
+            response = self.lambda_handler(event, context())
             self.assertEqual(
                 response["statusCode"], HTTPStatus.INTERNAL_SERVER_ERROR.value
             )
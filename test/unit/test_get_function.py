@@ -2,65 +2,33 @@
 import json
 import os
 import sys
+import tempfile
+import time
 from http import HTTPStatus
 from unittest import TestCase
-from unittest.mock import Mock, patch
+from unittest.mock import patch
 
-import boto3
-from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
-from aws_lambda_powertools.utilities.typing import LambdaContext
 from botocore.exceptions import ClientError
-from moto import mock_dynamodb
 
 sys.path.append(os.path.abspath("."))
 
+import fixtures  # noqa: E402
+from fixtures import api_event, context  # noqa: E402
+
 
-@mock_dynamodb
 class test_get_function(TestCase):
     """Test GET Lambda."""
 
     def setUp(self):
         """Setup before each test."""
         super().setUp()
-        self.table_name = "dev-url-shortner-table"
-        self.dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        self.dynamodb.create_table(
-            TableName=self.table_name,
-            KeySchema=[
-                {"AttributeName": "slug", "KeyType": "HASH"},
-            ],
-            AttributeDefinitions=[
-                {"AttributeName": "slug", "AttributeType": "S"},
-            ],
-            ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
-        )
-        self.table = self.dynamodb.Table(self.table_name)
-        from src.get_function import (get_all_items, get_item_by_slug,
-                                      lambda_handler)
-
-        self.lambda_handler = lambda_handler
-        self.get_all_items = get_all_items
-        self.get_items_by_slug = get_item_by_slug
-        self.seed_data()
-
-    def seed_data(self):
-        table = self.table
-        table.put_item(
-            Item={
-                "slug": "de305d54",
-                "targetUrl": "https://www.google.com",
-                "requests": [],
-                "createdAt": "2021-01-01T00:00:00.000Z",
-            }
-        )
-        table.put_item(
-            Item={
-                "slug": "75b4431b",
-                "targetUrl": "https://www.example.com",
-                "requests": [],
-                "createdAt": "2022-03-08T00:00:00.000Z",
-            }
-        )
+        from src import get_function
+
+        self.lambda_handler = get_function.lambda_handler
+        self.get_all_items = get_function.get_all_items
+        self.get_items_by_slug = get_function.get_item_by_slug
+        self.coalescer = get_function.coalescer
+        self.table = fixtures.seed()
 
     def test_get_current_time(self):
         pass
@@ -70,106 +38,489 @@ class test_get_function(TestCase):
 
     def test_get_all_items(self):
         """Test get_all_items function."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "GET",
-                "headers": {"Content-Type": "application/json"},
-            }
-        )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
+        response = self.lambda_handler(api_event("GET", "/"), context())
         self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
-        self.assertEqual(json.loads(response["body"])["Count"], 2)
-        self.assertEqual(json.loads(response["body"])["Items"][0]["slug"], "de305d54")
+        body = json.loads(response["body"])
+        self.assertEqual(body["Count"], 2)
         self.assertEqual(
-            json.loads(response["body"])["Items"][0]["targetUrl"], "https://www.google.com"
+            {item["slug"]: item["targetUrl"] for item in body["Items"]},
+            {"de305d54": "https://www.google.com", "75b4431b": "https://www.example.com"},
         )
-        self.assertEqual(json.loads(response["body"])["Items"][1]["slug"], "75b4431b")
-        self.assertEqual(
-            json.loads(response["body"])["Items"][1]["targetUrl"], "https://www.example.com"
+
+    def test_get_all_items_paginated(self):
+        """Test get_all_items function with a page size and cursor."""
+        slugs = []
+        cursor = None
+        for _ in range(3):
+            query = {"limit": "1"}
+            if cursor:
+                query["cursor"] = cursor
+            response = self.lambda_handler(api_event("GET", "/", query=query), context())
+            self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+            body = json.loads(response["body"])
+            slugs.extend(item["slug"] for item in body["Items"])
+            cursor = body.get("Cursor")
+            if not cursor:
+                break
+        self.assertEqual(sorted(slugs), ["75b4431b", "de305d54"])
+
+    def test_get_all_items_dataset(self):
+        """Test get_all_items function pages through a generated dataset."""
+        fixtures.seed(fixtures.generate_items(fixtures.DATASET_SIZE, clicks=3))
+        slugs = []
+        cursor = None
+        while True:
+            query = {"limit": "50"}
+            if cursor:
+                query["cursor"] = cursor
+            response = self.lambda_handler(api_event("GET", "/", query=query), context())
+            self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+            body = json.loads(response["body"])
+            slugs.extend(item["slug"] for item in body["Items"])
+            cursor = body.get("Cursor")
+            if not cursor:
+                break
+        self.assertEqual(len(set(slugs)), fixtures.DATASET_SIZE + 2)
+
+    def test_get_all_items_by_owner_and_tag(self):
+        """Test get_all_items function lists the links of an owner or a tag from an index."""
+        for item in fixtures.SEED_ITEMS:
+            self.table.update_item(
+                Key={"slug": item["slug"]},
+                UpdateExpression="SET #owner = :owner",
+                ExpressionAttributeNames={"#owner": "owner"},
+                ExpressionAttributeValues={":owner": "team-x"},
+            )
+            self.table.put_item(
+                Item={
+                    "slug": f"{item['slug']}#tag:launch",
+                    "recordType": "tag",
+                    "tag": "launch",
+                    "tagOf": item["slug"],
+                    "createdAt": item["createdAt"],
+                }
+            )
+
+        def slugs(query: dict) -> tuple[list[str], str | None]:
+            response = self.lambda_handler(api_event("GET", "/", query=query), context())
+            self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+            body = json.loads(response["body"])
+            return [item["slug"] for item in body["Items"]], body.get("Cursor")
+
+        with patch("src.get_function.repository.scan") as mock_scan, patch(
+            "src.get_function.limiter.limit", return_value=None
+        ) as mock_limit:
+            self.assertEqual(slugs({"owner": "team-x"})[0], ["75b4431b", "de305d54"])
+            self.assertEqual(slugs({"owner": "team-x", "since": "2022-01-01"})[0], ["75b4431b"])
+            self.assertEqual(slugs({"owner": "team-y"})[0], [])
+            page, cursor = slugs({"tag": "launch", "limit": "1"})
+            self.assertEqual(page, ["75b4431b"])
+            self.assertEqual(slugs({"tag": "launch", "limit": "1", "cursor": cursor})[0], ["de305d54"])
+        mock_scan.assert_not_called()
+        self.assertEqual({call.kwargs["cost"] for call in mock_limit.call_args_list}, {1})
+
+        for query in ({"owner": "team-x", "tag": "launch"}, {"since": "2022-01-01"}):
+            response = self.lambda_handler(api_event("GET", "/", query=query), context())
+            self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+
+    def test_get_all_items_invalid_cursor(self):
+        """Test get_all_items function with an invalid cursor."""
+        response = self.lambda_handler(
+            api_event("GET", "/", query={"cursor": "not-a-cursor!"}), context()
         )
+        self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
 
     def test_get_item_by_slug_with_referer(self):
         """Test get_item_by_slug function."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/de305d54",
-                "httpMethod": "GET",
-                "headers": {"Content-Type": "application/json"},
-                "multiValueHeaders": {"Referer": ["https://www.facebook.com"]},
-                "requestContext": {
-                    "identity": {
-                        "sourceIp": "0.0.0.0",
-                        "userAgent": "Mozilla/5.0",
-                    }
-                }
-            }
+        response = self.lambda_handler(
+            api_event("GET", "/de305d54", referer="https://www.facebook.com"), context()
         )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
-        str_response = json.dumps(response["multiValueHeaders"]["Location"][0])
         self.assertEqual(response["statusCode"], HTTPStatus.FOUND.value)
-        self.assertEqual(json.loads(str_response), "https://www.google.com")
+        self.assertEqual(response["multiValueHeaders"]["Location"][0], "https://www.google.com")
+        self.coalescer.flush()
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertEqual(item["requests"][0]["referer"], "https://www.facebook.com")
 
     def test_get_item_by_slug_no_referer(self):
         """Test get_item_by_slug function."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/de305d54",
-                "httpMethod": "GET",
-                "headers": {"Content-Type": "application/json"},
-                "multiValueHeaders": {"Referer": None},
-                "requestContext": {
-                    "identity": {
-                        "sourceIp": "0.0.0.0",
-                        "userAgent": "Mozilla/5.0",
-                    }
-                }
-            }
-        )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
-        str_response = json.dumps(response["multiValueHeaders"]["Location"][0])
+        response = self.lambda_handler(api_event("GET", "/de305d54"), context())
         self.assertEqual(response["statusCode"], HTTPStatus.FOUND.value)
-        self.assertEqual(json.loads(str_response), "https://www.google.com")
+        self.assertEqual(response["multiValueHeaders"]["Location"][0], "https://www.google.com")
 
     def test_get_item_by_slug_not_found(self):
         """Test get_item_by_slug function."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/123",
-                "httpMethod": "GET",
-                "headers": {"Content-Type": "application/json"},
-                "multiValueHeaders": {"Referer": ["https://www.facebook.com"]},
-                "requestContext": {
-                    "identity": {
-                        "sourceIp": "0.0.0.0",
-                        "userAgent": "Mozilla/5.0",
-                    }
-                }
-            }
+        response = self.lambda_handler(
+            api_event("GET", "/123", referer="https://www.facebook.com"), context()
         )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
         self.assertEqual(response["statusCode"], HTTPStatus.NOT_FOUND.value)
         self.assertEqual(json.loads(response["body"])["message"], "Target URL not found")
 
+    def test_get_item_by_slug_tenant(self):
+        """Test slugs resolve independently on the domains of each tenant."""
+        from src.tenancy import register_host
+
+        register_host(fixtures.repository(), "brand-a.link", "brand-a")
+        self.table.put_item(Item={"slug": "brand-a/de305d54", "targetUrl": "https://www.brand-a.com", "requests": []})
+        headers = {"Host": "brand-a.link"}
+        response = self.lambda_handler(api_event("GET", "/de305d54", headers=headers), context())
+        self.assertEqual(response["multiValueHeaders"]["Location"][0], "https://www.brand-a.com")
+        response = self.lambda_handler(api_event("GET", "/75b4431b", headers=headers), context())
+        self.assertEqual(response["statusCode"], HTTPStatus.NOT_FOUND.value)
+        self.coalescer.flush()
+        self.assertEqual(len(self.table.get_item(Key={"slug": "brand-a/de305d54"})["Item"]["requests"]), 1)
+        self.assertEqual(self.table.get_item(Key={"slug": "de305d54"})["Item"]["requests"], [])
+
+        response = self.lambda_handler(api_event("GET", "/de305d54/stats", headers=headers), context())
+        self.assertEqual(json.loads(response["body"]), {"slug": "de305d54", "clicks": 1, "shards": 1})
+        response = self.lambda_handler(
+            api_event("GET", "/resolve", query={"slugs": "de305d54,75b4431b"}, headers=headers), context()
+        )
+        links = json.loads(response["body"])["links"]
+        self.assertEqual(links["de305d54"]["targetUrl"], "https://www.brand-a.com")
+        self.assertIsNone(links["75b4431b"])
+        response = self.lambda_handler(
+            api_event("GET", "/metadata", query={"slugs": "de305d54"}, headers=headers), context()
+        )
+        self.assertEqual(json.loads(response["body"])["metadata"], {"de305d54": None})
+
+    def test_get_item_by_slug_other_tenant(self):
+        """Test batch reads reject slugs naming the links of another tenant."""
+        from src.tenancy import register_host
+
+        register_host(fixtures.repository(), "brand-a.link", "brand-a")
+        self.table.put_item(Item={"slug": "brand-a/de305d54", "targetUrl": "https://www.brand-a.com"})
+        for path in ("/resolve", "/metadata"):
+            for headers in (None, {"Host": "brand-a.link"}):
+                response = self.lambda_handler(
+                    api_event("GET", path, query={"slugs": "75b4431b,brand-a/de305d54"}, headers=headers),
+                    context(),
+                )
+                self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+                self.assertNotIn("brand-a.com", response["body"])
+
+    def test_get_all_items_tenant(self):
+        """Test listings only hold the links of the tenant of the Host header."""
+        from src.heavy_hitters import hot_slugs_key
+        from src.tenancy import register_host
+
+        register_host(fixtures.repository(), "brand-a.link", "brand-a")
+        self.table.put_item(
+            Item={"slug": "brand-a/de305d54", "targetUrl": "https://a", "owner": "brand-a/team-x", "createdAt": "2023-01-01T00:00:00Z"}
+        )
+        self.table.update_item(
+            Key={"slug": "de305d54"},
+            UpdateExpression="SET #owner = :owner",
+            ExpressionAttributeNames={"#owner": "owner"},
+            ExpressionAttributeValues={":owner": "team-x"},
+        )
+        interval = int(time.time() // 60)
+        self.table.put_item(
+            Item={
+                "slug": hot_slugs_key(interval, 0),
+                "recordType": "hotSlugs",
+                "interval": interval,
+                "reports": [{"slug": "brand-a/de305d54", "clicks": 5}, {"slug": "de305d54", "clicks": 3}],
+            }
+        )
+
+        def slugs(path: str, query: dict | None, headers: dict | None) -> list[str]:
+            response = self.lambda_handler(api_event("GET", path, query=query, headers=headers), context())
+            body = json.loads(response["body"])
+            return sorted(item["slug"] for item in body.get("Items", body.get("links", [])))
+
+        brand_a = {"Host": "brand-a.link"}
+        self.assertEqual(slugs("/", None, None), ["75b4431b", "de305d54"])
+        self.assertEqual(slugs("/", None, brand_a), ["brand-a/de305d54"])
+        self.assertEqual(slugs("/", {"owner": "team-x"}, None), ["de305d54"])
+        self.assertEqual(slugs("/", {"owner": "team-x"}, brand_a), ["brand-a/de305d54"])
+        for query in (None, {"owner": "team-x"}):
+            response = self.lambda_handler(api_event("GET", "/", query=query, headers=brand_a), context())
+            self.assertEqual(json.loads(response["body"])["Items"][0]["owner"], "team-x")
+        with patch("src.get_function.heavy_hitters.publish"):
+            self.assertEqual(slugs("/hot", None, None), ["de305d54"])
+            self.assertEqual(slugs("/hot", None, brand_a), ["brand-a/de305d54"])
+
+    def test_get_item_by_slug_hot(self):
+        """Test get_item_by_slug function promotes a hot slug to click shards."""
+        with patch("src.get_function.hot_keys.threshold", 2):
+            for _ in range(5):
+                response = self.lambda_handler(api_event("GET", "/de305d54"), context())
+                self.assertEqual(response["statusCode"], HTTPStatus.FOUND.value)
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertGreater(item["shards"], 1)
+
+        response = self.lambda_handler(api_event("GET", "/de305d54/stats"), context())
+        self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+        self.assertEqual(json.loads(response["body"])["clicks"], 5)
+
+        response = self.lambda_handler(api_event("GET", "/"), context())
+        self.assertEqual(json.loads(response["body"])["Count"], 2)
+
+    def test_get_item_by_slug_coalesced(self):
+        """Test get_item_by_slug function writes a burst of clicks in one update."""
+        with patch("src.get_function.coalescer.max_clicks", 3), patch(
+            "src.get_function.repository.update", wraps=self.coalescer.repository.update
+        ) as mock_update_item:
+            for _ in range(2):
+                self.lambda_handler(api_event("GET", "/de305d54"), context())
+            mock_update_item.assert_not_called()
+
+            response = self.lambda_handler(api_event("GET", "/de305d54/stats"), context())
+            self.assertEqual(json.loads(response["body"])["clicks"], 2)
+
+            self.lambda_handler(api_event("GET", "/de305d54"), context())
+            mock_update_item.assert_called_once()
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertEqual(item["clicks"], 3)
+        self.assertEqual(len(item["requests"]), 3)
+
+    def test_get_item_by_slug_spooled(self):
+        """Test get_item_by_slug function spools clicks, so a failing table does not fail redirects."""
+        from src.spool import ClickSpool
+
+        with tempfile.TemporaryDirectory() as directory:
+            spool = ClickSpool(os.path.join(directory, "clicks.spool"), self.coalescer.repository, background=False)
+            error = ClientError({"Error": {"Code": "InternalServerError", "Message": ""}}, "UpdateItem")
+            with patch("src.get_function.spool", spool), patch("src.get_function.repository.update", side_effect=error):
+                response = self.lambda_handler(api_event("GET", "/de305d54"), context())
+                self.assertEqual(response["statusCode"], HTTPStatus.FOUND.value)
+                response = self.lambda_handler(api_event("GET", "/de305d54/stats"), context())
+                self.assertEqual(json.loads(response["body"])["clicks"], 1)
+            self.assertEqual(self.coalescer.size, 0)
+
+            self.assertEqual(spool.drain(), 1)
+            spool.close()
+        self.assertEqual(self.table.get_item(Key={"slug": "de305d54"})["Item"]["clicks"], 1)
+
+    def test_get_item_by_slug_spooled_hot(self):
+        """Test get_item_by_slug function leaves promotion to the spool worker, and never sheds spooled clicks."""
+        from src.spool import ClickSpool
+
+        with tempfile.TemporaryDirectory() as directory:
+            spool = ClickSpool(os.path.join(directory, "clicks.spool"), self.coalescer.repository, background=False)
+            with patch("src.get_function.spool", spool), patch("src.get_function.hot_keys.threshold", 2), patch(
+                "src.get_function.shedder.until", float("inf")
+            ), patch("src.get_function.home_repository.update") as mock_update:
+                for _ in range(3):
+                    response = self.lambda_handler(api_event("GET", "/de305d54"), context())
+                    self.assertEqual(response["statusCode"], HTTPStatus.FOUND.value)
+                mock_update.assert_not_called()
+            self.assertEqual(spool.pending_clicks("de305d54"), 3)
+            self.assertEqual(spool.drain(), 3)
+            spool.close()
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertGreater(item["shards"], 1)
+
+    def test_get_metadata(self):
+        """Test get_metadata function returns fresh metadata and refreshes stale entries."""
+        self.table.update_item(
+            Key={"slug": "de305d54"},
+            UpdateExpression="SET metadata = :metadata",
+            ExpressionAttributeValues={
+                ":metadata": {
+                    "url": "https://www.google.com",
+                    "title": "Google",
+                    "refreshAt": 2**40,
+                }
+            },
+        )
+        with patch("src.get_function.enqueue", return_value=True) as mock_enqueue, patch(
+            "src.get_function.repository.batch_get", wraps=self.coalescer.repository.batch_get
+        ) as mock_batch_get:
+            response = self.lambda_handler(
+                api_event("GET", "/metadata", query={"slugs": "de305d54,75b4431b,123"}),
+                context(),
+            )
+        self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+        metadata = json.loads(response["body"])["metadata"]
+        self.assertEqual(metadata["de305d54"]["title"], "Google")
+        self.assertIsNone(metadata["75b4431b"])
+        self.assertEqual(len(metadata), 2)
+        mock_batch_get.assert_called_once()
+        mock_enqueue.assert_called_once_with("75b4431b", "https://www.example.com")
+
+    def test_get_metadata_bad_request(self):
+        """Test get_metadata function requires between 1 and 100 valid slugs."""
+        for slugs in ("", ",".join(str(slug) for slug in range(101)), "de305d54,de305d54#0"):
+            response = self.lambda_handler(
+                api_event("GET", "/metadata", query={"slugs": slugs}), context()
+            )
+            self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+
+    def test_get_metadata_error(self):
+        """Test get_metadata function when there is an error."""
+        with patch(
+            "src.get_function.repository.batch_get",
+            side_effect=ClientError({"Error": {"Code": "500", "Message": "Error"}}, "BatchGetItem"),
+        ):
+            response = self.lambda_handler(
+                api_event("GET", "/metadata", query={"slugs": "de305d54"}), context()
+            )
+            self.assertEqual(response["statusCode"], HTTPStatus.INTERNAL_SERVER_ERROR.value)
+
+    def test_resolve_slugs(self):
+        """Test resolve_slugs function batch reads links without recording clicks."""
+        fixtures.seed(fixtures.generate_items(250))
+        slugs = [f"{index:08x}" for index in range(250)] + ["de305d54", "123"]
+        with patch(
+            "src.get_function.repository.dynamodb.batch_get_item",
+            wraps=self.coalescer.repository.dynamodb.batch_get_item,
+        ) as mock_batch_get_item, patch("src.get_function.repository.update") as mock_update:
+            response = self.lambda_handler(
+                api_event("GET", "/resolve", query={"slugs": ",".join(slugs)}), context()
+            )
+        self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+        links = json.loads(response["body"])["links"]
+        self.assertEqual(list(links), slugs)
+        self.assertEqual(links["00000001"]["targetUrl"], "https://www.example.com/1")
+        self.assertEqual(links["de305d54"], {"targetUrl": "https://www.google.com", "metadata": None})
+        self.assertIsNone(links["123"])
+        self.assertEqual(mock_batch_get_item.call_count, 3)
+        mock_update.assert_not_called()
+        self.assertEqual(self.coalescer.size, 0)
+
+        for slugs in (",".join(map(str, range(501))), "de305d54,de305d54#0", "hot"):
+            response = self.lambda_handler(api_event("GET", "/resolve", query={"slugs": slugs}), context())
+            self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+
+    def test_resolve_slugs_error(self):
+        """Test resolve_slugs function when there is an error."""
+        with patch(
+            "src.get_function.repository.batch_get",
+            side_effect=ClientError({"Error": {"Code": "500", "Message": "Error"}}, "BatchGetItem"),
+        ):
+            response = self.lambda_handler(
+                api_event("GET", "/resolve", query={"slugs": "de305d54"}), context()
+            )
+            self.assertEqual(response["statusCode"], HTTPStatus.INTERNAL_SERVER_ERROR.value)
+
+    def test_get_hot_slugs(self):
+        """Test clicks are counted in the container's top links, which GET /hot lists once published."""
+        from src.get_function import heavy_hitters
+
+        # Crossing a publication interval mid-test would publish the same clicks twice.
+        now = heavy_hitters.bucket_start
+        heavy_hitters.published = int(now // heavy_hitters.publish_seconds)
+        clock = patch.object(heavy_hitters, "clock", lambda: now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        for _ in range(5):
+            self.lambda_handler(api_event("GET", "/de305d54"), context())
+        self.lambda_handler(api_event("GET", "/75b4431b"), context())
+        self.assertEqual(heavy_hitters.top(), [("de305d54", 5), ("75b4431b", 1)])
+
+        heavy_hitters.published -= 1
+        update = self.coalescer.repository.update
+
+        def heavy_hitters_update(key: dict, **kwargs):
+            if key["slug"].startswith("#hotSlugs"):
+                raise ClientError({"Error": {"Code": "500", "Message": "Error"}}, "UpdateItem")
+            return update(key, **kwargs)
+
+        with patch("src.get_function.home_repository.update", side_effect=heavy_hitters_update):
+            response = self.lambda_handler(api_event("GET", "/75b4431b"), context())
+        self.assertEqual(response["statusCode"], HTTPStatus.FOUND.value)
+        heavy_hitters.published -= 1
+        self.lambda_handler(api_event("GET", "/75b4431b"), context())
+
+        response = self.lambda_handler(api_event("GET", "/hot", query={"limit": "1"}), context())
+        self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+        self.assertEqual(json.loads(response["body"])["links"], [{"slug": "de305d54", "clicks": 5}])
+
+        response = self.lambda_handler(api_event("GET", "/hot", query={"limit": "x"}), context())
+        self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+        with patch(
+            "src.get_function.home_repository.batch_get",
+            side_effect=ClientError({"Error": {"Code": "500", "Message": "Error"}}, "BatchGetItem"),
+        ):
+            response = self.lambda_handler(api_event("GET", "/hot"), context())
+        self.assertEqual(response["statusCode"], HTTPStatus.INTERNAL_SERVER_ERROR.value)
+
+    def test_get_item_by_slug_auxiliary(self):
+        """Test get_item_by_slug function does not serve auxiliary items."""
+        self.table.put_item(Item={"slug": "de305d54#0", "recordType": "clickShard"})
+        for path in ("/de305d54%230", "/de305d54%230/stats"):
+            response = self.lambda_handler(api_event("GET", path), context())
+            self.assertEqual(response["statusCode"], HTTPStatus.NOT_FOUND.value)
+
+    def test_get_item_stats_error(self):
+        """Test get_item_stats function when there is an error."""
+        with patch("src.get_function.repository.get") as mock_get_item:
+            mock_get_item.side_effect = ClientError(
+                {"Error": {"Code": "500", "Message": "Internal Server Error"}},
+                "get_item",
+            )
+            response = self.lambda_handler(api_event("GET", "/de305d54/stats"), context())
+            self.assertEqual(
+                response["statusCode"], HTTPStatus.INTERNAL_SERVER_ERROR.value
+            )
+
+    def test_get_item_by_slug_rate_limited(self):
+        """Test get_item_by_slug function when the client is rate limited."""
+        event = api_event("GET", "/de305d54", source_ip="10.0.0.1")
+        with patch.dict("src.get_function.limiter.limits", {"sourceIp": (1, 1)}):
+            response = self.lambda_handler(event, context())
+            self.assertEqual(response["statusCode"], HTTPStatus.FOUND.value)
+            response = self.lambda_handler(event, context())
+            self.assertEqual(
+                response["statusCode"], HTTPStatus.TOO_MANY_REQUESTS.value
+            )
+            self.assertIn("Retry-After", response["multiValueHeaders"])
+
+    def test_get_item_by_slug_throttled(self):
+        """Test get_item_by_slug function sheds click writes while throttled."""
+        with patch(
+            "src.get_function.repository.update",
+            side_effect=ClientError(
+                {"Error": {"Code": "ProvisionedThroughputExceededException", "Message": ""}},
+                "update_item",
+            ),
+        ) as mock_update_item, patch("src.get_function.shedder.until", 0.0), patch(
+            "src.get_function.coalescer.max_clicks", 1
+        ):
+            for _ in range(2):
+                response = self.lambda_handler(api_event("GET", "/de305d54"), context())
+                self.assertEqual(response["statusCode"], HTTPStatus.FOUND.value)
+            # The click write and the promotion of the slug, then clicks are shed.
+            self.assertEqual(mock_update_item.call_count, 2)
+
+    def test_get_item_by_slug_throttled_promoted(self):
+        """Test get_item_by_slug function promotes a slug whose click write was throttled."""
+        update = self.coalescer.repository.update
+
+        def throttled_update(key: dict, **kwargs):
+            if "shards" not in (kwargs.get("assign") or {}):
+                raise ClientError({"Error": {"Code": "ThrottlingException", "Message": ""}}, "UpdateItem")
+            return update(key, **kwargs)
+
+        with patch("src.get_function.repository.update", side_effect=throttled_update), patch(
+            "src.get_function.home_repository.update", side_effect=throttled_update
+        ), patch("src.get_function.shedder.until", 0.0):
+            response = self.lambda_handler(api_event("GET", "/de305d54"), context())
+            self.assertEqual(response["statusCode"], HTTPStatus.FOUND.value)
+        self.assertGreater(self.table.get_item(Key={"slug": "de305d54"})["Item"]["shards"], 1)
+
+    def test_get_item_by_slug_click_error(self):
+        """Test get_item_by_slug function when the click write fails."""
+        with patch(
+            "src.get_function.repository.update",
+            side_effect=ClientError(
+                {"Error": {"Code": "500", "Message": "Internal Server Error"}},
+                "update_item",
+            ),
+        ), patch("src.get_function.coalescer.max_clicks", 1):
+            response = self.lambda_handler(api_event("GET", "/de305d54"), context())
+            self.assertEqual(
+                response["statusCode"], HTTPStatus.INTERNAL_SERVER_ERROR.value
+            )
+
     def test_get_all_items_error(self):
         """Test get_all_items function when there is an error."""
-        with patch("src.get_function.table.scan") as mock_scan:
+        with patch("src.get_function.repository.scan") as mock_scan:
             mock_scan.side_effect = ClientError(
                 {"Error": {"Code": "500", "Message": "Internal Server Error"}}, "scan"
             )
-            event = APIGatewayProxyEvent(
-                data={
-                    "path": "/",
-                    "httpMethod": "GET",
-                    "headers": {"Content-Type": "application/json"},
-                }
-            )
-            context: LambdaContext = Mock()
-            response = self.lambda_handler(event, context)
+            response = self.lambda_handler(api_event("GET", "/"), context())
             self.assertEqual(
                 response["statusCode"], HTTPStatus.INTERNAL_SERVER_ERROR.value
             )
@@ -179,20 +530,12 @@ class test_get_function(TestCase):
 
     def test_get_item_by_slug_error(self):
         """Test get_item_by_slug function when there is an error."""
-        with patch("src.get_function.table.get_item") as mock_get_item:
+        with patch("src.get_function.repository.get") as mock_get_item:
             mock_get_item.side_effect = ClientError(
                 {"Error": {"Code": "500", "Message": "Internal Server Error"}},
                 "get_item",
             )
-            event = APIGatewayProxyEvent(
-                data={
-                    "path": "/de305d54",
-                    "httpMethod": "GET",
-                    "headers": {"Content-Type": "application/json"},
-                }
-            )
-            context: LambdaContext = Mock()
-            response = self.lambda_handler(event, context)
+            response = self.lambda_handler(api_event("GET", "/de305d54"), context())
             self.assertEqual(
                 response["statusCode"], HTTPStatus.INTERNAL_SERVER_ERROR.value
             )
@@ -0,0 +1,143 @@
+""" Unit Tests for the heavy_hitters module. """
+import os
+import random
+import sys
+from collections import Counter
+from unittest import TestCase
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+
+
+class test_heavy_hitters(TestCase):
+    """Test heavy_hitters module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import heavy_hitters
+
+        self.heavy_hitters = heavy_hitters
+        self.repository = fixtures.repository()
+        # Ten seconds before a publication interval starts.
+        self.now = 5990.0
+
+    def detector(self, **kwargs):
+        kwargs.setdefault("clock", lambda: self.now)
+        return self.heavy_hitters.HeavyHitters(**kwargs)
+
+    def test_count_min_sketch(self):
+        """Test estimates never undercount and expired counts can be subtracted."""
+        sketch = self.heavy_hitters.CountMinSketch(width=64, depth=4)
+        other = self.heavy_hitters.CountMinSketch(width=64, depth=4)
+        counts = Counter(f"slug-{random.randrange(200)}" for _ in range(2000))
+        for slug, count in counts.items():
+            sketch.add(sketch.indexes(slug), count)
+            other.add(other.indexes(slug), count)
+        for slug, count in counts.items():
+            self.assertGreaterEqual(sketch.estimate(sketch.indexes(slug)), count)
+        sketch.subtract(other)
+        self.assertEqual(sketch.estimate(sketch.indexes("slug-0")), 0)
+        with self.assertRaises(ValueError):
+            self.heavy_hitters.CountMinSketch(depth=17)
+
+    def test_top(self):
+        """Test the most clicked slugs are found in a skewed stream."""
+        detector = self.detector(k=5)
+        stream = [f"hot-{rank}" for rank in range(3) for _ in range(100 * (3 - rank))]
+        stream += [f"cold-{index}" for index in range(500)]
+        random.shuffle(stream)
+        for slug in stream:
+            detector.record(slug)
+        top = detector.top(3)
+        self.assertEqual([slug for slug, _ in top], ["hot-0", "hot-1", "hot-2"])
+        self.assertGreaterEqual(top[0][1], 300)
+        self.assertEqual(len(detector.top()), 5)
+
+    def test_sliding_window(self):
+        """Test clicks older than the window are forgotten bucket by bucket."""
+        detector = self.detector(window_seconds=60, buckets=6)
+        for _ in range(10):
+            detector.record("old")
+        self.now += 30
+        self.assertEqual(detector.record("new"), 1)
+        self.assertEqual(detector.record("old"), 11)
+        self.now += 30
+        self.assertEqual(detector.record("old"), 2)
+        self.assertEqual(dict(detector.top())["new"], 1)
+        self.now += 60
+        self.assertEqual(detector.record("new"), 1)
+        self.assertEqual(detector.top(), [("new", 1)])
+
+    def test_publish(self):
+        """Test containers publish once per interval, and their top links are merged."""
+        first, second = self.detector(), self.detector()
+        first.shard = second.shard = 3
+        for _ in range(3):
+            first.record("de305d54")
+            second.record("de305d54")
+        second.record("75b4431b")
+        self.assertIsNone(first.publish(self.repository))
+
+        self.now += 10
+        self.assertEqual(first.publish(self.repository), [("de305d54", 3)])
+        self.assertIsNone(first.publish(self.repository))
+        self.assertEqual(len(second.publish(self.repository)), 2)
+        item = self.repository.get({"slug": "#hotSlugs:0:3"})
+        self.assertEqual(item["recordType"], "hotSlugs")
+        self.assertEqual(len(item["reports"]), 3)
+        self.assertEqual(
+            self.heavy_hitters.read_hot_slugs(self.repository, now=self.now),
+            [{"slug": "de305d54", "clicks": 6}, {"slug": "75b4431b", "clicks": 1}],
+        )
+
+        self.now += 120
+        first.record("75b4431b")
+        first.publish(self.repository)
+        self.assertEqual(len(self.repository.get({"slug": "#hotSlugs:0:3"})["reports"]), 1)
+        self.assertEqual(
+            self.heavy_hitters.read_hot_slugs(self.repository, limit=1, now=self.now),
+            [{"slug": "75b4431b", "clicks": 1}],
+        )
+        self.now += 180
+        self.assertEqual(first.publish(self.repository), [])
+        self.assertEqual(self.heavy_hitters.read_hot_slugs(self.repository, now=self.now), [])
+
+    def test_publish_full(self):
+        """Test containers stop appending to a full item, and other items still publish."""
+        detectors = [self.detector(max_reports=2) for _ in range(3)]
+        for index, detector in enumerate(detectors):
+            detector.shard = 0 if index < 2 else 1
+            detector.record(f"slug-{index}")
+        self.now += 10
+        detectors[0].publish(self.repository)
+        detectors[1].publish(self.repository)
+        detectors[0].published -= 1
+        with self.assertRaises(ClientError) as raised:
+            detectors[0].publish(self.repository)
+        self.assertEqual(raised.exception.response["Error"]["Code"], "ConditionalCheckFailedException")
+        detectors[2].publish(self.repository)
+        self.assertEqual(len(self.repository.get({"slug": "#hotSlugs:0:0"})["reports"]), 2)
+        self.assertEqual(
+            sorted(link["slug"] for link in self.heavy_hitters.read_hot_slugs(self.repository, now=self.now)),
+            ["slug-0", "slug-1", "slug-2"],
+        )
+
+    def test_publish_error(self):
+        """Test errors other than losing the reset to another container are raised."""
+        detector = self.detector()
+        detector.record("de305d54")
+        self.now += 10
+        with patch.object(
+            self.repository,
+            "update",
+            side_effect=ClientError({"Error": {"Code": "ValidationException", "Message": ""}}, "UpdateItem"),
+        ), self.assertRaises(ClientError):
+            detector.publish(self.repository)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
@@ -0,0 +1,193 @@
+""" Unit Tests for the idempotency module. """
+import json
+import os
+import sys
+from http import HTTPStatus
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import boto3
+from aws_lambda_powertools.event_handler import Response
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+from fixtures import api_event  # noqa: E402
+
+
+class test_idempotency(TestCase):
+    """Test idempotency module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import idempotency
+        from src.repository import DynamoDBRepository
+
+        self.idempotency = idempotency
+        self.now = 1000.0
+        self.repository = DynamoDBRepository(
+            boto3.resource("dynamodb", region_name=fixtures.HOME_REGION), fixtures.IDEMPOTENCY_TABLE_NAME
+        )
+        self.store = idempotency.IdempotencyStore(self.repository, clock=lambda: self.now)
+        self.table = fixtures.table(fixtures.IDEMPOTENCY_TABLE_NAME)
+        self.route = MagicMock(
+            side_effect=lambda: Response(
+                status_code=HTTPStatus.CREATED.value,
+                content_type="application/json",
+                body=json.dumps({"message": "created"}),
+                headers={"Access-Control-Allow-Origin": "*"},
+            )
+        )
+
+    def event(self, key: str | None = "key-1", body: dict | None = None):
+        headers = {"idempotency-key": key} if key is not None else {}
+        return api_event("POST", "/", body=body or {"targetUrl": "https://a"}, headers=headers)
+
+    def test_handle_without_key(self):
+        """Test requests without a key run every time and store nothing."""
+        for _ in range(2):
+            self.assertEqual(self.store.handle("POST", self.event(None), self.route).status_code, 201)
+        self.assertEqual(self.route.call_count, 2)
+        self.assertEqual(self.table.scan()["Count"], 0)
+
+    def test_handle_replay(self):
+        """Test retries replay the stored response, from memory or with one read."""
+        first = self.store.handle("POST", self.event(), self.route)
+        record = self.table.scan()["Items"][0]
+        self.assertEqual(record["status"], "COMPLETED")
+        self.assertEqual(record["recordType"], "idempotency")
+        self.assertEqual(record["expiresAt"], 1000 + self.idempotency.IDEMPOTENCY_TTL_SECONDS)
+
+        with patch.object(self.repository, "get", wraps=self.repository.get) as mock_get:
+            replayed = self.store.handle("POST", self.event(), self.route)
+            mock_get.assert_not_called()
+            self.store.entries.clear()
+            with patch.object(self.repository, "update") as mock_update:
+                replayed = self.store.handle("POST", self.event(), self.route)
+            mock_get.assert_called_once()
+            mock_update.assert_not_called()
+        self.route.assert_called_once()
+        self.assertEqual(replayed.status_code, first.status_code)
+        self.assertEqual(replayed.body, first.body)
+        self.assertEqual(replayed.headers["Content-Type"], "application/json")
+        self.assertEqual(replayed.headers["Access-Control-Allow-Origin"], "*")
+        self.assertEqual(replayed.headers["Idempotent-Replayed"], "true")
+
+        self.assertEqual(self.store.handle("PUT", self.event(), self.route).status_code, 201)
+        self.assertEqual(self.route.call_count, 2)
+
+    def test_handle_callers(self):
+        """Test the same key sent by another caller or for another tenant runs again."""
+        other_key = self.event()
+        other_key["requestContext"]["identity"]["apiKey"] = "api-key-2"
+        other_principal = self.event()
+        other_principal["requestContext"]["authorizer"] = {"principalId": "user-2"}
+        self.store.handle("POST", self.event(), self.route)
+        self.store.handle("POST", other_key, self.route)
+        self.store.handle("POST", other_principal, self.route)
+        self.store.handle("POST", self.event(), self.route, lambda event: "tenant-2")
+        self.assertEqual(self.route.call_count, 4)
+        self.assertEqual(self.table.scan()["Count"], 4)
+
+        replayed = self.store.handle("POST", self.event(), self.route, lambda event: "tenant-2")
+        self.assertEqual(replayed.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(self.route.call_count, 4)
+
+    def test_handle_tenant_unavailable(self):
+        """Test requests still run when their tenant cannot be resolved."""
+        error = ClientError({"Error": {"Code": "ProvisionedThroughputExceededException", "Message": ""}}, "GetItem")
+        resolve_tenant = MagicMock(side_effect=error)
+        self.assertEqual(self.store.handle("POST", self.event(), self.route, resolve_tenant).status_code, 201)
+        self.route.assert_called_once()
+        self.assertEqual(self.table.scan()["Count"], 0)
+
+    def test_handle_expired(self):
+        """Test a key is reusable once its record expired."""
+        self.store.handle("POST", self.event(), self.route)
+        self.now += self.idempotency.IDEMPOTENCY_TTL_SECONDS
+        self.store.handle("POST", self.event(), self.route)
+        self.assertEqual(self.route.call_count, 2)
+
+    def test_handle_different_request(self):
+        """Test a key reused with a different body is rejected."""
+        self.store.handle("POST", self.event(), self.route)
+        response = self.store.handle("POST", self.event(body={"targetUrl": "https://b"}), self.route)
+        self.assertEqual(response.status_code, HTTPStatus.UNPROCESSABLE_ENTITY.value)
+        self.route.assert_called_once()
+
+    def test_handle_in_progress(self):
+        """Test a retry during the first request is rejected, until the claim expires."""
+        record_key = self.store.record_key("POST", "key-1")
+        self.assertIsNone(self.store.begin(record_key, "hash"))
+        self.assertEqual(self.store.begin(record_key, "hash").status_code, HTTPStatus.CONFLICT.value)
+        self.now += self.idempotency.IDEMPOTENCY_IN_PROGRESS_SECONDS
+        self.assertIsNone(self.store.begin(record_key, "hash"))
+
+    def test_begin_race(self):
+        """Test losing the claim to a concurrent request replays its outcome."""
+        record_key = self.store.record_key("POST", "key-1")
+        claimed = {"slug": record_key, "status": "IN_PROGRESS", "requestHash": "hash", "expiresAt": 2000}
+        self.table.put_item(Item=claimed)
+        with patch.object(self.repository, "get", side_effect=[None, None]):
+            response = self.store.begin(record_key, "hash")
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT.value)
+
+        self.table.put_item(Item={**claimed, "status": "COMPLETED", "response": {"statusCode": 201}})
+        with patch.object(self.repository, "get", side_effect=[None, self.repository.get({"slug": record_key})]):
+            response = self.store.begin(record_key, "hash")
+        self.assertEqual(response.status_code, HTTPStatus.CREATED.value)
+        self.assertIn(record_key, self.store.entries)
+
+    def test_handle_not_stored(self):
+        """Test failed and rate limited requests release the key for a retry."""
+        self.route.side_effect = [
+            Response(status_code=HTTPStatus.INTERNAL_SERVER_ERROR.value),
+            Response(status_code=HTTPStatus.TOO_MANY_REQUESTS.value),
+            RuntimeError("boom"),
+            Response(status_code=HTTPStatus.CREATED.value),
+        ]
+        self.assertEqual(self.store.handle("POST", self.event(), self.route).status_code, 500)
+        self.assertEqual(self.store.handle("POST", self.event(), self.route).status_code, 429)
+        with self.assertRaises(RuntimeError):
+            self.store.handle("POST", self.event(), self.route)
+        self.assertEqual(self.table.scan()["Count"], 0)
+        self.assertEqual(self.store.handle("POST", self.event(), self.route).status_code, 201)
+        self.assertEqual(self.route.call_count, 4)
+
+    def test_handle_store_unavailable(self):
+        """Test requests still run when the idempotency table fails."""
+        error = ClientError({"Error": {"Code": "ResourceNotFoundException", "Message": ""}}, "GetItem")
+        with patch.object(self.repository, "get", side_effect=error):
+            self.assertEqual(self.store.handle("POST", self.event(), self.route).status_code, 201)
+        with patch.object(self.repository, "put", side_effect=error), patch.object(
+            self.repository, "delete", side_effect=error
+        ):
+            self.assertEqual(self.store.handle("POST", self.event("key-2"), self.route).status_code, 201)
+            self.route.side_effect = RuntimeError("boom")
+            with self.assertRaises(RuntimeError):
+                self.store.handle("POST", self.event("key-3"), self.route)
+        with patch.object(self.repository, "update", side_effect=error):
+            self.route.side_effect = None
+            self.route.return_value = Response(status_code=HTTPStatus.OK.value)
+            self.assertEqual(self.store.handle("POST", self.event("key-4"), self.route).status_code, 200)
+
+    def test_handle_invalid_key(self):
+        """Test keys must have 1 to MAX_KEY_LENGTH characters."""
+        for key in ("", "k" * (self.idempotency.MAX_KEY_LENGTH + 1)):
+            response = self.store.handle("POST", self.event(key), self.route)
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST.value)
+        self.route.assert_not_called()
+
+    def test_cache_size(self):
+        """Test the per container cache keeps the most recently used records."""
+        store = self.idempotency.IdempotencyStore(self.repository, max_size=1, clock=lambda: self.now)
+        store.handle("POST", self.event("key-1"), self.route)
+        store.handle("POST", self.event("key-2"), self.route)
+        self.assertEqual(list(store.entries), [store.record_key("POST", "key-2")])
+        self.now += self.idempotency.IDEMPOTENCY_TTL_SECONDS
+        self.assertIsNone(store._cached(store.record_key("POST", "key-2")))
+
+    def tearDown(self) -> None:
+        return super().tearDown()
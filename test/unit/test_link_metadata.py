@@ -0,0 +1,163 @@
+""" Unit Tests for the link_metadata module. """
+import http.client
+import os
+import sys
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from urllib.error import URLError
+from urllib.request import build_opener, urlopen
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+from fixtures import PageServer  # noqa: E402
+
+PAGE = b"""<!doctype html><html><head>
+<title>
+  Example  Page
+</title>
+<meta name="description" content=" An example page. ">
+<meta property="og:title" content="Ignored">
+<link rel="shortcut icon" href="/static/icon.png">
+</head><body><title>Not the title</title></body></html>"""
+
+
+class test_link_metadata(TestCase):
+    """Test link_metadata module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import link_metadata
+
+        self.link_metadata = link_metadata
+        self.repository = fixtures.repository()
+        self.table = fixtures.seed()
+
+    def test_fetch(self):
+        """Test the title, description and favicon hash are read from the page."""
+        with PageServer(
+            {"/": ("text/html; charset=utf-8", PAGE), "/static/icon.png": ("image/png", b"icon")}
+        ) as server:
+            metadata = self.link_metadata.fetch(server.url("/"), opener=urlopen)
+            self.assertEqual(metadata["title"], "Example Page")
+            self.assertEqual(metadata["description"], "An example page.")
+            self.assertEqual(metadata["faviconUrl"], server.url("/static/icon.png"))
+            self.assertEqual(len(metadata["faviconHash"]), 22)
+
+    def test_fetch_fallbacks(self):
+        """Test Open Graph tags and the default favicon are used when needed."""
+        page = b'<meta property="og:title" content="OG"><meta property="og:description" content="D">'
+        with PageServer({"/page": ("text/html", page)}) as server:
+            metadata = self.link_metadata.fetch(server.url("/page"), opener=urlopen)
+            self.assertEqual(metadata, {"title": "OG", "description": "D"})
+            self.assertEqual(server.requests, ["/page", "/favicon.ico"])
+
+            with self.assertRaises(URLError):
+                self.link_metadata.fetch(server.url("/missing"), opener=urlopen)
+        with self.assertRaises(ValueError):
+            self.link_metadata.fetch("file:///etc/passwd")
+
+    def test_fetch_private(self):
+        """Test pages on loopback, private and link-local addresses are never fetched."""
+        fetch = self.link_metadata.fetch
+        with PageServer({"/": ("text/html", PAGE)}) as server:
+            with self.assertRaises(ValueError):
+                fetch(server.url("/"))
+            for address in ("10.0.0.1", "169.254.169.254", "::1", "::ffff:127.0.0.1", "fd00::1"):
+                with patch("socket.getaddrinfo", return_value=[(0, 0, 0, "", (address, 80))]):
+                    with self.assertRaises(ValueError):
+                        fetch("http://internal.example.com/")
+            self.assertEqual(server.requests, [])
+
+            # A host resolving to a public address, then to a private one when connecting.
+            with patch.object(self.link_metadata, "_check_url"), self.assertRaises(ValueError):
+                fetch(server.url("/"))
+            self.assertEqual(server.requests, [])
+
+    def test_fetch_private_redirect(self):
+        """Test redirects to non-public addresses are refused."""
+        redirects = {"/": "http://169.254.169.254/latest/meta-data/", "/ftp": "ftp://example.com/"}
+        with PageServer({}, redirects) as server:
+            opener = build_opener(self.link_metadata._PublicRedirectHandler).open
+            for path in redirects:
+                with self.assertRaises(ValueError):
+                    self.link_metadata.fetch(server.url(path), opener=opener)
+
+    def test_fetch_charset(self):
+        """Test pages with an unknown charset are decoded as UTF-8."""
+        with PageServer({"/": ("text/html; charset=bogus", PAGE)}) as server:
+            metadata = self.link_metadata.fetch(server.url("/"), opener=urlopen)
+        self.assertEqual(metadata["title"], "Example Page")
+
+    def test_is_stale(self):
+        """Test metadata is stale when missing, expired or for another target URL."""
+        is_stale = self.link_metadata.is_stale
+        item = {"targetUrl": "https://a", "metadata": {"url": "https://a", "refreshAt": 100}}
+        self.assertFalse(is_stale(item, 99))
+        self.assertTrue(is_stale(item, 100))
+        self.assertTrue(is_stale({**item, "targetUrl": "https://b"}, 0))
+        self.assertTrue(is_stale({"targetUrl": "https://a"}, 0))
+
+    def test_enqueue(self):
+        """Test fetches are invoked asynchronously, and only when configured."""
+        client = MagicMock()
+        self.assertFalse(self.link_metadata.enqueue("de305d54", "https://a", client))
+        with patch.object(self.link_metadata, "METADATA_FUNCTION_NAME", "metadata-lambda"):
+            self.assertTrue(self.link_metadata.enqueue("de305d54", "https://a", client))
+            self.assertEqual(client.invoke.call_args.kwargs["InvocationType"], "Event")
+
+            client.invoke.side_effect = ClientError(
+                {"Error": {"Code": "TooManyRequestsException", "Message": ""}}, "Invoke"
+            )
+            self.assertFalse(self.link_metadata.enqueue("de305d54", "https://a", client))
+            with patch.object(self.link_metadata, "_clients", {"lambda": client}):
+                self.assertFalse(self.link_metadata.enqueue("de305d54", "https://a"))
+
+    def test_refresh(self):
+        """Test metadata is stored with the link and refreshed only once stale."""
+        fetcher = MagicMock(return_value={"title": "Google"})
+        metadata = self.link_metadata.refresh(
+            self.repository, "de305d54", "https://www.google.com", now=1000, fetcher=fetcher
+        )
+        self.assertEqual(metadata["refreshAt"], 1000 + self.link_metadata.METADATA_TTL_SECONDS)
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertEqual(item["metadata"]["title"], "Google")
+        self.assertEqual(item["metadata"]["url"], "https://www.google.com")
+
+        self.assertIsNone(
+            self.link_metadata.refresh(
+                self.repository, "de305d54", "https://www.google.com", now=1001, fetcher=fetcher
+            )
+        )
+        self.assertIsNone(
+            self.link_metadata.refresh(
+                self.repository, "de305d54", "https://www.bing.com", now=1001, fetcher=fetcher
+            )
+        )
+        self.assertIsNone(
+            self.link_metadata.refresh(self.repository, "123", "https://www.bing.com", fetcher=fetcher)
+        )
+        fetcher.assert_called_once()
+
+    def test_refresh_failed(self):
+        """Test a failed fetch is retried sooner than a successful one is refreshed."""
+        fetcher = MagicMock(side_effect=URLError("timed out"))
+        metadata = self.link_metadata.refresh(
+            self.repository, "de305d54", "https://www.google.com", now=1000, fetcher=fetcher
+        )
+        self.assertEqual(metadata["error"], "fetch failed")
+        self.assertEqual(metadata["refreshAt"], 1000 + self.link_metadata.METADATA_RETRY_SECONDS)
+
+        for error in (LookupError("bogus"), http.client.BadStatusLine("")):
+            fetcher.side_effect = error
+            metadata = self.link_metadata.refresh(
+                self.repository, "75b4431b", "https://www.example.com", now=1000, fetcher=fetcher
+            )
+            self.assertEqual(metadata["error"], "fetch failed")
+            self.table.update_item(Key={"slug": "75b4431b"}, UpdateExpression="REMOVE metadata")
+
+    def tearDown(self) -> None:
+        return super().tearDown()
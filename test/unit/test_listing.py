@@ -0,0 +1,109 @@
+""" Unit Tests for the listing module. """
+import os
+import sys
+from unittest import TestCase
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+
+
+class test_listing(TestCase):
+    """Test listing module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import listing
+
+        self.listing = listing
+        self.repository = fixtures.repository()
+        self.table = fixtures.seed()
+
+    def seed_links(self, count: int) -> None:
+        for index in range(count):
+            slug = f"link-{index}"
+            created_at = f"2023-01-{index + 1:02}T00:00:00Z"
+            tags = {"campaign-y"} if index % 2 else {"campaign-y", "launch"}
+            self.repository.put(
+                {"slug": slug, "targetUrl": f"https://a/{index}", "owner": "team-x", "tags": tags, "createdAt": created_at}
+            )
+            self.listing.write_tags(self.repository, slug, created_at, tags)
+
+    def test_validate(self):
+        """Test owners and tags must be short strings, and tags bounded in number."""
+        validate = self.listing.validate
+        self.assertIsNone(validate({}))
+        self.assertIsNone(validate({"owner": "team-x", "tags": ["a", "b", "a"]}))
+        self.assertIn("'owner'", validate({"owner": ""}))
+        self.assertIn("'owner'", validate({"owner": ["team-x"]}))
+        self.assertIn("'owner'", validate({"owner": "brand-a/team-x"}))
+        self.assertIn("'tags'", validate({"tags": "a"}))
+        self.assertIn("'tags'", validate({"tags": [1]}))
+        self.assertIn("'tags'", validate({"tags": ["x" * (self.listing.MAX_LABEL_LENGTH + 1)]}))
+        self.assertIn("'tags'", validate({"tags": [str(tag) for tag in range(self.listing.MAX_TAGS + 1)]}))
+
+    def test_write_and_delete_tags(self):
+        """Test each tag of a link is an auxiliary item in the tag-index."""
+        self.listing.write_tags(self.repository, "de305d54", "2021-01-01T00:00:00Z", {"a", "b"})
+        item = self.repository.get({"slug": "de305d54#tag:a"})
+        self.assertEqual(item["recordType"], "tag")
+        self.assertEqual(item["tagOf"], "de305d54")
+        self.assertEqual(item["createdAt"], "2021-01-01T00:00:00Z")
+
+        self.listing.delete_tags(self.repository, "de305d54", {"a", "b"})
+        self.listing.delete_tags(self.repository, "de305d54", set())
+        self.assertIsNone(self.repository.get({"slug": "de305d54#tag:a"}))
+        self.assertIsNone(self.repository.get({"slug": "de305d54#tag:b"}))
+
+    def test_list_links(self):
+        """Test links are listed newest first by owner and by tag, and paginated."""
+        from src.repository import OWNER_INDEX, TAG_INDEX
+
+        self.seed_links(5)
+        page = self.listing.list_links(self.repository, OWNER_INDEX, "team-x", 10)
+        self.assertEqual([item["slug"] for item in page.items], [f"link-{index}" for index in range(4, -1, -1)])
+        self.assertEqual(page.items[0]["targetUrl"], "https://a/4")
+
+        page = self.listing.list_links(self.repository, TAG_INDEX, "launch", 10, since="2023-01-02T00:00:00Z")
+        self.assertEqual([item["slug"] for item in page.items], ["link-4", "link-2"])
+
+        slugs, start_key = [], None
+        while True:
+            page = self.listing.list_links(self.repository, TAG_INDEX, "campaign-y", 2, start_key)
+            slugs.extend(item["slug"] for item in page.items)
+            if not page.last_key:
+                break
+            start_key = page.last_key
+        self.assertEqual(slugs, [f"link-{index}" for index in range(4, -1, -1)])
+
+    def test_list_links_tenant(self):
+        """Test a listing of a tenant only reads the index entries of that tenant."""
+        from src.repository import OWNER_INDEX, TAG_INDEX
+
+        self.seed_links(5)
+        self.repository.put(
+            {"slug": "brand-a/x", "targetUrl": "https://b", "owner": "brand-a/team-x", "createdAt": "2023-02-01T00:00:00Z"}
+        )
+        self.listing.write_tags(self.repository, "brand-a/x", "2023-02-01T00:00:00Z", {"launch"}, "brand-a")
+        with patch.object(self.repository, "query", wraps=self.repository.query) as mock_query:
+            page = self.listing.list_links(self.repository, OWNER_INDEX, "team-x", 1, tenant="brand-a")
+        self.assertEqual(mock_query.call_args.args[1], "brand-a/team-x")
+        self.assertEqual(page.items, [{"slug": "brand-a/x", "targetUrl": "https://b", "owner": "team-x", "createdAt": "2023-02-01T00:00:00Z"}])
+        page = self.listing.list_links(self.repository, TAG_INDEX, "launch", 10, tenant="brand-a")
+        self.assertEqual([item["slug"] for item in page.items], ["brand-a/x"])
+        page = self.listing.list_links(self.repository, TAG_INDEX, "launch", 10)
+        self.assertEqual([item["slug"] for item in page.items], ["link-4", "link-2", "link-0"])
+
+    def test_list_links_deleted(self):
+        """Test links deleted since their tag items were read are left out."""
+        from src.repository import TAG_INDEX
+
+        self.seed_links(2)
+        self.repository.delete({"slug": "link-1"})
+        page = self.listing.list_links(self.repository, TAG_INDEX, "campaign-y", 10)
+        self.assertEqual([item["slug"] for item in page.items], ["link-0"])
+
+    def tearDown(self) -> None:
+        return super().tearDown()
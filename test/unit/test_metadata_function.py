@@ -0,0 +1,56 @@
+""" Unit Tests for METADATA Lambda. """
+import os
+import sys
+from unittest import TestCase
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+from fixtures import PageServer, context  # noqa: E402
+
+
+class test_metadata_function(TestCase):
+    """Test METADATA Lambda."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src.metadata_function import lambda_handler
+
+        self.lambda_handler = lambda_handler
+        self.table = fixtures.seed()
+
+    def test_refresh_metadata(self):
+        """Test the metadata of the target page is stored with the link."""
+        # The local server stands in for a public site; the Lambda imports link_metadata from src.
+        with PageServer({"/": ("text/html", b"<title>Local</title>")}) as server, patch(
+            "link_metadata._check_address"
+        ):
+            self.table.put_item(Item={"slug": "2cd9cab6", "targetUrl": server.url("/")})
+            event = {"slug": "2cd9cab6", "targetUrl": server.url("/")}
+            self.assertEqual(self.lambda_handler(event, context()), {"refreshed": True})
+            self.assertEqual(self.lambda_handler(event, context()), {"refreshed": False})
+        item = self.table.get_item(Key={"slug": "2cd9cab6"})["Item"]
+        self.assertEqual(item["metadata"]["title"], "Local")
+
+    def test_refresh_metadata_deleted(self):
+        """Test a link deleted while its metadata was fetched is not recreated."""
+        event = {"slug": "de305d54", "targetUrl": "https://www.google.com"}
+        with patch(
+            "src.metadata_function.refresh",
+            side_effect=ClientError(
+                {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}}, "UpdateItem"
+            ),
+        ):
+            self.assertEqual(self.lambda_handler(event, context()), {"refreshed": False})
+        with patch(
+            "src.metadata_function.refresh",
+            side_effect=ClientError({"Error": {"Code": "500", "Message": ""}}, "UpdateItem"),
+        ), self.assertRaises(ClientError):
+            self.lambda_handler(event, context())
+
+    def tearDown(self) -> None:
+        return super().tearDown()
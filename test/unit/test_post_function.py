@@ -4,121 +4,195 @@ import os
 import sys
 from http import HTTPStatus
 from unittest import TestCase
-from unittest.mock import Mock, patch
+from unittest.mock import patch
 
-import boto3
-from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
-from aws_lambda_powertools.utilities.typing import LambdaContext
 from botocore.exceptions import ClientError
-from moto import mock_dynamodb
 
 sys.path.append(os.path.abspath("."))
 
+import fixtures  # noqa: E402
+from fixtures import api_event, context  # noqa: E402
+from src.url_normalization import url_hash  # noqa: E402
+
 
-@mock_dynamodb
 class test_post_function(TestCase):
     """Test POST Lambda."""
 
     def setUp(self):
         """Setup before each test."""
         super().setUp()
-        self.table_name = "dev-url-shortner-table"
-        self.dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        self.dynamodb.create_table(
-            TableName=self.table_name,
-            KeySchema=[
-                {"AttributeName": "slug", "KeyType": "HASH"},
-            ],
-            AttributeDefinitions=[
-                {"AttributeName": "slug", "AttributeType": "S"},
-            ],
-            ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
-        )
-        self.table = self.dynamodb.Table(self.table_name)
         from src.post_function import lambda_handler, post_item
 
         self.lambda_handler = lambda_handler
         self.post_item = post_item
-        self.seed_data()
-
-    def seed_data(self):
-        table = self.table
-        table.put_item(
-            Item={
-                "slug": "de305d54",
-                "targetUrl": "https://www.google.com",
-                "createdAt": "2021-01-01T00:00:00.000Z",
-            }
-        )
-        table.put_item(
-            Item={
-                "slug": "75b4431b",
-                "targetUrl": "https://www.example.com",
-                "createdAt": "2022-03-08T00:00:00.000Z",
-            }
-        )
+        self.table = fixtures.seed()
 
     def test_post_item(self):
         """Test post_item function."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "POST",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"targetUrl": "https://www.microsoft.com"}),
-            }
+        response = self.lambda_handler(
+            api_event("POST", "/", body={"targetUrl": "https://www.microsoft.com"}), context()
+        )
+        self.assertEqual(response["statusCode"], HTTPStatus.CREATED.value)
+
+    def test_post_item_enqueues_metadata(self):
+        """Test post_item function enqueues a fetch of the target page metadata."""
+        with patch("src.post_function.enqueue") as mock_enqueue:
+            response = self.lambda_handler(
+                api_event("POST", "/", body={"slug": "2cd9cab6", "targetUrl": "https://www.bing.com"}),
+                context(),
+            )
+        self.assertEqual(response["statusCode"], HTTPStatus.CREATED.value)
+        mock_enqueue.assert_called_once_with("2cd9cab6", "https://www.bing.com")
+
+    def test_post_item_owner_tags(self):
+        """Test post_item function stores the owner and writes a tag item per tag."""
+        response = self.lambda_handler(
+            api_event(
+                "POST",
+                "/",
+                body={
+                    "slug": "2cd9cab6",
+                    "targetUrl": "https://www.bing.com",
+                    "owner": "team-x",
+                    "tags": ["campaign-y", "launch", "launch"],
+                },
+            ),
+            context(),
+        )
+        self.assertEqual(response["statusCode"], HTTPStatus.CREATED.value)
+        item = self.table.get_item(Key={"slug": "2cd9cab6"})["Item"]
+        self.assertEqual(item["owner"], "team-x")
+        self.assertEqual(item["tags"], {"campaign-y", "launch"})
+        tag_item = self.table.get_item(Key={"slug": "2cd9cab6#tag:launch"})["Item"]
+        self.assertEqual(tag_item["createdAt"], item["createdAt"])
+
+        response = self.lambda_handler(
+            api_event("POST", "/", body={"targetUrl": "https://www.amazon.com", "tags": "launch"}),
+            context(),
         )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
+        self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+        self.assertIn("'tags'", json.loads(response["body"])["message"])
+
+    def test_post_item_idempotent(self):
+        """Test post_item function replays its response to retries with the same Idempotency-Key."""
+        body = {"slug": "2cd9cab6", "targetUrl": "https://www.bing.com"}
+        event = api_event("POST", "/", body=body, headers={"Idempotency-Key": "retry-1"})
+        response = self.lambda_handler(event, context())
         self.assertEqual(response["statusCode"], HTTPStatus.CREATED.value)
 
+        with patch("src.post_function.home_repository.get") as mock_get:
+            for _ in range(3):
+                replayed = self.lambda_handler(event, context())
+                self.assertEqual(replayed["statusCode"], HTTPStatus.CREATED.value)
+                self.assertEqual(replayed["body"], response["body"])
+                self.assertEqual(replayed["multiValueHeaders"]["Idempotent-Replayed"], ["true"])
+        mock_get.assert_not_called()
+
+        response = self.lambda_handler(api_event("POST", "/", body=body), context())
+        self.assertEqual(response["statusCode"], HTTPStatus.CONFLICT.value)
+
     def test_post_item_conflict(self):
         """Test post_item function when there is a CONFLICT."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "POST",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"targetUrl": "https://www.google.com"}),
-            }
+        response = self.lambda_handler(
+            api_event("POST", "/", body={"targetUrl": "https://www.google.com"}), context()
         )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
         self.assertEqual(response["statusCode"], HTTPStatus.CONFLICT.value)
         self.assertEqual(
             json.loads(response["body"])["message"], "Item already exists."
         )
 
+    def test_post_item_canonical_conflict(self):
+        """Test post_item function deduplicates target URLs in canonical form."""
+        response = self.lambda_handler(
+            api_event("POST", "/", body={"targetUrl": "HTTPS://www.Google.com:443/?utm_source=x"}),
+            context(),
+        )
+        self.assertEqual(response["statusCode"], HTTPStatus.CONFLICT.value)
+
+    def test_post_item_repeated(self):
+        """Test repeated creates of a URL are answered from memory."""
+        event = api_event("POST", "/", body={"targetUrl": "https://www.microsoft.com"})
+        response = self.lambda_handler(event, context())
+        self.assertEqual(response["statusCode"], HTTPStatus.CREATED.value)
+        item = self.table.scan(
+            FilterExpression="targetUrl = :url",
+            ExpressionAttributeValues={":url": "https://www.microsoft.com"},
+        )["Items"][0]
+        self.assertEqual(item["urlHash"], url_hash("https://www.microsoft.com/"))
+
+        with patch("src.post_function.home_repository.get") as mock_get, patch(
+            "src.post_function.home_repository.query"
+        ) as mock_query:
+            for _ in range(3):
+                response = self.lambda_handler(event, context())
+                self.assertEqual(response["statusCode"], HTTPStatus.CONFLICT.value)
+            mock_get.assert_not_called()
+            mock_query.assert_not_called()
+
+    def test_post_item_race(self):
+        """Test post_item function when another request creates the slug first."""
+        event = api_event(
+            "POST", "/", body={"slug": "2cd9cab6", "targetUrl": "https://www.amazon.com"}
+        )
+        with patch("src.post_function.home_repository.get", return_value=None):
+            self.table.put_item(Item={"slug": "2cd9cab6", "targetUrl": "https://www.bing.com"})
+            response = self.lambda_handler(event, context())
+            self.assertEqual(response["statusCode"], HTTPStatus.CONFLICT.value)
+
     def test_post_item_bad_request(self):
         """Test post_item_by_slug function when there is a BAD REQUEST."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "POST",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({}),
-            }
-        )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
+        response = self.lambda_handler(api_event("POST", "/", body={}), context())
         self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
         self.assertEqual(
             json.loads(response["body"])["message"], "The 'targetUrl' field is required."
         )
 
+    def test_post_item_reserved_slug(self):
+        """Test post_item function rejects slugs containing the shard separator."""
+        response = self.lambda_handler(
+            api_event(
+                "POST", "/", body={"slug": "de305d54#0", "targetUrl": "https://www.microsoft.com"}
+            ),
+            context(),
+        )
+        self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+
+    def test_post_item_tenant(self):
+        """Test post_item function creates links in the tenant of the Host header."""
+        from src.tenancy import register_host
+
+        register_host(fixtures.repository(), "brand-a.link", "brand-a")
+        body = {"slug": "de305d54", "targetUrl": "https://www.google.com"}
+        headers = {"Host": "brand-a.link"}
+        response = self.lambda_handler(api_event("POST", "/", body=body, headers=headers), context())
+        self.assertEqual(response["statusCode"], HTTPStatus.CREATED.value)
+        item = self.table.get_item(Key={"slug": "brand-a/de305d54"})["Item"]
+        self.assertEqual(item["urlHash"], f"brand-a/{url_hash('https://www.google.com')}")
+        body["slug"] = "2cd9cab6"
+        response = self.lambda_handler(api_event("POST", "/", body=body, headers=headers), context())
+        self.assertEqual(response["statusCode"], HTTPStatus.CONFLICT.value)
+
+        response = self.lambda_handler(
+            api_event("POST", "/", body={"slug": "brand-a/75b4431b", "targetUrl": "https://www.bing.com"}),
+            context(),
+        )
+        self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+
+    def test_post_item_reserved_path(self):
+        """Test post_item function rejects slugs that are paths of other routes."""
+        response = self.lambda_handler(
+            api_event("POST", "/", body={"slug": "metadata", "targetUrl": "https://www.bing.com"}),
+            context(),
+        )
+        self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+
     def test_post_item_error(self):
         """Test post_item function when there is an error."""
-        context: LambdaContext = Mock()
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "POST",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"slug": "2cd9cab6", "targetUrl": "https://www.amazon.com"}),
-            }
+        event = api_event(
+            "POST", "/", body={"slug": "2cd9cab6", "targetUrl": "https://www.amazon.com"}
         )
         with patch(
-            "src.post_function.table.put_item",
+            "src.post_function.home_repository.put",
             side_effect=ClientError(
                 error_response={
                     "Error": {"Code": "500", "Message": "Internal Server Error"}
@@ -126,7 +200,7 @@ class test_post_function(TestCase):
                 operation_name="put_item",
             ),
         ):
-            response = self.lambda_handler(event, context)
+            response = self.lambda_handler(event, context())
             self.assertEqual(
                 response["statusCode"], HTTPStatus.INTERNAL_SERVER_ERROR.value
             )
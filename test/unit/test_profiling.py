@@ -0,0 +1,133 @@
+""" Unit Tests for the profiling module. """
+import os
+import sys
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+
+
+class test_profiling(TestCase):
+    """Test profiling module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import profiling
+
+        self.profiling = profiling
+        self.log = MagicMock()
+        self.tracer = MagicMock()
+        self.tracer.capture_method.side_effect = lambda method, **kwargs: self.traced
+        self.traced = MagicMock(return_value="traced")
+        self.samples = iter([0.5, 0.05])
+        self.instrument = profiling.Instrumentation(
+            self.log,
+            self.tracer,
+            sample_rate=0.1,
+            sample_rates={"hot_route": 0},
+            sampler=lambda: next(self.samples),
+        )
+
+    def test_phase_timer(self):
+        """Test laps and nested phases add up per invocation."""
+        ticks = iter([0.0, 0.001, 0.002, 0.004, 0.005, 0.0051, 0.01])
+        timer = self.profiling.PhaseTimer(clock=lambda: next(ticks))
+        timer.start()
+        timer.lap("parse")
+        timer.begin("dynamodb")
+        timer.end("dynamodb", event_name="after-call.dynamodb.GetItem")
+        timer.end("dynamodb")
+        timer.lap("route")
+        timer.lap("route")
+        self.assertEqual(timer.fields(), {"parse": 1.0, "dynamodb": 2.0, "route": 4.1})
+        timer.start()
+        self.assertEqual(timer.fields(), {})
+
+    def test_capture_method_sampling(self):
+        """Test a route is traced for its sampled fraction of calls only."""
+
+        def route():
+            return "untraced"
+
+        route = self.instrument.capture_method(route)
+        self.tracer.capture_method.assert_called_once()
+        self.assertFalse(self.tracer.capture_method.call_args.kwargs["capture_response"])
+        self.assertEqual(route(), "untraced")
+        self.assertEqual(route(), "traced")
+
+        def hot_route():
+            return "untraced"
+
+        self.assertEqual(self.instrument.capture_method(hot_route)(), "untraced")
+
+        always = self.profiling.Instrumentation(self.log, self.tracer, sample_rate=1)
+        self.assertEqual(always.capture_method(route)(), "traced")
+
+    def test_wrap(self):
+        """Test every invocation logs its phase timings."""
+        route = self.instrument.capture_method(lambda: time.sleep(0.001))
+        response = self.instrument.wrap(lambda event, context: route() or "response")({}, None)
+        self.assertEqual(response, "response")
+        phases = self.log.info.call_args.kwargs["phases"]
+        self.assertEqual(set(phases), {"parse", "route", "serialize"})
+        self.assertGreaterEqual(phases["route"], 1)
+
+        self.instrument.wrap(lambda event, context: None)({}, None)
+        self.assertEqual(set(self.log.info.call_args.kwargs["phases"]), {"parse"})
+
+    def test_attach(self):
+        """Test DynamoDB calls are timed, and other backends are ignored."""
+        from src.repository import SQLiteRepository
+
+        instrument = self.profiling.Instrumentation(self.log, self.tracer)
+        repository = fixtures.repository()
+        instrument.attach(repository, repository, SQLiteRepository(":memory:"))
+        instrument.timer.start()
+        repository.get({"slug": "de305d54"})
+        self.assertGreater(instrument.timer.fields()["dynamodb"], 0)
+        self.assertEqual(instrument.timer.opened, {})
+
+    def test_profiler(self):
+        """Test profiled invocations log folded stacks."""
+
+        def busy(event, context):
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        instrument = self.profiling.Instrumentation(
+            self.log, self.tracer, profile_rate=1, sampler=lambda: 0.0
+        )
+        instrument.profiler.interval_seconds = 0.001
+        instrument.wrap(busy)({}, None)
+        profile = self.log.info.call_args_list[0].kwargs["profile"]
+        self.assertTrue(profile)
+        stack, count = profile[0].rsplit(" ", 1)
+        self.assertTrue(stack.endswith("test_profiling.py:busy"))
+        self.assertGreater(int(count), 0)
+
+    def test_profiler_unavailable(self):
+        """Test the profiler is skipped outside the main thread."""
+        self.assertTrue(self.profiling.Profiler.available())
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self.profiling.Profiler.available()))
+        thread.start()
+        thread.join()
+        self.assertEqual(result, [False])
+
+        instrument = self.profiling.Instrumentation(
+            self.log, self.tracer, profile_rate=1, sampler=lambda: 0.0
+        )
+        with patch.object(self.profiling.Profiler, "available", return_value=False), patch.object(
+            instrument.profiler, "start"
+        ) as mock_start:
+            instrument.wrap(lambda event, context: None)({}, None)
+        mock_start.assert_not_called()
+
+    def tearDown(self) -> None:
+        return super().tearDown()
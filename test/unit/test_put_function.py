@@ -4,106 +4,169 @@ import os
 import sys
 from http import HTTPStatus
 from unittest import TestCase
-from unittest.mock import Mock, patch
+from unittest.mock import patch
 
-import boto3
-from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
-from aws_lambda_powertools.utilities.typing import LambdaContext
 from botocore.exceptions import ClientError
-from moto import mock_dynamodb
 
 sys.path.append(os.path.abspath("."))
 
+import fixtures  # noqa: E402
+from fixtures import api_event, context  # noqa: E402
+from src.url_normalization import url_hash  # noqa: E402
+
 
-@mock_dynamodb
 class test_put_function(TestCase):
     """Test PUT Lambda."""
 
     def setUp(self):
         """Setup before each test."""
         super().setUp()
-        self.table_name = "dev-url-shortner-table"
-        self.dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
-        self.dynamodb.create_table(
-            TableName=self.table_name,
-            KeySchema=[
-                {"AttributeName": "slug", "KeyType": "HASH"},
-            ],
-            AttributeDefinitions=[
-                {"AttributeName": "slug", "AttributeType": "S"},
-            ],
-            ProvisionedThroughput={"ReadCapacityUnits": 1, "WriteCapacityUnits": 1},
-        )
-        self.table = self.dynamodb.Table(self.table_name)
         from src.put_function import lambda_handler, put_item
 
         self.lambda_handler = lambda_handler
         self.put_item = put_item
-        self.seed_data()
-
-    def seed_data(self):
-        table = self.table
-        table.put_item(
-            Item={
-                "slug": "de305d54",
-                "targetUrl": "https://www.google.com",
-                "createdAt": "2021-01-01T00:00:00.000Z",
-            }
-        )
-        table.put_item(
-            Item={
-                "slug": "75b4431b",
-                "targetUrl": "https://www.example.com",
-                "createdAt": "2022-03-08T00:00:00.000Z",
-            }
-        )
+        self.table = fixtures.seed()
 
     def test_put_item(self):
         """Test put_item function."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "PUT",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps(
-                    {"slug": "de305d54", "targetUrl": "https://www.microsoft.com"}
+        with patch("src.put_function.enqueue") as mock_enqueue:
+            response = self.lambda_handler(
+                api_event(
+                    "PUT", "/", body={"slug": "de305d54", "targetUrl": "https://www.microsoft.com"}
+                ),
+                context(),
+            )
+        self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+        mock_enqueue.assert_called_once_with("de305d54", "https://www.microsoft.com")
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertEqual(item["targetUrl"], "https://www.microsoft.com")
+        self.assertIn("lastUpdatedAt", item)
+        self.assertEqual(item["urlHash"], url_hash("https://www.microsoft.com"))
+
+    def test_put_item_tenant(self):
+        """Test put_item function updates the link of the tenant of the Host header."""
+        from src.tenancy import register_host
+
+        register_host(fixtures.repository(), "brand-a.link", "brand-a")
+        response = self.lambda_handler(
+            api_event(
+                "PUT",
+                "/",
+                body={"slug": "de305d54", "targetUrl": "https://www.microsoft.com"},
+                headers={"Host": "brand-a.link"},
+            ),
+            context(),
+        )
+        self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+        item = self.table.get_item(Key={"slug": "brand-a/de305d54"})["Item"]
+        self.assertEqual(item["urlHash"], f"brand-a/{url_hash('https://www.microsoft.com')}")
+        self.assertEqual(self.table.get_item(Key={"slug": "de305d54"})["Item"]["targetUrl"], "https://www.google.com")
+
+    def test_put_item_tags(self):
+        """Test put_item function replaces the tags and tag items of an item."""
+        created_at = self.table.get_item(Key={"slug": "de305d54"})["Item"]["createdAt"]
+
+        def put(tags: list[str]) -> dict:
+            response = self.lambda_handler(
+                api_event(
+                    "PUT",
+                    "/",
+                    body={"slug": "de305d54", "targetUrl": "https://www.google.com", "tags": tags},
                 ),
-            }
+                context(),
+            )
+            self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+            return self.table.get_item(Key={"slug": "de305d54"})["Item"]
+
+        self.assertEqual(put(["a", "b"])["tags"], {"a", "b"})
+        self.assertEqual(put(["b", "c"])["tags"], {"b", "c"})
+        tag_items = self.table.scan(
+            FilterExpression="recordType = :tag", ExpressionAttributeValues={":tag": "tag"}
+        )["Items"]
+        self.assertEqual(sorted(item["tag"] for item in tag_items), ["b", "c"])
+        self.assertEqual({item["createdAt"] for item in tag_items}, {created_at})
+
+        self.assertNotIn("tags", put([]))
+        self.assertEqual(self.table.scan()["Count"], len(fixtures.SEED_ITEMS))
+
+        response = self.lambda_handler(
+            api_event("PUT", "/", body={"slug": "de305d54", "targetUrl": "https://a", "owner": 1}),
+            context(),
+        )
+        self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+
+    def test_put_item_idempotent(self):
+        """Test put_item function replays its response to retries with the same Idempotency-Key."""
+        event = api_event(
+            "PUT",
+            "/",
+            body={"slug": "de305d54", "targetUrl": "https://www.microsoft.com"},
+            headers={"Idempotency-Key": "retry-1"},
         )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
+        self.assertEqual(self.lambda_handler(event, context())["statusCode"], HTTPStatus.OK.value)
+        with patch("src.put_function.home_repository.update") as mock_update:
+            response = self.lambda_handler(event, context())
         self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+        mock_update.assert_not_called()
 
     def test_put_item_bad_request(self):
         """Test put_item_by_slug function when there is a BAD REQUEST."""
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "PUT",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"targetUrl": "https://www.amazon.com"}),
-            }
+        response = self.lambda_handler(
+            api_event("PUT", "/", body={"targetUrl": "https://www.amazon.com"}), context()
         )
-        context: LambdaContext = Mock()
-        response = self.lambda_handler(event, context)
         self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
         self.assertEqual(
             json.loads(response["body"])["message"], "The 'slug' field is required."
         )
 
+    def test_put_item_other_tenant(self):
+        """Test put_item function cannot write the links or host items of another tenant."""
+        from src.tenancy import register_host
+
+        register_host(fixtures.repository(), "brand-b.link", "brand-b")
+        for body in (
+            {"slug": "brand-a/de305d54", "targetUrl": "https://evil.example"},
+            {"slug": "#tenantHost:brand-b.link", "targetUrl": "https://evil.example", "tenant": "brand-a"},
+        ):
+            response = self.lambda_handler(api_event("PUT", "/", body=body), context())
+            self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+        self.assertIsNone(self.table.get_item(Key={"slug": "brand-a/de305d54"}).get("Item"))
+        self.assertEqual(self.table.get_item(Key={"slug": "#tenantHost:brand-b.link"})["Item"]["tenant"], "brand-b")
+
+    def test_put_item_attributes(self):
+        """Test put_item function only writes the attributes a request may change."""
+        body = {
+            "slug": "de305d54",
+            "targetUrl": "https://www.microsoft.com",
+            "owner": "alice",
+            "clicks": 1000,
+            "shards": 64,
+            "recordType": "tenantHost",
+        }
+        response = self.lambda_handler(api_event("PUT", "/", body=body), context())
+        self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertEqual(item["owner"], "alice")
+        for attribute in ("clicks", "shards", "recordType"):
+            self.assertNotIn(attribute, item)
+
+    def test_put_item_reserved_slug(self):
+        """Test put_item function rejects the keys of click shards and auxiliary items."""
+        for slug in ("de305d54#0", "de305d54#us-west-2.0", "#hotSlugs:0", "hot", ""):
+            response = self.lambda_handler(
+                api_event("PUT", "/", body={"slug": slug, "targetUrl": "https://www.amazon.com"}),
+                context(),
+            )
+            self.assertEqual(response["statusCode"], HTTPStatus.BAD_REQUEST.value)
+        self.assertEqual(self.table.scan()["Count"], len(fixtures.SEED_ITEMS))
+
     def test_put_item_error(self):
         """Test put_item function when there is an error."""
-        context: LambdaContext = Mock()
-        event = APIGatewayProxyEvent(
-            data={
-                "path": "/",
-                "httpMethod": "PUT",
-                "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"slug": "2cd9cab6", "targetUrl": "https://www.amazon.com"}),
-            }
+        event = api_event(
+            "PUT", "/", body={"slug": "2cd9cab6", "targetUrl": "https://www.amazon.com"}
         )
         with patch(
-            "src.put_function.table.update_item",
+            "src.put_function.home_repository.update",
             side_effect=ClientError(
                 error_response={
                     "Error": {"Code": "500", "Message": "Internal Server Error"}
@@ -111,7 +174,7 @@ class test_put_function(TestCase):
                 operation_name="update_item",
             ),
         ):
-            response = self.lambda_handler(event, context)
+            response = self.lambda_handler(event, context())
             self.assertEqual(
                 response["statusCode"], HTTPStatus.INTERNAL_SERVER_ERROR.value
             )
@@ -0,0 +1,140 @@
+""" Unit Tests for the rate_limiting module. """
+import json
+import os
+import sys
+from http import HTTPStatus
+from unittest import TestCase
+
+from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+
+class test_rate_limiting(TestCase):
+    """Test rate_limiting module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import rate_limiting
+
+        self.rate_limiting = rate_limiting
+        self.now = [0.0]
+        self.limiter = rate_limiting.RateLimiter(
+            limits={
+                rate_limiting.API_KEY: (0, 0),
+                rate_limiting.SOURCE_IP: (1, 2),
+                rate_limiting.SLUG: (10, 10),
+            },
+            clock=lambda: self.now[0],
+            max_buckets=2,
+        )
+
+    def event(self, source_ip: str = "0.0.0.0", headers: dict = None):
+        return APIGatewayProxyEvent(
+            data={
+                "path": "/",
+                "httpMethod": "GET",
+                "headers": headers or {},
+                "requestContext": {"identity": {"sourceIp": source_ip}},
+            }
+        )
+
+    def test_parse_limit(self):
+        """Test parsing configured limits."""
+        self.assertEqual(self.rate_limiting.parse_limit("5/10", "1/1"), (5.0, 10.0))
+        self.assertEqual(self.rate_limiting.parse_limit(None, "3"), (3.0, 3.0))
+
+    def test_limit_burst_then_refill(self):
+        """Test a source IP gets its burst, then a 429 until tokens refill."""
+        self.assertIsNone(self.limiter.limit(self.event()))
+        self.assertIsNone(self.limiter.limit(self.event()))
+        response = self.limiter.limit(self.event())
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS.value)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(json.loads(response.body)["message"], "Too many requests.")
+        self.now[0] = 1.0
+        self.assertIsNone(self.limiter.limit(self.event()))
+
+    def test_limit_keys_are_independent(self):
+        """Test one client exhausting its bucket does not limit another."""
+        self.assertIsNone(self.limiter.limit(self.event(), cost=2))
+        self.assertIsNotNone(self.limiter.limit(self.event()))
+        self.assertIsNone(self.limiter.limit(self.event("1.1.1.1")))
+
+    def test_limit_forwarded_for(self):
+        """Test the client IP is taken from X-Forwarded-For when present."""
+        headers = {"X-Forwarded-For": "2.2.2.2, 130.176.0.1"}
+        self.limiter.limit(self.event(headers=headers), cost=2)
+        self.assertIn((self.rate_limiting.SOURCE_IP, "2.2.2.2"), self.limiter.buckets)
+
+    def test_source_ip_spoofed(self):
+        """Test entries the client sends in X-Forwarded-For are ignored."""
+        source_ip = self.rate_limiting.source_ip
+        for spoofed in ("9.9.9.9", "8.8.8.8, 9.9.9.9"):
+            event = self.event(headers={"X-Forwarded-For": f"{spoofed}, 2.2.2.2, 130.176.0.1"})
+            self.assertEqual(source_ip(event), "2.2.2.2")
+        event = self.event(headers={"X-Forwarded-For": "130.176.0.1"})
+        self.assertEqual(source_ip(event), "0.0.0.0")
+        event = self.event(headers={"X-Forwarded-For": "9.9.9.9"})
+        self.assertEqual(source_ip(event, hops=0), "0.0.0.0")
+
+    def test_source_ip_cloudfront(self):
+        """Test the client IP of a request through the CloudFront distribution and the edge of the API."""
+        source_ip = self.rate_limiting.source_ip
+        # Client supplied entry, client, CloudFront distribution, edge of the API.
+        forwarded_for = "9.9.9.9, 203.0.113.7, 130.176.10.20, 70.132.0.5"
+        event = self.event(headers={"X-Forwarded-For": forwarded_for})
+        self.assertEqual(source_ip(event, hops=2), "203.0.113.7")
+        event = self.event(headers={"X-Forwarded-For": "203.0.113.7, 130.176.10.20, 70.132.0.5"})
+        self.assertEqual(source_ip(event, hops=2), "203.0.113.7")
+        # Called through the edge of the API alone.
+        event = self.event(headers={"X-Forwarded-For": "203.0.113.7, 70.132.0.5"})
+        self.assertEqual(source_ip(event, hops=2), "0.0.0.0")
+
+    def test_limit_slug(self):
+        """Test requests for one slug share a bucket."""
+        self.assertEqual(self.limiter.take(self.rate_limiting.SLUG, "de305d54", cost=10), 0.0)
+        self.assertEqual(self.limiter.take(self.rate_limiting.SLUG, "de305d54"), 0.1)
+        self.assertEqual(self.limiter.take(self.rate_limiting.API_KEY, "key"), 0.0)
+
+    def test_limit_tenant(self):
+        """Test the requests of a tenant share a bucket, apart from other tenants."""
+        limiter = self.rate_limiting.RateLimiter(
+            limits={self.rate_limiting.TENANT: (1, 2)}, clock=lambda: self.now[0]
+        )
+        self.assertIsNone(limiter.limit(self.event(), tenant="brand-a", cost=2))
+        self.assertIsNotNone(limiter.limit(self.event("1.1.1.1"), tenant="brand-a"))
+        self.assertIsNone(limiter.limit(self.event(), tenant="brand-b"))
+        self.assertIsNone(limiter.limit(self.event()))
+
+    def test_bucket_eviction(self):
+        """Test the least recently used bucket is evicted."""
+        for source_ip in ("1.1.1.1", "2.2.2.2", "1.1.1.1", "3.3.3.3"):
+            self.limiter.limit(self.event(source_ip))
+        self.assertEqual(
+            [key for _, key in self.limiter.buckets], ["1.1.1.1", "3.3.3.3"]
+        )
+
+    def test_load_shedder(self):
+        """Test the load shedder is active for its configured duration."""
+        shedder = self.rate_limiting.LoadShedder(seconds=5, clock=lambda: self.now[0])
+        self.assertFalse(shedder.active)
+        shedder.trip()
+        self.assertTrue(shedder.active)
+        self.now[0] = 5.0
+        self.assertFalse(shedder.active)
+
+    def test_is_throttling_error(self):
+        """Test throttling errors are told apart from other errors."""
+        throttled = ClientError(
+            {"Error": {"Code": "ProvisionedThroughputExceededException", "Message": ""}},
+            "update_item",
+        )
+        failed = ClientError({"Error": {"Code": "500", "Message": ""}}, "update_item")
+        self.assertTrue(self.rate_limiting.is_throttling_error(throttled))
+        self.assertFalse(self.rate_limiting.is_throttling_error(failed))
+
+    def tearDown(self) -> None:
+        return super().tearDown()
@@ -0,0 +1,124 @@
+""" Unit Tests for the regions module.
+
+Each region gets its own moto backend, which stands in for the replicas of a
+global table without replication: a slug written in the home region is missing
+in the replica region until it is copied over, just like during replication lag.
+"""
+import json
+import os
+import sys
+from http import HTTPStatus
+from unittest import TestCase
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+from fixtures import HOME_REGION, REPLICA_REGION, api_event, context  # noqa: E402
+from src.coalescing import ClickCoalescer  # noqa: E402
+
+
+class test_regions(TestCase):
+    """Test regions module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import regions
+
+        self.regions = regions
+        self.table_name = fixtures.TABLE_NAME
+        self.tables = {region: fixtures.table(region) for region in fixtures.REGIONS}
+        self.repositories = {region: fixtures.repository(region) for region in fixtures.REGIONS}
+        fixtures.seed(fixtures.SEED_ITEMS[:1], HOME_REGION)
+
+    def test_regional_repositories_home(self):
+        """Test the home region reads and writes the same table."""
+        with patch.object(self.regions, "HOME_REGION", HOME_REGION):
+            repository, home_repository = self.regions.regional_repositories(
+                self.table_name, HOME_REGION
+            )
+            self.assertIs(repository, home_repository)
+            self.assertFalse(self.regions.is_replica(HOME_REGION))
+            self.assertIsNone(self.regions.click_region(HOME_REGION))
+
+    def test_regional_repositories_replica(self):
+        """Test a replica region reads locally and writes to the home region."""
+        with patch.object(self.regions, "HOME_REGION", HOME_REGION):
+            repository, home_repository = self.regions.regional_repositories(
+                self.table_name, REPLICA_REGION
+            )
+            self.assertEqual(repository.table.meta.client.meta.region_name, REPLICA_REGION)
+            self.assertEqual(home_repository.table.meta.client.meta.region_name, HOME_REGION)
+            self.assertEqual(self.regions.click_region(REPLICA_REGION), REPLICA_REGION)
+            self.assertIs(self.regions.resource(REPLICA_REGION), self.regions.resource(REPLICA_REGION))
+
+    def test_get_item_replication_lag(self):
+        """Test a slug not yet replicated is read from the home region."""
+        replica, home = self.repositories[REPLICA_REGION], self.repositories[HOME_REGION]
+        key = {"slug": "de305d54"}
+        self.assertEqual(
+            self.regions.get_item(replica, home, key)["targetUrl"], "https://www.google.com"
+        )
+        self.assertIsNone(self.regions.get_item(replica, home, {"slug": "123"}))
+        self.assertIsNone(self.regions.get_item(replica, replica, key))
+
+    def test_batch_get_items_replication_lag(self):
+        """Test slugs not yet replicated are batch read from the home region."""
+        replica, home = self.repositories[REPLICA_REGION], self.repositories[HOME_REGION]
+        fixtures.seed(fixtures.SEED_ITEMS[1:], REPLICA_REGION)
+        keys = [{"slug": "de305d54"}, {"slug": "75b4431b"}, {"slug": "123"}]
+        items = self.regions.batch_get_items(replica, home, keys, ["slug"])
+        self.assertEqual(sorted(item["slug"] for item in items), ["75b4431b", "de305d54"])
+        self.assertEqual(
+            [item["slug"] for item in self.regions.batch_get_items(replica, replica, keys)],
+            ["75b4431b"],
+        )
+
+    def test_get_item_by_slug_in_replica(self):
+        """Test the GET Lambda serves a fresh slug from a replica region."""
+        from src import get_function
+
+        event = api_event("GET", "/de305d54")
+        with patch.object(
+            get_function, "repository", self.repositories[REPLICA_REGION]
+        ), patch.object(
+            get_function, "home_repository", self.repositories[HOME_REGION]
+        ), patch.object(get_function, "AWS_REGION", REPLICA_REGION), patch.object(
+            get_function,
+            "coalescer",
+            ClickCoalescer(self.repositories[REPLICA_REGION], REPLICA_REGION, max_clicks=1),
+        ):
+            response = get_function.lambda_handler(event, context())
+            self.assertEqual(response["statusCode"], HTTPStatus.FOUND.value)
+            self.assertEqual(
+                response["multiValueHeaders"]["Location"][0], "https://www.google.com"
+            )
+
+            # The click is owned by the replica region and the home item is untouched.
+            shard = self.tables[REPLICA_REGION].get_item(
+                Key={"slug": f"de305d54#{REPLICA_REGION}.0"}
+            )["Item"]
+            self.assertEqual(shard["clicks"], 1)
+            self.assertEqual(
+                self.tables[HOME_REGION].get_item(Key={"slug": "de305d54"})["Item"]["requests"], []
+            )
+
+            stats = get_function.lambda_handler(
+                api_event("GET", "/de305d54/stats"), context()
+            )
+            self.assertEqual(stats["statusCode"], HTTPStatus.OK.value)
+
+        with patch.object(get_function, "REPLICA_REGIONS", [REPLICA_REGION]), patch.object(
+            get_function, "repository", self.repositories[REPLICA_REGION]
+        ), patch.object(get_function, "home_repository", self.repositories[HOME_REGION]):
+            self.tables[REPLICA_REGION].put_item(
+                Item=self.tables[HOME_REGION].get_item(Key={"slug": "de305d54"})["Item"]
+            )
+            stats = get_function.lambda_handler(
+                api_event("GET", "/de305d54/stats"), context()
+            )
+            self.assertEqual(json.loads(stats["body"])["clicks"], 1)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
@@ -0,0 +1,310 @@
+""" Unit Tests for the repository module.
+
+The same contract runs against both backends, so the local engine is held to
+the DynamoDB semantics the Lambda functions rely on.
+"""
+import os
+import sys
+import tempfile
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import patch
+
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+from src import repository  # noqa: E402
+
+
+class repository_contract:
+    """Tests shared by every Repository implementation."""
+
+    repository: repository.Repository
+
+    def seed(self):
+        self.repository.put(
+            {
+                "slug": "de305d54",
+                "targetUrl": "https://www.google.com",
+                "requests": [],
+                "createdAt": "2021-01-01T00:00:00.000Z",
+            }
+        )
+        self.repository.put(
+            {"slug": "de305d54#0", "recordType": "clickShard", "shardOf": "de305d54", "clicks": 3}
+        )
+
+    def test_get(self):
+        """Test items are returned with numbers as Decimal and missing items as None."""
+        self.seed()
+        self.assertEqual(
+            self.repository.get({"slug": "de305d54"})["targetUrl"], "https://www.google.com"
+        )
+        self.assertEqual(self.repository.get({"slug": "de305d54#0"}, consistent=True)["clicks"], Decimal(3))
+        self.assertEqual(
+            self.repository.get({"slug": "de305d54"}, projection=["targetUrl"]),
+            {"targetUrl": "https://www.google.com"},
+        )
+        self.assertIsNone(self.repository.get({"slug": "123"}))
+
+    def test_put_if_not_exists(self):
+        """Test a conditional put fails on an existing item."""
+        self.seed()
+        with self.assertRaises(ClientError) as raised:
+            self.repository.put({"slug": "de305d54"}, if_not_exists=True)
+        self.assertEqual(
+            raised.exception.response["Error"]["Code"], "ConditionalCheckFailedException"
+        )
+        self.repository.put({"slug": "75b4431b", "data": Binary(b"\x00\x01")}, if_not_exists=True)
+        self.assertEqual(self.repository.get({"slug": "75b4431b"})["data"], Binary(b"\x00\x01"))
+
+    def test_update(self):
+        """Test assigning, adding, appending and discarding in one update."""
+        self.repository.update(
+            {"slug": "de305d54"},
+            assign={"targetUrl": "https://www.amazon.com"},
+            add={"clicks": 2, "tags": {"a", "b"}},
+            append={"requests": [{"ip": "0.0.0.0"}]},
+        )
+        self.repository.update(
+            {"slug": "de305d54"},
+            add={"clicks": 1},
+            append={"requests": [{"ip": "1.1.1.1"}]},
+            discard={"tags": {"a"}},
+        )
+        item = self.repository.get({"slug": "de305d54"})
+        self.assertEqual(item["targetUrl"], "https://www.amazon.com")
+        self.assertEqual(item["clicks"], Decimal(3))
+        self.assertEqual(item["tags"], {"b"})
+        self.assertEqual([request["ip"] for request in item["requests"]], ["0.0.0.0", "1.1.1.1"])
+
+        self.repository.update({"slug": "de305d54"}, discard={"tags": {"b"}})
+        self.assertNotIn("tags", self.repository.get({"slug": "de305d54"}))
+
+    def test_update_trim(self):
+        """Test trimming removes elements from the front of lists, with other actions."""
+        self.seed()
+        self.repository.update(
+            {"slug": "de305d54"}, append={"requests": [{"ip": str(index)} for index in range(5)]}
+        )
+        self.repository.update(
+            {"slug": "de305d54"},
+            add={"archivedClicks": 3},
+            trim={"requests": 3, "other": 0},
+            if_exists=True,
+        )
+        item = self.repository.get({"slug": "de305d54"})
+        self.assertEqual([request["ip"] for request in item["requests"]], ["3", "4"])
+        self.assertEqual(item["archivedClicks"], Decimal(3))
+
+    def test_update_conditions(self):
+        """Test conditional updates fail with ConditionalCheckFailedException."""
+        with self.assertRaises(ClientError) as raised:
+            self.repository.update({"slug": "de305d54"}, assign={"shards": 8}, if_exists=True)
+        self.assertEqual(
+            raised.exception.response["Error"]["Code"], "ConditionalCheckFailedException"
+        )
+        self.assertIsNone(self.repository.get({"slug": "de305d54"}))
+
+        self.seed()
+        self.repository.update(
+            {"slug": "de305d54"}, assign={"shards": 8}, if_exists=True, if_below={"shards": 8}
+        )
+        with self.assertRaises(ClientError):
+            self.repository.update({"slug": "de305d54"}, assign={"shards": 8}, if_below={"shards": 8})
+        self.assertEqual(self.repository.get({"slug": "de305d54"})["shards"], Decimal(8))
+
+        for tag in ("a", "b", "c"):
+            try:
+                self.repository.update({"slug": "de305d54"}, add={"tags": {tag}}, if_smaller={"tags": 2})
+            except ClientError as error:
+                self.assertEqual(error.response["Error"]["Code"], "ConditionalCheckFailedException")
+        self.assertEqual(self.repository.get({"slug": "de305d54"})["tags"], {"a", "b"})
+
+    def test_delete(self):
+        """Test deleting single and several items."""
+        self.seed()
+        self.repository.delete({"slug": "de305d54"})
+        self.repository.delete({"slug": "123"})
+        self.assertIsNone(self.repository.get({"slug": "de305d54"}))
+        self.repository.batch_delete([{"slug": "de305d54#0"}, {"slug": "123"}])
+        self.assertEqual(self.repository.scan().count, 0)
+
+    def test_scan_filters(self):
+        """Test scan filters and projections."""
+        self.seed()
+        page = self.repository.scan(exclude="recordType")
+        self.assertEqual([item["slug"] for item in page.items], ["de305d54"])
+        self.assertEqual((page.count, page.scanned, page.last_key), (1, 2, None))
+        page = self.repository.scan(equals={"shardOf": "de305d54"}, projection=["clicks"])
+        self.assertEqual(page.items, [{"clicks": Decimal(3)}])
+
+    def test_scan_pagination(self):
+        """Test paginated scans return every item exactly once."""
+        for index in range(25):
+            self.repository.put({"slug": f"slug-{index:02}"})
+        slugs, start_key = [], None
+        while True:
+            page = self.repository.scan(limit=10, start_key=start_key)
+            self.assertLessEqual(page.count, 10)
+            slugs.extend(item["slug"] for item in page.items)
+            if not page.last_key:
+                break
+            start_key = page.last_key
+        self.assertEqual(sorted(slugs), [f"slug-{index:02}" for index in range(25)])
+
+    def test_query(self):
+        """Test index queries only return items holding the index attribute."""
+        self.seed()
+        for index, slug in enumerate(("75b4431b", "2cd9cab6", "0a1b2c3d")):
+            self.repository.put({"slug": slug, "urlHash": "abc" if index else "xyz"})
+        page = self.repository.query(repository.URL_HASH_INDEX, "abc", projection=["slug"])
+        self.assertEqual(sorted(item["slug"] for item in page.items), ["0a1b2c3d", "2cd9cab6"])
+        self.assertEqual(self.repository.query(repository.URL_HASH_INDEX, "none").items, [])
+
+        slugs, start_key = [], None
+        while True:
+            page = self.repository.query(repository.URL_HASH_INDEX, "abc", limit=1, start_key=start_key)
+            slugs.extend(item["slug"] for item in page.items)
+            if not page.last_key:
+                break
+            start_key = page.last_key
+        self.assertEqual(sorted(slugs), ["0a1b2c3d", "2cd9cab6"])
+
+    def test_query_sort_key(self):
+        """Test index queries are ordered, bounded and paginated by the sort key."""
+        self.seed()
+        created = ["2023-01-01T00:00:00Z", "2023-01-02T00:00:00Z", "2023-01-03T00:00:00Z", "2023-01-04T00:00:00Z"]
+        for index, created_at in enumerate(created):
+            self.repository.put({"slug": f"link-{index}", "owner": "team-x", "createdAt": created_at})
+        self.repository.put({"slug": "other", "owner": "team-y", "createdAt": created[0]})
+        self.repository.put({"slug": "unowned", "createdAt": created[0]})
+
+        def slugs(forward: bool, **bounds) -> list[str]:
+            found, start_key = [], None
+            while True:
+                page = self.repository.query(
+                    repository.OWNER_INDEX, "team-x", limit=1, start_key=start_key, forward=forward, **bounds
+                )
+                found.extend(item["slug"] for item in page.items)
+                if not page.last_key:
+                    return found
+                start_key = page.last_key
+
+        self.assertEqual(slugs(True), ["link-0", "link-1", "link-2", "link-3"])
+        self.assertEqual(slugs(False), ["link-3", "link-2", "link-1", "link-0"])
+        self.assertEqual(slugs(False, since=created[1]), ["link-3", "link-2", "link-1"])
+        self.assertEqual(slugs(True, until=created[1]), ["link-0", "link-1"])
+        self.assertEqual(slugs(True, since=created[1], until=created[2]), ["link-1", "link-2"])
+
+    def test_batch_get(self):
+        """Test batch gets span several requests and skip missing items."""
+        for index in range(150):
+            self.repository.put({"slug": f"slug-{index:03}", "clicks": index})
+        keys = [{"slug": f"slug-{index:03}"} for index in range(0, 160, 2)]
+        keys += [{"slug": f"slug-{index:03}"} for index in range(1, 150, 2)]
+        items = self.repository.batch_get(keys, projection=["clicks"])
+        self.assertEqual(len(items), 150)
+        self.assertEqual(sum(item["clicks"] for item in items), sum(range(150)))
+
+
+class test_dynamodb_repository(repository_contract, TestCase):
+    """Test DynamoDBRepository."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        self.repository = fixtures.repository()
+
+    def test_create_repository(self):
+        """Test the default backend is DynamoDB."""
+        created = repository.create_repository("dev-url-shortner-table", self.repository.dynamodb)
+        self.assertIsInstance(created, repository.DynamoDBRepository)
+
+    def test_batch_get_unprocessed(self):
+        """Test unprocessed keys are retried with backoff, and given up on eventually."""
+        self.seed()
+        batch_get_item = self.repository.dynamodb.batch_get_item
+        unprocessed = {"dev-url-shortner-table": {"Keys": [{"slug": "de305d54#0"}]}}
+        calls = []
+
+        def flaky(RequestItems):
+            calls.append(RequestItems)
+            if len(calls) > 1:
+                return batch_get_item(RequestItems=RequestItems)
+            processed = {"dev-url-shortner-table": {"Keys": [{"slug": "de305d54"}]}}
+            return {**batch_get_item(RequestItems=processed), "UnprocessedKeys": unprocessed}
+
+        with patch.object(self.repository.dynamodb, "batch_get_item", side_effect=flaky), patch(
+            "time.sleep"
+        ) as mock_sleep:
+            items = self.repository.batch_get([{"slug": "de305d54"}, {"slug": "de305d54#0"}])
+        self.assertEqual(sorted(item["slug"] for item in items), ["de305d54", "de305d54#0"])
+        mock_sleep.assert_called_once()
+        self.assertEqual(calls[1], unprocessed)
+        self.assertLessEqual(mock_sleep.call_args.args[0], repository.BATCH_RETRY_BASE_SECONDS * 2)
+
+        with patch.object(
+            self.repository.dynamodb,
+            "batch_get_item",
+            return_value={"Responses": {}, "UnprocessedKeys": unprocessed},
+        ) as mock_batch_get_item, patch("time.sleep") as mock_sleep, self.assertRaises(
+            ClientError
+        ) as raised:
+            self.repository.batch_get([{"slug": "de305d54#0"}])
+        self.assertEqual(
+            raised.exception.response["Error"]["Code"], "ProvisionedThroughputExceededException"
+        )
+        self.assertEqual(mock_batch_get_item.call_count, repository.BATCH_MAX_RETRIES + 1)
+        self.assertTrue(
+            all(call.args[0] <= repository.BATCH_RETRY_MAX_SECONDS for call in mock_sleep.call_args_list)
+        )
+
+
+class test_sqlite_repository(repository_contract, TestCase):
+    """Test SQLiteRepository."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        self.repository = repository.SQLiteRepository(":memory:")
+
+    def test_create_repository(self):
+        """Test the local engine is shared by every table of a process."""
+        with tempfile.TemporaryDirectory() as directory, patch.object(
+            repository, "STORAGE_BACKEND", "sqlite"
+        ), patch.object(repository, "SQLITE_PATH", os.path.join(directory, "test.db")):
+            created = repository.create_repository("dev-url-shortner-table")
+            self.assertIsInstance(created, repository.SQLiteRepository)
+            self.assertIs(created, repository.create_repository("other-table"))
+            created.connection.close()
+            del repository._sqlite_repositories[repository.SQLITE_PATH]
+
+    def test_scan_segments(self):
+        """Test the segments of a parallel scan partition the items.
+
+        moto ignores scan segments, so this is only checked against SQLite.
+        """
+        for index in range(25):
+            self.repository.put({"slug": f"slug-{index:02}"})
+        segments = [
+            [item["slug"] for item in self.repository.scan(segment=segment, total_segments=3).items]
+            for segment in range(3)
+        ]
+        self.assertTrue(all(segments))
+        self.assertEqual(sorted(sum(segments, [])), [f"slug-{index:02}" for index in range(25)])
+
+    def test_errors(self):
+        """Test engine failures are raised as DynamoDB errors and roll back."""
+        self.repository.put({"slug": "de305d54", "clicks": 1})
+        with self.assertRaises(TypeError):
+            self.repository.put({"slug": "75b4431b", "value": object()})
+        self.assertFalse(self.repository.connection.in_transaction)
+        self.repository.connection.execute("DROP TABLE items")
+        with self.assertRaises(ClientError) as raised:
+            self.repository.update({"slug": "de305d54"}, add={"clicks": 1})
+        self.assertEqual(raised.exception.response["Error"]["Code"], "InternalServerError")
+        self.assertFalse(self.repository.connection.in_transaction)
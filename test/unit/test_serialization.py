@@ -0,0 +1,77 @@
+""" Unit Tests for the serialization module. """
+import json
+import os
+import sys
+from decimal import Decimal
+from unittest import TestCase
+
+from boto3.dynamodb.types import Binary
+
+sys.path.append(os.path.abspath("."))
+
+
+class test_serialization(TestCase):
+    """Test serialization module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import serialization
+
+        self.serialization = serialization
+
+    def test_dumps_dynamodb_types(self):
+        """Test dumps converts the types returned by the boto3 resource layer."""
+        body = self.serialization.dumps(
+            {
+                "clicks": Decimal("42"),
+                "ratio": Decimal("0.5"),
+                "tags": {"b", "a"},
+                "blob": Binary(b"\x00\x01"),
+            }
+        )
+        self.assertEqual(
+            json.loads(body),
+            {"clicks": 42, "ratio": 0.5, "tags": ["a", "b"], "blob": "AAE="},
+        )
+
+    def test_dumps_unknown_type(self):
+        """Test dumps still rejects types DynamoDB never returns."""
+        with self.assertRaises(TypeError):
+            self.serialization.dumps({"value": object()})
+
+    def test_encode_page_chunks(self):
+        """Test encode_page produces the same document for any chunk size."""
+        items = [{"slug": str(index), "clicks": Decimal(index)} for index in range(7)]
+        expected = {
+            "Items": [{"slug": str(index), "clicks": index} for index in range(7)],
+            "Count": 7,
+        }
+        for chunk_size in (1, 3, 7, 100):
+            body = self.serialization.encode_page(
+                iter(items), chunk_size=chunk_size, Count=7, Cursor=None
+            )
+            self.assertEqual(json.loads(body), expected)
+
+    def test_encode_page_empty(self):
+        """Test encode_page with no items."""
+        self.assertEqual(
+            json.loads(self.serialization.encode_page([], Count=0)),
+            {"Items": [], "Count": 0},
+        )
+
+    def test_cursor_round_trip(self):
+        """Test a LastEvaluatedKey survives encoding as a cursor."""
+        cursor = self.serialization.encode_cursor({"slug": "de305d54"})
+        self.assertEqual(self.serialization.decode_cursor(cursor), {"slug": "de305d54"})
+        self.assertIsNone(self.serialization.encode_cursor(None))
+        self.assertIsNone(self.serialization.decode_cursor(None))
+
+    def test_decode_cursor_invalid(self):
+        """Test decode_cursor rejects malformed cursors."""
+        for cursor in ("not-a-cursor!", "WzEsMl0="):
+            with self.assertRaises(ValueError):
+                self.serialization.decode_cursor(cursor)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
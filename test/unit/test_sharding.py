@@ -0,0 +1,128 @@
+""" Unit Tests for the sharding module. """
+import os
+import sys
+from unittest import TestCase
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+
+
+class test_sharding(TestCase):
+    """Test sharding module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import sharding
+
+        self.sharding = sharding
+        self.repository = fixtures.repository()
+        self.table = fixtures.seed(
+            [
+                {
+                    "slug": "de305d54",
+                    "targetUrl": "https://www.google.com",
+                    "requests": [{"ip": "0.0.0.0"}],
+                    "createdAt": "2021-01-01T00:00:00.000Z",
+                }
+            ]
+        )
+
+    def test_record_click_unsharded(self):
+        """Test clicks of an unsharded slug are appended to the slug item."""
+        self.sharding.record_click(self.repository, "de305d54", 1, {"ip": "1.1.1.1"})
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertEqual(len(item["requests"]), 2)
+        self.assertEqual(item["clicks"], 1)
+        self.assertFalse(self.sharding.is_auxiliary(item))
+
+    def test_record_click_sharded(self):
+        """Test clicks of a sharded slug are spread over shard items."""
+        for _ in range(20):
+            self.sharding.record_click(self.repository, "de305d54", 4, {"ip": "1.1.1.1"})
+        shards = [
+            self.table.get_item(Key={"slug": self.sharding.shard_key("de305d54", shard)}).get("Item")
+            for shard in range(4)
+        ]
+        shards = [shard for shard in shards if shard]
+        self.assertTrue(all(self.sharding.is_auxiliary(shard) for shard in shards))
+        self.assertEqual(sum(int(shard["clicks"]) for shard in shards), 20)
+
+    def test_promote_and_read_clicks(self):
+        """Test a promoted slug merges the clicks of every shard on read."""
+        shards = self.sharding.promote(self.repository, "de305d54", 1)
+        self.assertEqual(shards, self.sharding.MIN_HOT_SHARDS)
+        for _ in range(10):
+            self.sharding.record_click(self.repository, "de305d54", shards, {"ip": "1.1.1.1"})
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertEqual(self.sharding.shard_count(item), shards)
+        self.assertEqual(self.sharding.read_clicks(self.repository, item), 11)
+
+    def test_promote_never_lowers(self):
+        """Test promotion loses the race gracefully against a larger shard count."""
+        self.table.update_item(
+            Key={"slug": "de305d54"},
+            UpdateExpression="SET shards = :shards",
+            ExpressionAttributeValues={":shards": self.sharding.MAX_SHARDS},
+        )
+        self.assertEqual(
+            self.sharding.promote(self.repository, "de305d54", 1), self.sharding.MIN_HOT_SHARDS
+        )
+        item = self.table.get_item(Key={"slug": "de305d54"})["Item"]
+        self.assertEqual(self.sharding.shard_count(item), self.sharding.MAX_SHARDS)
+        self.assertEqual(
+            self.sharding.promote(self.repository, "de305d54", self.sharding.MAX_SHARDS),
+            self.sharding.MAX_SHARDS,
+        )
+
+    def test_promote_error(self):
+        """Test promotion re-raises unexpected errors."""
+        with patch.object(
+            self.repository.table,
+            "update_item",
+            side_effect=ClientError(
+                {"Error": {"Code": "500", "Message": "Internal Server Error"}},
+                "update_item",
+            ),
+        ):
+            with self.assertRaises(ClientError):
+                self.sharding.promote(self.repository, "de305d54", 1)
+
+    def test_delete_shards(self):
+        """Test deleting the shards of a slug."""
+        self.sharding.delete_shards(self.repository, "de305d54", 1)
+        for _ in range(10):
+            self.sharding.record_click(self.repository, "de305d54", 4, {"ip": "1.1.1.1"})
+        self.sharding.delete_shards(self.repository, "de305d54", 4)
+        self.assertEqual(self.table.scan()["Count"], 1)
+
+    def test_hot_key_detector(self):
+        """Test a slug is reported hot once per window."""
+        now = [0.0]
+        detector = self.sharding.HotKeyDetector(
+            threshold=3, window_seconds=1, clock=lambda: now[0]
+        )
+        self.assertEqual(
+            [detector.record("de305d54") for _ in range(4)], [False, False, True, False]
+        )
+        now[0] = 1.5
+        self.assertFalse(detector.record("de305d54"))
+        self.assertFalse(detector.record("75b4431b"))
+
+    def test_hot_key_detector_rate(self):
+        """Test the default threshold is reached by one container serving a slug at 5 clicks a second."""
+        for rate, hot in ((5, True), (2, False)):
+            now = [0.0]
+            detector = self.sharding.HotKeyDetector(clock=lambda: now[0])
+            clicks = []
+            for _ in range(int(rate * 60)):
+                now[0] += 1 / rate
+                clicks.append(detector.record("de305d54"))
+            self.assertEqual(any(clicks), hot)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
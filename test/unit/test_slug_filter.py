@@ -0,0 +1,199 @@
+""" Unit Tests for the slug_filter module. """
+import os
+import sys
+import tempfile
+from http import HTTPStatus
+from unittest import TestCase
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+
+
+class test_slug_filter(TestCase):
+    """Test slug_filter module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import slug_filter
+
+        self.slug_filter = slug_filter
+        self.repository = fixtures.repository()
+        self.table = fixtures.seed()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "slugs.bloom")
+        self.now = [0.0]
+
+    def new_filter(self):
+        return self.slug_filter.SlugFilter(
+            self.repository, self.path, ttl_seconds=5, clock=lambda: self.now[0]
+        )
+
+    def test_bloom_filter(self):
+        """Test the filter has no false negatives and about the configured false positive rate."""
+        bloom = self.slug_filter.BloomFilter.for_capacity(1000, 0.01)
+        for index in range(1000):
+            bloom.add(f"slug-{index}")
+        self.assertTrue(all(f"slug-{index}" in bloom for index in range(1000)))
+        false_positives = sum(f"junk-{index}" in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_bloom_filter_snapshot(self):
+        """Test a filter survives a snapshot round trip."""
+        bloom = self.slug_filter.BloomFilter.for_capacity(10, 0.01, built_at=12.5)
+        bloom.add("de305d54")
+        bloom.save(self.path)
+        loaded = self.slug_filter.BloomFilter.load(self.path)
+        self.assertIn("de305d54", loaded)
+        self.assertEqual(loaded.built_at, 12.5)
+        self.assertEqual(loaded.to_bytes(), bloom.to_bytes())
+
+    def test_bloom_filter_invalid_snapshot(self):
+        """Test invalid or missing snapshots are ignored."""
+        with open(self.path, "wb") as snapshot:
+            snapshot.write(b"SLBF")
+        self.assertIsNone(self.slug_filter.BloomFilter.load(self.path))
+        with open(self.path, "wb") as snapshot:
+            snapshot.write(self.slug_filter.BloomFilter(64, 2).to_bytes()[:-1])
+        self.assertIsNone(self.slug_filter.BloomFilter.load(self.path))
+        self.assertIsNone(self.slug_filter.BloomFilter.load(None))
+        self.assertIsNone(self.slug_filter.BloomFilter.load(self.path + ".missing"))
+
+    def test_without_snapshot(self):
+        """Test every slug might exist without a snapshot."""
+        slug_filter = self.new_filter()
+        self.assertTrue(slug_filter.might_exist("junk"))
+
+    def test_junk_costs_no_reads(self):
+        """Test junk slugs are ruled out with one delta read per TTL."""
+        self.slug_filter.rebuild(self.repository, self.path, 100, 0.001)
+        slug_filter = self.new_filter()
+        with patch.object(
+            self.repository.table, "get_item", wraps=self.repository.table.get_item
+        ) as get_item:
+            self.assertTrue(slug_filter.might_exist("de305d54"))
+            self.assertFalse(slug_filter.might_exist("junk-1"))
+            self.assertFalse(slug_filter.might_exist("junk-2"))
+            self.assertEqual(get_item.call_count, 1)
+            self.now[0] = 5.0
+            self.assertFalse(slug_filter.might_exist("junk-3"))
+            self.assertEqual(get_item.call_count, 2)
+
+    def test_created_and_deleted_slugs(self):
+        """Test slugs created after the snapshot are found through the delta."""
+        self.slug_filter.rebuild(self.repository, self.path, 100, 0.001)
+        slug_filter = self.new_filter()
+        self.slug_filter.record_created(self.repository, "2cd9cab6")
+        self.assertTrue(slug_filter.might_exist("2cd9cab6"))
+        self.slug_filter.record_deleted(self.repository, "2cd9cab6")
+        self.now[0] = 5.0
+        self.assertFalse(slug_filter.might_exist("2cd9cab6"))
+
+    def test_delta_overflow(self):
+        """Test a full delta stops filtering until a snapshot built after the overflow."""
+        self.slug_filter.rebuild(self.repository, self.path, 100, 0.001)
+        slug_filter = self.new_filter()
+        self.assertTrue(self.slug_filter.record_created(self.repository, "2cd9cab6", max_slugs=1))
+        self.assertFalse(self.slug_filter.record_created(self.repository, "5e4fd1c2", max_slugs=1))
+        self.assertEqual(self.table.get_item(Key={"slug": self.slug_filter.DELTA_KEY})["Item"]["slugs"], {"2cd9cab6"})
+        self.assertTrue(slug_filter.might_exist("5e4fd1c2"))
+        self.assertTrue(slug_filter.might_exist("junk"))
+
+        self.table.put_item(Item={"slug": "5e4fd1c2", "targetUrl": "https://www.amazon.com"})
+        self.slug_filter.rebuild(self.repository, self.path, 100, 0.001)
+        self.now[0] = 5.0
+        self.assertTrue(slug_filter.might_exist("5e4fd1c2"))
+        self.assertFalse(slug_filter.might_exist("junk"))
+
+        with patch.object(
+            self.repository.table,
+            "update_item",
+            side_effect=ClientError({"Error": {"Code": "500", "Message": ""}}, "update_item"),
+        ), self.assertRaises(ClientError):
+            self.slug_filter.record_created(self.repository, "5e4fd1c2")
+
+    def test_record_deleted_without_delta(self):
+        """Test deleting a slug before any delta exists does not create one."""
+        self.slug_filter.record_deleted(self.repository, "de305d54")
+        self.assertNotIn("Item", self.table.get_item(Key={"slug": self.slug_filter.DELTA_KEY}))
+        with patch.object(
+            self.repository.table,
+            "update_item",
+            side_effect=ClientError({"Error": {"Code": "500", "Message": ""}}, "update_item"),
+        ):
+            with self.assertRaises(ClientError):
+                self.slug_filter.record_deleted(self.repository, "de305d54")
+
+    def test_rebuild_trims_delta(self):
+        """Test a rebuild drops the slugs it now contains from the delta."""
+        self.slug_filter.record_created(self.repository, "de305d54")
+        bloom = self.slug_filter.rebuild(self.repository, self.path, 100, 0.001)
+        delta = self.table.get_item(Key={"slug": self.slug_filter.DELTA_KEY})["Item"]
+        self.assertNotIn("slugs", delta)
+        self.assertEqual(float(delta["snapshotBuiltAt"]), bloom.built_at)
+        self.assertNotIn(self.slug_filter.DELTA_KEY, bloom)
+
+    def test_newer_snapshot(self):
+        """Test a container behind the latest snapshot reloads it or stops filtering."""
+        self.slug_filter.rebuild(self.repository, self.path, 100, 0.001)
+        slug_filter = self.new_filter()
+        self.table.put_item(Item={"slug": "2cd9cab6", "targetUrl": "https://www.amazon.com"})
+        self.slug_filter.rebuild(self.repository, self.path, 100, 0.001)
+        self.assertFalse(slug_filter.might_exist("junk"))
+        self.assertTrue(slug_filter.might_exist("2cd9cab6"))
+
+        self.slug_filter.rebuild(self.repository, self.path + ".elsewhere", 100, 0.001)
+        self.now[0] = 5.0
+        self.assertTrue(slug_filter.might_exist("junk"))
+        self.assertIsNone(slug_filter.snapshot)
+
+    def test_get_item_by_slug_filtered(self):
+        """Test the GET Lambda answers filtered slugs without reading the table."""
+        from src import get_function
+
+        self.slug_filter.rebuild(self.repository, self.path, 100, 0.001)
+        with patch.object(get_function, "slug_filter", self.new_filter()), patch.object(
+            get_function.repository, "get"
+        ) as get_item:
+            response = get_function.lambda_handler(
+                fixtures.api_event("GET", "/junk"), fixtures.context()
+            )
+            self.assertEqual(response["statusCode"], HTTPStatus.NOT_FOUND.value)
+            get_item.assert_not_called()
+
+    def test_created_by_post_and_put(self):
+        """Test links created by POST or PUT are added to the delta, and failing to does not fail them."""
+        from src import post_function, put_function
+
+        def delta() -> set:
+            return set(self.table.get_item(Key={"slug": self.slug_filter.DELTA_KEY}).get("Item", {}).get("slugs", ()))
+
+        def request(handler, method: str, slug: str) -> int:
+            body = {"slug": slug, "targetUrl": f"https://www.example.com/{slug}"}
+            return handler(fixtures.api_event(method, "/", body=body), fixtures.context())["statusCode"]
+
+        with patch.object(post_function, "SLUG_FILTER_ENABLED", True), patch.object(
+            put_function, "SLUG_FILTER_ENABLED", True
+        ):
+            self.assertEqual(request(post_function.lambda_handler, "POST", "2cd9cab6"), HTTPStatus.CREATED.value)
+            self.assertEqual(request(put_function.lambda_handler, "PUT", "5e4fd1c2"), HTTPStatus.OK.value)
+            self.assertEqual(request(put_function.lambda_handler, "PUT", "de305d54"), HTTPStatus.OK.value)
+            self.assertEqual(delta(), {"2cd9cab6", "5e4fd1c2"})
+
+            error = ClientError({"Error": {"Code": "500", "Message": ""}}, "UpdateItem")
+            with patch.object(post_function, "record_created", side_effect=error), patch.object(
+                put_function, "record_created", return_value=False
+            ):
+                self.assertEqual(request(post_function.lambda_handler, "POST", "9f3b2a1c"), HTTPStatus.CREATED.value)
+                self.assertEqual(request(put_function.lambda_handler, "PUT", "7a6c5d4e"), HTTPStatus.OK.value)
+            with patch.object(put_function, "record_created", side_effect=error):
+                self.assertEqual(request(put_function.lambda_handler, "PUT", "1b2c3d4e"), HTTPStatus.OK.value)
+        self.assertIn("Item", self.table.get_item(Key={"slug": "9f3b2a1c"}))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        return super().tearDown()
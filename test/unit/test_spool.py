@@ -0,0 +1,219 @@
+""" Unit Tests for the spool module. """
+import os
+import sys
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+
+THROTTLED = ClientError({"Error": {"Code": "ProvisionedThroughputExceededException", "Message": ""}}, "UpdateItem")
+FAILED = ClientError({"Error": {"Code": "ValidationException", "Message": ""}}, "UpdateItem")
+
+
+class test_spool(TestCase):
+    """Test spool module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import spool
+
+        self.spool_module = spool
+        self.repository = fixtures.repository()
+        self.table = fixtures.seed()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "clicks.spool")
+        self.sleep = MagicMock()
+        self.spools = []
+
+    def spool(self, **kwargs):
+        kwargs.setdefault("background", False)
+        kwargs.setdefault("sleep", self.sleep)
+        spool = self.spool_module.ClickSpool(self.path, self.repository, **kwargs)
+        self.spools.append(spool)
+        return spool
+
+    def clicks(self, slug: str) -> int:
+        return int(self.table.get_item(Key={"slug": slug})["Item"].get("clicks", 0))
+
+    def test_append_and_drain(self):
+        """Test spooled clicks are written with one update per slug, then the spool is truncated."""
+        spool = self.spool()
+        for slug in ("de305d54", "75b4431b", "de305d54"):
+            spool.append(slug, 1, {"ip": "1.1.1.1"})
+        self.assertEqual(spool.pending_clicks("de305d54"), 2)
+        self.assertEqual(self.clicks("de305d54"), 0)
+        with patch.object(self.repository, "update", wraps=self.repository.update) as mock_update:
+            self.assertEqual(spool.drain(), 3)
+        self.assertEqual(mock_update.call_count, 2)
+        self.assertEqual((self.clicks("de305d54"), self.clicks("75b4431b")), (2, 1))
+        self.assertEqual(spool.pending_clicks("de305d54"), 0)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.assertEqual(spool.drain(), 0)
+
+    def test_hot(self):
+        """Test hot clicks promote their slug in the home repository before being written."""
+        home_repository = MagicMock()
+        spool = self.spool(home_repository=home_repository)
+        spool.append("de305d54", 1, {"ip": "1.1.1.1"})
+        spool.append("de305d54", 1, {"ip": "1.1.1.1"}, hot=True)
+        spool.append("75b4431b", 1, {"ip": "1.1.1.1"})
+        with patch("src.spool.promote", return_value=8) as mock_promote, patch(
+            "src.spool.record_clicks"
+        ) as mock_record_clicks:
+            self.assertEqual(spool.drain(), 3)
+        mock_promote.assert_called_once_with(home_repository, "de305d54", 1)
+        self.assertEqual(mock_record_clicks.call_args_list[0].args[2], 8)
+        self.assertEqual(mock_record_clicks.call_args_list[1].args[2], 1)
+
+    def test_batches(self):
+        """Test the spool drains a batch at a time and saves its offset."""
+        spool = self.spool(batch_size=2)
+        for _ in range(3):
+            spool.append("de305d54", 1, {"ip": "1.1.1.1"})
+        self.assertEqual(spool.drain(), 2)
+        with open(f"{self.path}.offset") as offset:
+            self.assertGreater(int(offset.read()), 0)
+        self.assertEqual(spool.pending_clicks("de305d54"), 1)
+        self.assertEqual(spool.drain(), 1)
+        self.assertEqual(self.clicks("de305d54"), 3)
+
+    def test_restart(self):
+        """Test clicks spooled by a process that crashed are drained by the next one."""
+        spool = self.spool(batch_size=1)
+        for _ in range(3):
+            spool.append("de305d54", 1, {"ip": "1.1.1.1"})
+        spool.drain()
+        spool.file.write(b'{"slug":"de305d54"')
+        spool.file.flush()
+
+        restarted = self.spool()
+        self.assertEqual(restarted.pending_clicks("de305d54"), 2)
+        restarted.append("75b4431b", 1, {"ip": "1.1.1.1"})
+        self.assertEqual(restarted.drain(), 3)
+        self.assertEqual((self.clicks("de305d54"), self.clicks("75b4431b")), (3, 1))
+        self.assertEqual(restarted.dropped, 0)
+
+    def test_crash_before_truncate(self):
+        """Test a crash between resetting the offset and truncating the spool loses no new clicks."""
+        spool = self.spool()
+        spool.append("de305d54", 1, {"ip": "1.1.1.1"})
+        with patch.object(spool.file, "truncate", side_effect=OSError("crash")), self.assertRaises(OSError):
+            spool.drain()
+        with open(f"{self.path}.offset") as offset:
+            self.assertEqual(offset.read(), "0")
+        spool.close()
+
+        restarted = self.spool()
+        restarted.append("75b4431b", 1, {"ip": "1.1.1.1"})
+        self.assertEqual(restarted.drain(), 2)
+        # The click drained before the crash is written again.
+        self.assertEqual((self.clicks("de305d54"), self.clicks("75b4431b")), (2, 1))
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_corrupt_record(self):
+        """Test records that cannot be decoded are skipped."""
+        spool = self.spool()
+        spool.file.write(b"not json\n")
+        spool.file.flush()
+        self.assertEqual(spool.drain(), 0)
+        self.assertEqual(spool.dropped, 1)
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+    def test_throttled(self):
+        """Test throttled batches are kept and retried at a lower write rate, promoting the throttled slug."""
+        spool = self.spool(rate=(8, 8))
+        spool.append("de305d54", 1, {"ip": "1.1.1.1"})
+        spool.append("75b4431b", 1, {"ip": "1.1.1.1"})
+        update = self.repository.update
+        with patch.object(self.repository, "update", side_effect=[None, THROTTLED, THROTTLED]) as mock_update:
+            for _ in range(2):
+                self.assertEqual(spool.drain(), 0)
+            self.assertEqual(mock_update.call_count, 3)
+        self.assertEqual(spool.bucket.rate, 2)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual(spool.pending_clicks("de305d54"), 0)
+        self.assertEqual(spool.pending_clicks("75b4431b"), 1)
+
+        with patch.object(self.repository, "update", wraps=update) as mock_update:
+            self.assertEqual(spool.drain(), 2)
+        # The throttled slug is promoted, and the slug written before it is not written again.
+        self.assertEqual(mock_update.call_count, 2)
+        self.assertTrue(mock_update.call_args_list[1].args[0]["slug"].startswith("75b4431b#"))
+        self.assertEqual(mock_update.call_args_list[0].kwargs["assign"], {"shards": 8})
+        self.assertEqual(spool.throttled, set())
+        self.assertEqual(spool.bucket.rate, 2.8)
+
+    def test_failed(self):
+        """Test a batch failing for other reasons is dropped after max_attempts."""
+        spool = self.spool(max_attempts=2)
+        spool.append("de305d54", 1, {"ip": "1.1.1.1"})
+        with patch.object(self.repository, "update", side_effect=FAILED):
+            self.assertEqual(spool.drain(), 0)
+            self.assertEqual(spool.drain(), 1)
+        self.assertEqual(spool.dropped, 1)
+        self.assertEqual(spool.pending_clicks("de305d54"), 0)
+
+    def test_rate(self):
+        """Test updates are paced by the token bucket."""
+        now = [0.0]
+        self.sleep.side_effect = lambda seconds: now.__setitem__(0, now[0] + seconds)
+        spool = self.spool(rate=(1, 1), clock=lambda: now[0])
+        for slug in ("de305d54", "75b4431b"):
+            spool.append(slug, 1, {"ip": "1.1.1.1"})
+        self.assertEqual(spool.drain(), 2)
+        self.sleep.assert_called_once_with(1.0)
+
+    def test_background_worker(self):
+        """Test the background worker drains the spool, and logs and survives errors."""
+        log = MagicMock()
+        spool = self.spool(background=True, poll_seconds=0.01, batch_size=1, log=log)
+        errors = [OSError("disk")]
+
+        def drain():
+            if errors:
+                raise errors.pop()
+            return 0
+
+        with patch.object(spool, "drain", side_effect=drain), patch.object(spool, "sleep") as mock_sleep:
+            spool.start()
+            deadline = time.monotonic() + 5
+            while spool.drain.call_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            spool.close()
+        mock_sleep.assert_called_once()
+        log.exception.assert_called_once_with("Click spool drain failed.")
+
+        spool = self.spool(background=True, poll_seconds=0.01, batch_size=1)
+        spool.append("de305d54", 1, {"ip": "1.1.1.1"})
+        deadline = time.monotonic() + 5
+        while spool.pending_clicks("de305d54") and time.monotonic() < deadline:
+            time.sleep(0.01)
+        spool.close()
+        self.assertEqual(self.clicks("de305d54"), 1)
+
+        spool = self.spool()
+        spool.append("de305d54", 1, {"ip": "1.1.1.1"})
+        spool.close()
+        restarted = self.spool(background=True, poll_seconds=0.01)
+        deadline = time.monotonic() + 5
+        while restarted.pending_clicks("de305d54") and time.monotonic() < deadline:
+            time.sleep(0.01)
+        restarted.close()
+        self.assertEqual(self.clicks("de305d54"), 2)
+
+    def tearDown(self) -> None:
+        for spool in self.spools:
+            spool.closed.set()
+            spool.wake.set()
+            if spool.worker is not None:
+                spool.worker.join()
+            spool.file.close()
+        self.directory.cleanup()
+        return super().tearDown()
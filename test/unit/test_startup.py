@@ -0,0 +1,110 @@
+""" Unit Tests for the startup module. """
+import json
+import os
+import sys
+from http import HTTPStatus
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath("."))
+
+from fixtures import api_event, context  # noqa: E402
+
+
+class test_startup(TestCase):
+    """Test startup module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import startup
+
+        self.startup = startup
+        self.repository = MagicMock()
+        self.repository.get.return_value = None
+        self.ticks = iter(range(0, 100, 2))
+
+    def create(self, prewarm: bool = False):
+        """Create a Startup with a clock that advances 2 ms per reading."""
+        return self.startup.Startup(
+            "test", [self.repository, self.repository], prewarm=prewarm,
+            clock=lambda: next(self.ticks) / 1000,
+        )
+
+    def test_is_warmup(self):
+        """Test warm-up pings are told apart from requests."""
+        is_warmup = self.startup.is_warmup
+        self.assertTrue(is_warmup(self.startup.WARMUP_EVENT))
+        self.assertTrue(is_warmup({"source": "aws.events", "detail-type": "Scheduled Event"}))
+        self.assertFalse(is_warmup({"warmup": "true"}))
+        self.assertFalse(is_warmup(api_event("GET", "/")))
+        self.assertFalse(is_warmup(None))
+
+    def test_process_age(self):
+        """Test the process age is measured from /proc, when there is one."""
+        age = self.startup.process_age()
+        if age is not None:
+            self.assertGreaterEqual(age, 0)
+        with patch("builtins.open", side_effect=OSError):
+            self.assertIsNone(self.startup.process_age())
+
+    def test_prewarm(self):
+        """Test pre-warming reads once from each distinct repository."""
+        startup = self.create(prewarm=True)
+        self.repository.get.assert_called_once_with(self.startup.PREWARM_KEY)
+        self.assertTrue(startup.prewarmed)
+        self.assertEqual(startup.phases["ColdStartClientInit"], 2)
+
+    def test_prewarm_error(self):
+        """Test a failed pre-warm is logged and does not fail the container."""
+        self.repository.get.side_effect = ClientError(
+            error_response={"Error": {"Code": "500", "Message": "Internal Server Error"}},
+            operation_name="get_item",
+        )
+        startup = self.create(prewarm=True)
+        self.assertTrue(startup.prewarmed)
+
+    def test_warmup(self):
+        """Test warm-up pings pre-warm once and are not routed."""
+        startup = self.create()
+        handler = MagicMock()
+        for _ in range(2):
+            response = startup.handle(self.startup.WARMUP_EVENT, context(), handler)
+            self.assertEqual(response, self.startup.WARMUP_RESPONSE)
+        handler.assert_not_called()
+        self.repository.get.assert_called_once()
+        self.assertFalse(startup.served)
+
+    def test_first_request(self):
+        """Test the cold start phases are published once, after the first request."""
+        startup = self.create()
+        handler = MagicMock(return_value={"statusCode": 200})
+        with patch.object(startup.metrics, "flush_metrics") as flush:
+            startup.handle(api_event("GET", "/"), context(), handler)
+            startup.handle(api_event("GET", "/"), context(), handler)
+        flush.assert_called_once()
+        self.assertEqual(handler.call_count, 2)
+        self.assertEqual(startup.phases["ColdStartFirstRequest"], 2)
+
+    def test_metrics(self):
+        """Test the published metrics in the embedded metric format."""
+        startup = self.create()
+        startup.phases = {"ColdStartImport": 120.0}
+        with patch("builtins.print") as mock_print:
+            startup.handle(api_event("GET", "/"), context(), MagicMock())
+        output = json.loads(mock_print.call_args.args[0])
+        self.assertEqual(output["ColdStartImport"], [120.0])
+        self.assertEqual(output["ColdStartFirstRequest"], [2.0])
+        self.assertEqual(output["initializationType"], "on-demand")
+
+    def test_lambda_handler(self):
+        """Test the handlers answer warm-up pings."""
+        from src.delete_function import lambda_handler
+
+        response = lambda_handler(self.startup.WARMUP_EVENT, context())
+        self.assertEqual(response["statusCode"], HTTPStatus.OK.value)
+
+    def tearDown(self) -> None:
+        return super().tearDown()
@@ -0,0 +1,74 @@
+""" Unit Tests for the tenancy module. """
+import os
+import sys
+from unittest import TestCase
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+from fixtures import api_event  # noqa: E402
+
+
+class test_tenancy(TestCase):
+    """Test tenancy module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import tenancy
+
+        self.tenancy = tenancy
+        self.repository = fixtures.repository()
+        self.now = 0.0
+        self.resolver = tenancy.TenantResolver(self.repository, ttl_seconds=60, max_size=2, clock=lambda: self.now)
+
+    def event(self, host: str | None):
+        return api_event("GET", "/de305d54", headers={"Host": host} if host else None)
+
+    def test_keys(self):
+        """Test hosts are normalized, and only tenants other than the default prefix keys."""
+        self.assertEqual(self.tenancy.normalize_host(" Brand-A.link.:443"), "brand-a.link")
+        self.assertEqual(self.tenancy.host_key("brand-a.link"), "#tenantHost:brand-a.link")
+        self.assertEqual(self.tenancy.tenant_key("brand-a", "de305d54"), "brand-a/de305d54")
+        self.assertEqual(self.tenancy.tenant_key(None, "de305d54"), "de305d54")
+
+    def test_validate_slug(self):
+        """Test slugs may not contain the shard or tenant separators, or shadow a route."""
+        self.assertIsNone(self.tenancy.validate_slug("de305d54"))
+        for slug in ("de305d54#0", "#tenantHost:a.link", "brand-a/de305d54", "resolve", "", None, 1):
+            self.assertIsNotNone(self.tenancy.validate_slug(slug))
+
+    def test_register_host(self):
+        """Test host items map a host to a tenant, whose name is validated."""
+        self.tenancy.register_host(self.repository, "Brand-A.link", "brand-a")
+        item = self.repository.get({"slug": "#tenantHost:brand-a.link"})
+        self.assertEqual((item["recordType"], item["tenant"]), ("tenantHost", "brand-a"))
+        for tenant in ("", "Brand-A", "brand/a", "a" * 64):
+            with self.assertRaises(ValueError):
+                self.tenancy.register_host(self.repository, "brand-b.link", tenant)
+
+    def test_resolve(self):
+        """Test tenants are read once per host and TTL, unknown hosts included."""
+        self.tenancy.register_host(self.repository, "brand-a.link", "brand-a")
+        with patch.object(self.repository, "get", wraps=self.repository.get) as mock_get:
+            self.assertIsNone(self.resolver.resolve(self.event(None)))
+            self.assertEqual(self.resolver.resolve(self.event("brand-a.link")), "brand-a")
+            self.assertEqual(self.resolver.resolve(self.event("BRAND-A.link:443")), "brand-a")
+            self.assertIsNone(self.resolver.resolve(self.event("api.example.com")))
+            self.assertIsNone(self.resolver.resolve(self.event("api.example.com")))
+            self.assertEqual(mock_get.call_count, 2)
+
+            self.tenancy.register_host(self.repository, "api.example.com", "brand-b")
+            self.now += 60
+            self.assertEqual(self.resolver.resolve(self.event("api.example.com")), "brand-b")
+            self.assertEqual(mock_get.call_count, 3)
+
+    def test_cache_size(self):
+        """Test the least recently used host is evicted."""
+        for host in ("a.link", "b.link", "a.link", "c.link"):
+            self.resolver.resolve(self.event(host))
+        self.assertEqual(list(self.resolver.entries), ["a.link", "c.link"])
+
+    def tearDown(self) -> None:
+        return super().tearDown()
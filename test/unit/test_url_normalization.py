@@ -0,0 +1,76 @@
+""" Unit Tests for the url_normalization module. """
+import os
+import sys
+from unittest import TestCase
+
+sys.path.append(os.path.abspath("."))
+
+import fixtures  # noqa: E402
+
+
+class test_url_normalization(TestCase):
+    """Test url_normalization module."""
+
+    def setUp(self):
+        """Setup before each test."""
+        super().setUp()
+        from src import url_normalization
+
+        self.url_normalization = url_normalization
+
+    def test_canonicalize(self):
+        """Test URLs that point to the same resource share a canonical form."""
+        canonicalize = self.url_normalization.canonicalize
+        self.assertEqual(canonicalize("https://Example.com"), "https://example.com/")
+        self.assertEqual(canonicalize(" HTTPS://EXAMPLE.COM:443/ "), "https://example.com/")
+        self.assertEqual(canonicalize("http://example.com.:80/a/b/"), "http://example.com/a/b")
+        self.assertEqual(canonicalize("http://example.com:8080"), "http://example.com:8080/")
+        self.assertEqual(
+            canonicalize("https://example.com/?b=2&a=1&utm_source=x&fbclid=y&a=0"),
+            "https://example.com/?a=0&a=1&b=2",
+        )
+        self.assertEqual(
+            canonicalize("https://user@[::1]:443/Path#Top"), "https://user@[::1]/Path#Top"
+        )
+        self.assertEqual(canonicalize("not a url"), "not a url")
+        self.assertEqual(canonicalize("http://example.com:99999"), "http://example.com:99999")
+
+    def test_url_hash(self):
+        """Test the hash has a fixed length and follows the canonical form."""
+        url_hash = self.url_normalization.url_hash
+        self.assertEqual(len(url_hash("https://example.com")), 22)
+        self.assertEqual(url_hash("https://Example.com/"), url_hash("https://example.com"))
+        self.assertNotEqual(url_hash("https://example.com/a"), url_hash("https://example.com/b"))
+
+    def test_recent_urls(self):
+        """Test the cache evicts the least recently used and expired hashes."""
+        now = [0.0]
+        recent = self.url_normalization.RecentUrls(max_size=2, ttl_seconds=10, clock=lambda: now[0])
+        recent.add("a", "de305d54")
+        recent.add("b", "75b4431b")
+        self.assertEqual(recent.get("a"), "de305d54")
+        recent.add("c", "2cd9cab6")
+        self.assertIsNone(recent.get("b"))
+        now[0] = 10.0
+        self.assertIsNone(recent.get("a"))
+        self.assertEqual(len(recent.entries), 1)
+
+    def test_backfill(self):
+        """Test links created before the hash existed get one."""
+        fixtures.seed(
+            [
+                {"slug": "de305d54", "targetUrl": "https://Example.com"},
+                {"slug": "de305d54#0", "recordType": "clickShard"},
+            ]
+            + fixtures.SEED_ITEMS[1:]
+        )
+        repository = fixtures.repository()
+        self.assertEqual(self.url_normalization.backfill(repository), 1)
+        self.assertEqual(
+            repository.get({"slug": "de305d54"})["urlHash"],
+            self.url_normalization.url_hash("https://example.com"),
+        )
+        self.assertEqual(self.url_normalization.backfill(repository), 0)
+
+    def tearDown(self) -> None:
+        return super().tearDown()